@@ -0,0 +1,10 @@
+"""
+Conference report builder
+
+The modules in this folder import each other relatively when loaded as
+the `cr` package, and by their bare names when run as scripts from this
+folder (e.g. `python core.py`). See api.py.
+"""
+
+from .api import *  # noqa: F401,F403
+from .api import __all__  # noqa: F401
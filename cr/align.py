@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+"""
+Align the eng and hun Markdown of each talk paragraph by paragraph
+
+Paragraphs are paired with the Gale-Church length-based dynamic program.
+Cells on the same anti-diagonal of the cost table don't depend on each
+other, so each diagonal is filled with one set of NumPy operations. The
+aligned talks are written as interleaved bilingual Markdown:
+
+    {year}/{month}/bilingual/md/{slug}.md
+
+python align.py YYYY MM
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import os
+import re
+
+import numpy as np
+
+from scipy.special import log_ndtr
+
+if __package__:
+    from .logger import setup_logger
+else:
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+FOLDER_MD = '{year}/{month}/{lang}/md/'
+FOLDER_BILINGUAL = '{year}/{month}/bilingual/md/'
+FILEPATH_BILINGUAL = FOLDER_BILINGUAL + '{slug}.md'
+
+NOTE_LINE = re.compile(r'^\[\^(\d+)\]:', re.MULTILINE)
+NOTE_REF = re.compile(r'\[\^(\d+)\]')
+PARAGRAPH_SPLIT = re.compile(r'\n\s*\n')
+
+# Gale & Church (1993): variance of the length ratio and prior probability
+# of each bead, as (source paragraphs, target paragraphs)
+VARIANCE = 6.8
+BEADS = {
+    (1, 1): 0.89,
+    (1, 0): 0.0099 / 2,
+    (0, 1): 0.0099 / 2,
+    (2, 1): 0.089 / 2,
+    (1, 2): 0.089 / 2,
+    (2, 2): 0.011,
+}
+
+BEAD_TEMPLATE = '{source}\n\n{target}'
+TARGET_PREFIX = '> '
+CONTENT_TEMPLATE = '{body}\n\n{notes}'
+
+
+def split_talk(content):
+    """
+    Return (paragraphs, notes) of a converted talk.
+    """
+    match = NOTE_LINE.search(content)
+    body, notes = content, ''
+    if match:
+        body, notes = content[:match.start()], content[match.start():]
+    paragraphs = [p.strip() for p in PARAGRAPH_SPLIT.split(body) if p.strip()]
+    return paragraphs, notes.strip()
+
+
+def align(source, target):
+    """
+    Align two lists of paragraph lengths.
+
+    Returns a list of beads ((i0, i1), (j0, j1)) covering source[i0:i1] and
+    target[j0:j1].
+    """
+    source = np.asarray(source, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64)
+    n, m = len(source), len(target)
+
+    # Nothing to match against, e.g. an empty or truncated translation
+    if n == 0 or m == 0:
+        return [((i, i + 1), (0, 0)) for i in range(n)] + \
+               [((n, n), (j, j + 1)) for j in range(m)]
+
+    source_sum = np.concatenate([[0], np.cumsum(source)])
+    target_sum = np.concatenate([[0], np.cumsum(target)])
+    ratio = target_sum[-1] / source_sum[-1] if source_sum[-1] else 1.0
+    ratio = ratio or 1.0
+
+    cost = np.full((n + 1, m + 1), np.inf)
+    back = np.zeros((n + 1, m + 1), dtype=np.int8)
+    cost[0, 0] = 0
+    beads = list(BEADS.items())
+    penalties = [-np.log(prior) for _, prior in beads]
+
+    for diagonal in range(1, n + m + 1):
+        i = np.arange(max(0, diagonal - m), min(n, diagonal) + 1)
+        j = diagonal - i
+        best = np.full(len(i), np.inf)
+        choice = np.zeros(len(i), dtype=np.int8)
+
+        for index, ((di, dj), _) in enumerate(beads):
+            valid = (i >= di) & (j >= dj)
+            if not valid.any():
+                continue
+            pi, pj = i[valid] - di, j[valid] - dj
+            length_source = source_sum[i[valid]] - source_sum[pi]
+            length_target = target_sum[j[valid]] - target_sum[pj]
+
+            mean = (length_source + length_target / ratio) / 2
+            delta = (length_target - length_source * ratio) / np.sqrt(
+                np.maximum(mean, 1) * VARIANCE
+            )
+            match_cost = -np.log(2) - log_ndtr(-np.abs(delta))
+            total = cost[pi, pj] + match_cost + penalties[index]
+
+            current = best[valid]
+            better = total < current
+            current[better] = total[better]
+            best[valid] = current
+            chosen = choice[valid]
+            chosen[better] = index
+            choice[valid] = chosen
+
+        cost[i, j] = best
+        back[i, j] = choice
+
+    result = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        di, dj = beads[back[i, j]][0]
+        result.append(((i - di, i), (j - dj, j)))
+        i, j = i - di, j - dj
+    result.reverse()
+    return result
+
+
+def rename_notes(text, prefix):
+    """
+    Prefix footnote labels so both languages can share one document.
+    """
+    return NOTE_REF.sub('[^{}\\1]'.format(prefix), text)
+
+
+def align_talk(source_content, target_content, target_lang='hun'):
+    """
+    Interleave two versions of a talk bead by bead.
+    """
+    source, source_notes = split_talk(source_content)
+    target, target_notes = split_talk(target_content)
+    prefix = target_lang + '-'
+
+    blocks = []
+    for (i0, i1), (j0, j1) in align(
+            [len(p) for p in source],
+            [len(p) for p in target]):
+        source_text = '\n\n'.join(source[i0:i1])
+        target_text = '\n>\n'.join(
+            TARGET_PREFIX + rename_notes(p, prefix).replace('\n', '\n> ')
+            for p in target[j0:j1]
+        )
+        blocks.append(
+            BEAD_TEMPLATE.format(source=source_text, target=target_text).strip()
+        )
+
+    notes = '\n'.join(
+        n for n in (source_notes, rename_notes(target_notes, prefix)) if n
+    )
+    return CONTENT_TEMPLATE.format(
+        body='\n\n'.join(blocks),
+        notes=notes,
+    ).strip()
+
+
+def align_conference(year, month, source_lang='eng', target_lang='hun'):
+    """
+    Write bilingual Markdown for every slug present in both languages.
+    """
+    source_dir = FOLDER_MD.format(year=year, month=month, lang=source_lang)
+    target_dir = FOLDER_MD.format(year=year, month=month, lang=target_lang)
+    slugs = sorted(
+        set(os.listdir(source_dir)) & set(os.listdir(target_dir))
+    )
+
+    paths = []
+    for name in slugs:
+        if not name.endswith('.md'):
+            continue
+        with open(os.path.join(source_dir, name), encoding='utf-8') as fin:
+            source_content = fin.read()
+        with open(os.path.join(target_dir, name), encoding='utf-8') as fin:
+            target_content = fin.read()
+
+        filename = FILEPATH_BILINGUAL.format(
+            year=year,
+            month=month,
+            slug=name[:-len('.md')],
+        )
+        ensure_path_exists(filename)
+        logger.info(filename)
+        with open(filename, 'w', encoding='utf-8') as fout:
+            fout.write(align_talk(source_content, target_content, target_lang))
+        paths.append(filename)
+
+    return paths
+
+
+def ensure_path_exists(path):
+    dirs = os.path.dirname(path)
+    if not os.path.exists(dirs):
+        os.makedirs(dirs)
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    align_conference(args.year, args.month, *args.languages)
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    # Required positional argument
+    parser.add_argument("year", help="The year of the conference (e.g. 2017).")
+    parser.add_argument(
+        "month",
+        help="The month of the conference (i.e. 04 or 10).",
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--languages',
+        action='store',
+        dest='languages',
+        default=['eng', 'hun'],
+        nargs=2,
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+
+"""
+Vocabulary statistics over the converted md/ corpus
+
+Talks are tokenized once into a sparse document-term matrix that is cached
+on disk and extended as conferences are converted. Aggregate queries by
+speaker, year, decade or language are sparse matrix products:
+
+    .analytics/matrix.npz    document-term counts (CSR)
+    .analytics/vocab.json    column -> term
+    .analytics/docs.json     row -> talk metadata
+
+python analytics.py --update YYYY MM
+python analytics.py --by speaker --top 20 --lang eng
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+import scipy.sparse as sp
+
+if __package__:
+    from .extractor import speaker_of
+    from .logger import setup_logger
+else:
+    from extractor import speaker_of
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+CACHE_DIR = '.analytics'
+MATRIX_FILE = 'matrix.npz'
+VOCAB_FILE = 'vocab.json'
+DOCS_FILE = 'docs.json'
+FOLDER_MD = '{year}/{month}/{lang}/md/'
+
+TOKEN_REGEX = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*")
+NOTES_START = re.compile(r'^\[\^\d+\]:', re.MULTILINE)
+WORDS_PER_MINUTE = 200
+GROUPS = ('speaker', 'year', 'decade', 'lang', 'conference')
+
+
+def tokenize(content):
+    """
+    Lowercased word tokens of a talk body, footnotes excluded.
+    """
+    match = NOTES_START.search(content)
+    if match:
+        content = content[:match.start()]
+    return TOKEN_REGEX.findall(content.lower())
+
+
+class Corpus:
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.vocab = []
+        self.term_ids = {}
+        self.docs = []
+        self.matrix = sp.csr_matrix((0, 0), dtype=np.int32)
+
+    @classmethod
+    def load(cls, cache_dir=CACHE_DIR):
+        corpus = cls(cache_dir)
+        matrix_path = os.path.join(cache_dir, MATRIX_FILE)
+        if not os.path.exists(matrix_path):
+            return corpus
+
+        corpus.matrix = sp.load_npz(matrix_path).tocsr()
+        with open(os.path.join(cache_dir, VOCAB_FILE), encoding='utf-8') as fin:
+            corpus.vocab = json.load(fin)
+        with open(os.path.join(cache_dir, DOCS_FILE), encoding='utf-8') as fin:
+            corpus.docs = json.load(fin)
+        corpus.term_ids = {term: i for i, term in enumerate(corpus.vocab)}
+        return corpus
+
+    def save(self):
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        sp.save_npz(os.path.join(self.cache_dir, MATRIX_FILE), self.matrix)
+        with open(os.path.join(self.cache_dir, VOCAB_FILE), 'w',
+                  encoding='utf-8') as fout:
+            json.dump(self.vocab, fout, ensure_ascii=False)
+        with open(os.path.join(self.cache_dir, DOCS_FILE), 'w',
+                  encoding='utf-8') as fout:
+            json.dump(self.docs, fout, ensure_ascii=False)
+
+    def _row(self, tokens):
+        ids = np.fromiter(
+            (self.term_ids.setdefault(t, len(self.term_ids)) for t in tokens),
+            dtype=np.int64,
+            count=len(tokens),
+        )
+        columns, counts = np.unique(ids, return_counts=True)
+        return columns, counts
+
+    def add_conference(self, year, month, lang):
+        """
+        Tokenize new or changed talks of a conference into the matrix.
+        """
+        folder_md = FOLDER_MD.format(year=year, month=month, lang=lang)
+        rows = {
+            (d['year'], d['month'], d['lang'], d['slug']): i
+            for i, d in enumerate(self.docs)
+        }
+
+        replaced = set()
+        new_docs = []
+        new_rows = []
+        for entry in sorted(os.scandir(folder_md), key=lambda e: e.name):
+            if not entry.name.endswith('.md'):
+                continue
+            slug = entry.name[:-len('.md')]
+            mtime = entry.stat().st_mtime_ns
+            row = rows.get((year, month, lang, slug))
+            if row is not None:
+                if self.docs[row]['mtime'] == mtime:
+                    continue
+                replaced.add(row)
+
+            with open(entry.path, encoding='utf-8') as fin:
+                content = fin.read()
+            tokens = tokenize(content)
+            new_rows.append(self._row(tokens))
+            new_docs.append({
+                'year': year,
+                'month': month,
+                'lang': lang,
+                'slug': slug,
+                'speaker': speaker_of(content),
+                'words': len(tokens),
+                'mtime': mtime,
+            })
+
+        if not new_docs:
+            return 0
+
+        self.vocab.extend(
+            sorted(self.term_ids, key=self.term_ids.get)[len(self.vocab):]
+        )
+
+        keep = [i for i in range(len(self.docs)) if i not in replaced]
+        old = self.matrix[keep] if replaced else self.matrix
+        old.resize((old.shape[0], len(self.vocab)))
+
+        indptr = np.cumsum([0] + [len(c) for c, _ in new_rows])
+        indices = np.concatenate([c for c, _ in new_rows])
+        data = np.concatenate([n for _, n in new_rows]).astype(np.int32)
+        added = sp.csr_matrix(
+            (data, indices, indptr),
+            shape=(len(new_rows), len(self.vocab)),
+        )
+
+        self.matrix = sp.vstack([old, added], format='csr')
+        self.docs = [self.docs[i] for i in keep] + new_docs
+        logger.info('{} talks tokenized from {}'.format(len(new_docs), folder_md))
+        return len(new_docs)
+
+    def labels(self, by):
+        if by == 'decade':
+            return np.array([d['year'][:3] + '0s' for d in self.docs])
+        if by == 'conference':
+            return np.array(
+                ['{}/{}'.format(d['year'], d['month']) for d in self.docs]
+            )
+        return np.array([str(d[by]) for d in self.docs])
+
+    def mask(self, lang=None, speaker=None, start=None, end=None):
+        """
+        Boolean row selection by language, speaker and year range.
+        """
+        selected = np.ones(len(self.docs), dtype=bool)
+        if lang:
+            selected &= self.labels('lang') == lang
+        if speaker:
+            selected &= self.labels('speaker') == speaker
+        if start or end:
+            years = self.labels('year').astype(int)
+            if start:
+                selected &= years >= int(start)
+            if end:
+                selected &= years <= int(end)
+        return selected
+
+    def grouping(self, by, selected):
+        """
+        Return group names and a sparse (groups x docs) indicator matrix.
+        """
+        labels = self.labels(by)
+        names, inverse = np.unique(labels[selected], return_inverse=True)
+        rows = np.flatnonzero(selected)
+        indicator = sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (inverse, rows)),
+            shape=(len(names), len(self.docs)),
+        )
+        return names, indicator
+
+    def idf(self, selected):
+        matrix = self.matrix[np.flatnonzero(selected)]
+        document_frequency = np.bincount(
+            matrix.indices,
+            minlength=matrix.shape[1],
+        )
+        return np.log((1 + matrix.shape[0]) / (1 + document_frequency)) + 1
+
+    def term_counts(self, by, selected):
+        names, indicator = self.grouping(by, selected)
+        return names, (indicator @ self.matrix).tocsr()
+
+    def tfidf(self, by, selected):
+        """
+        L2-normalized TF-IDF vectors, one row per group.
+        """
+        names, counts = self.term_counts(by, selected)
+        weights = counts.multiply(self.idf(selected)).tocsr()
+        norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)))
+        norms[norms == 0] = 1
+        return names, sp.csr_matrix(weights.multiply(1 / norms))
+
+    def top_terms(self, matrix, names, top):
+        results = {}
+        for i, name in enumerate(names):
+            row = matrix.getrow(i)
+            order = np.argsort(row.data)[::-1][:top]
+            results[name] = [
+                (self.vocab[row.indices[j]], float(row.data[j]))
+                for j in order
+            ]
+        return results
+
+    def reading_time(self, by, selected):
+        """
+        Average minutes per talk for each group.
+        """
+        names, indicator = self.grouping(by, selected)
+        words = np.array([d['words'] for d in self.docs], dtype=np.float64)
+        talks = np.asarray(indicator.sum(axis=1)).ravel()
+        minutes = indicator @ words / np.maximum(talks, 1) / WORDS_PER_MINUTE
+        return dict(zip(names, minutes))
+
+    def drift(self, selected, by='decade'):
+        """
+        Cosine distance between the TF-IDF centroids of consecutive groups.
+        """
+        names, vectors = self.tfidf(by, selected)
+        similarity = np.asarray(
+            vectors[:-1].multiply(vectors[1:]).sum(axis=1)
+        ).ravel()
+        return [
+            (names[i], names[i + 1], float(1 - similarity[i]))
+            for i in range(len(similarity))
+        ]
+
+
+def update(year, month, languages, cache_dir=CACHE_DIR):
+    corpus = Corpus.load(cache_dir)
+    added = sum(corpus.add_conference(year, month, lang) for lang in languages)
+    if added:
+        corpus.save()
+    return corpus
+
+
+def report(corpus, by='speaker', top=20, lang=None, speaker=None,
+           start=None, end=None):
+    selected = corpus.mask(lang=lang, speaker=speaker, start=start, end=end)
+    if not selected.any():
+        print('No talks selected.')
+        return
+
+    names, weights = corpus.tfidf(by, selected)
+    minutes = corpus.reading_time(by, selected)
+    for name, terms in corpus.top_terms(weights, names, top).items():
+        print('{} ({:.1f} min/talk)'.format(name, minutes[name]))
+        print('    ' + ', '.join(term for term, _ in terms))
+
+    if by in ('decade', 'year') and len(names) > 1:
+        for before, after, distance in corpus.drift(selected, by):
+            print('{} -> {}: drift {:.3f}'.format(before, after, distance))
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    if args.update:
+        corpus = update(args.year, args.month, args.languages)
+    else:
+        corpus = Corpus.load()
+
+    report(
+        corpus,
+        by=args.by,
+        top=args.top,
+        lang=args.lang,
+        speaker=args.speaker,
+        start=args.start,
+        end=args.end,
+    )
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "year",
+        nargs='?',
+        help="The year of the conference (e.g. 2017).",
+    )
+    parser.add_argument(
+        "month",
+        nargs='?',
+        help="The month of the conference (i.e. 04 or 10).",
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--languages',
+        action='store',
+        dest='languages',
+        default=['eng', 'hun'],
+        nargs='+',
+    )
+
+    parser.add_argument(
+        '--update',
+        action='store_true',
+        help="Tokenize the given conference into the cached matrix first.",
+    )
+
+    parser.add_argument('--by', choices=GROUPS, default='speaker')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--lang', default=None)
+    parser.add_argument('--speaker', default=None)
+    parser.add_argument('--start', default=None, help="First year.")
+    parser.add_argument('--end', default=None, help="Last year.")
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+"""
+Library API for downloading, converting and publishing conferences
+
+The same steps as `core.py download|convert|publish`, returning dataclass
+results instead of logging, each with an async twin that runs it in a
+worker thread so many builds can share one event loop:
+
+    import cr
+
+    result = cr.download_talks('2021', '04', 'eng')
+    results = await asyncio.gather(
+        cr.convert_talks_async('2021', '04', 'eng'),
+        cr.convert_talks_async('2021', '04', 'hun'),
+    )
+
+Paths are relative to the working directory, as for the command line.
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import asyncio
+import threading
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+if __package__:
+    from . import assets
+    from . import citations
+    from . import converter
+    from . import epub
+    from . import extractor
+    from . import fetch
+    from . import pack
+    from . import store
+else:
+    import assets
+    import citations
+    import converter
+    import epub
+    import extractor
+    import fetch
+    import pack
+    import store
+
+try:
+    if __package__:
+        from . import analytics
+    else:
+        import analytics
+except ImportError:
+    analytics = None
+
+__all__ = [
+    'DownloadResult',
+    'ConvertResult',
+    'PublishResult',
+    'BuildResult',
+    'get_slugs',
+    'download_talks',
+    'convert_talks',
+    'publish',
+    'build',
+    'get_slugs_async',
+    'download_talks_async',
+    'convert_talks_async',
+    'publish_async',
+    'build_async',
+]
+
+
+@dataclass
+class DownloadResult:
+    year: str
+    month: str
+    lang: str
+    slugs: List[str]
+    paths: List[str]
+    summary: str = ''
+
+    @property
+    def missing(self):
+        downloaded = {path.rsplit('/', 1)[-1][:-len('.html')]
+                      for path in self.paths}
+        return [slug for slug in self.slugs if slug not in downloaded]
+
+
+@dataclass
+class ConvertResult:
+    year: str
+    month: str
+    lang: str
+    paths: List[str]
+
+
+@dataclass
+class PublishResult:
+    year: str
+    month: str
+    languages: List[str]
+    path: str
+
+
+@dataclass
+class BuildResult:
+    year: str
+    month: str
+    languages: List[str]
+    downloads: List[DownloadResult] = field(default_factory=list)
+    conversions: List[ConvertResult] = field(default_factory=list)
+    publication: Optional[PublishResult] = None
+
+
+# The analytics cache is one file for every conference and language
+analytics_lock = threading.Lock()
+
+
+def open_store(store_root):
+    return store.Store(store_root) if store_root else None
+
+
+def get_slugs(year, month, lang, controller=None):
+    """
+    Slugs of the apostles' talks in a conference.
+    """
+    return extractor.get_slugs(year, month, lang, controller)
+
+
+def download_talks(year, month, lang, slugs=None, store_root=None,
+                   controller=None):
+    """
+    Download a conference's talks, looking up the slugs unless given.
+    """
+    controller = controller or fetch.AdaptiveController()
+    if slugs is None:
+        slugs = get_slugs(year, month, lang, controller)
+    paths = extractor.download_talks(
+        slugs,
+        year,
+        month,
+        lang,
+        open_store(store_root),
+        controller,
+    )
+    return DownloadResult(year, month, lang, list(slugs), paths,
+                          controller.summary())
+
+
+def convert_talks(year, month, lang, store_root=None, pack_path=None,
+                  images=False):
+    """
+    Convert a conference's downloaded talks to Markdown, with local
+    copies of their images if asked, and index their citations and
+    vocabulary.
+    """
+    reader = pack.PackReader(pack_path) if pack_path else None
+    try:
+        if images:
+            paths = assets.convert_talks(
+                year,
+                month,
+                [lang],
+                reader,
+                open_store(store_root),
+            )[lang]
+        else:
+            paths = converter.convert_talks(
+                year,
+                month,
+                lang,
+                reader,
+                open_store(store_root),
+            )
+    finally:
+        if reader is not None:
+            reader.close()
+
+    # The same indexes 'core.py convert' keeps up to date
+    citations.index_conference(year, month, lang)
+    if analytics is not None:
+        with analytics_lock:
+            analytics.update(year, month, [lang])
+    return ConvertResult(year, month, lang, paths)
+
+
+def publish(year, month, languages, incremental=True, force=False):
+    """
+    Build a conference's EPUB from its converted talks.
+    """
+    path = epub.build_conference(year, month, languages, incremental, force)
+    return PublishResult(year, month, list(languages), path)
+
+
+def build(year, month, languages, store_root=None):
+    """
+    Download, convert and publish a conference.
+    """
+    result = BuildResult(year, month, list(languages))
+    controller = fetch.AdaptiveController()
+    for lang in languages:
+        result.downloads.append(download_talks(
+            year, month, lang, store_root=store_root, controller=controller))
+        result.conversions.append(convert_talks(
+            year, month, lang, store_root=store_root))
+    result.publication = publish(year, month, languages)
+    return result
+
+
+async def get_slugs_async(*args, **kwargs):
+    return await asyncio.to_thread(get_slugs, *args, **kwargs)
+
+
+async def download_talks_async(*args, **kwargs):
+    return await asyncio.to_thread(download_talks, *args, **kwargs)
+
+
+async def convert_talks_async(*args, **kwargs):
+    return await asyncio.to_thread(convert_talks, *args, **kwargs)
+
+
+async def publish_async(*args, **kwargs):
+    return await asyncio.to_thread(publish, *args, **kwargs)
+
+
+async def build_async(year, month, languages, store_root=None):
+    """
+    Like build, with the languages downloaded and converted concurrently.
+    """
+    controller = fetch.AdaptiveController()
+
+    async def build_lang(lang):
+        downloaded = await download_talks_async(
+            year, month, lang, store_root=store_root, controller=controller)
+        converted = await convert_talks_async(
+            year, month, lang, store_root=store_root)
+        return downloaded, converted
+
+    done = await asyncio.gather(*(build_lang(lang) for lang in languages))
+    result = BuildResult(year, month, list(languages))
+    for downloaded, converted in done:
+        result.downloads.append(downloaded)
+        result.conversions.append(converted)
+    result.publication = await publish_async(year, month, languages)
+    return result
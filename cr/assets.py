@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+
+"""
+Fetch, shrink and embed talk images for EPUB output
+
+Talks converted with images keep their `![alt](src)` links. This stage
+downloads every image once through the cached fetch layer, downsizes and
+recompresses them in a process pool, stores each distinct image once,
+named by the hash of its download, and points the Markdown at the local
+copy so pandoc embeds it. `core.py convert --images` does this before the
+Markdown is written, so each talk is written once. If the images of a
+book exceed the size budget they are recompressed harder, and as a last
+resort the largest are replaced by their alt text.
+
+    {year}/{month}/img/{hash}.jpg
+
+python assets.py YYYY MM [--budget 5000000]
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import hashlib
+import io
+import itertools
+import os
+import re
+
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urljoin
+
+if __package__:
+    from . import converter
+    from . import fetch
+    from .logger import setup_logger
+else:
+    import converter
+    import fetch
+    from logger import setup_logger
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = setup_logger(logfile=None)
+
+
+FOLDER_MD = '{year}/{month}/{lang}/md/'
+FOLDER_IMG = '{year}/{month}/img/'
+FILEPATH_IMG = FOLDER_IMG + '{digest}.jpg'
+BASE_URL = 'https://www.churchofjesuschrist.org/'
+
+IMAGE_REGEX = re.compile(r'!\[(?P<alt>[^\]]*)\]\((?P<src>[^)\s]+)[^)]*\)')
+REMOTE_REGEX = re.compile(r'^(https?:)?/')
+
+DEFAULT_BUDGET = 5 * 1024 * 1024
+DEFAULT_SIZE = 1200
+DEFAULT_QUALITY = 75
+MIN_QUALITY = 40
+SHRINK_ROUNDS = 3
+SHRINK_FACTOR = 0.75
+QUALITY_STEP = 15
+
+
+def recompress(data, size=DEFAULT_SIZE, quality=DEFAULT_QUALITY):
+    """
+    Fit an image within size x size pixels and encode it as JPEG.
+    """
+    image = Image.open(io.BytesIO(data))
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    image.thumbnail((size, size))
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def _recompress(args):
+    digest, data, size, quality = args
+    try:
+        return digest, recompress(data, size, quality)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.error('{} {}'.format(digest, e))
+        return digest, None
+
+
+def find_images(contents):
+    """
+    Map absolute image URL -> alt text for every image in the talks.
+    """
+    images = {}
+    for content in contents:
+        for match in IMAGE_REGEX.finditer(content):
+            if REMOTE_REGEX.match(match['src']):
+                images[urljoin(BASE_URL, match['src'])] = match['alt']
+    return images
+
+
+def shrink(originals, size, quality, budget, workers=None):
+    """
+    Recompress images until their total size fits the budget.
+
+    Returns digest -> encoded bytes; images that can't fit are left out.
+    """
+    encoded = {}
+    for _ in range(SHRINK_ROUNDS + 1):
+        jobs = [(d, data, size, quality) for d, data in originals.items()]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            encoded = {
+                digest: data
+                for digest, data in executor.map(_recompress, jobs)
+                if data is not None
+            }
+
+        total = sum(len(data) for data in encoded.values())
+        logger.info('{} images, {} bytes at {}px q{}'.format(
+            len(encoded), total, size, quality))
+        if total <= budget:
+            return encoded
+        size = int(size * SHRINK_FACTOR)
+        quality = max(MIN_QUALITY, quality - QUALITY_STEP)
+
+    for digest in sorted(encoded, key=lambda d: -len(encoded[d])):
+        if total <= budget:
+            break
+        total -= len(encoded.pop(digest))
+        logger.info('dropping image {} to fit the budget'.format(digest))
+    return encoded
+
+
+def localize_images(year, month, contents, budget=DEFAULT_BUDGET,
+                    size=DEFAULT_SIZE, quality=DEFAULT_QUALITY, workers=None):
+    """
+    Fetch and shrink the images of a conference's talks within a size
+    budget and point their links at the local copies.
+
+    contents maps filename -> Markdown; returns it with the links rewritten.
+    """
+    if Image is None:
+        logger.error('Pillow is required to process images')
+        return contents
+
+    images = find_images(contents.values())
+    originals = {}
+    digests = {}
+    for url, data in fetch.fetch_cached(images):
+        if isinstance(data, Exception):
+            logger.error('{} {}'.format(url, data))
+            continue
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        digests[url] = digest
+        originals[digest] = data
+
+    encoded = shrink(originals, size, quality, budget, workers)
+
+    for digest, data in encoded.items():
+        filename = FILEPATH_IMG.format(year=year, month=month, digest=digest)
+        if os.path.exists(filename):
+            with open(filename, 'rb') as fin:
+                if fin.read() == data:
+                    continue
+        ensure_path_exists(filename)
+        with open(filename, 'wb') as fout:
+            fout.write(data)
+
+    local = {
+        url: FILEPATH_IMG.format(year=year, month=month, digest=digest)
+        for url, digest in digests.items()
+        if digest in encoded
+    }
+
+    def replace(match):
+        src = urljoin(BASE_URL, match['src'])
+        if src in local:
+            return '![{}]({})'.format(match['alt'], local[src])
+        if src in images:
+            # Not downloaded or over budget: keep the description only
+            return match['alt']
+        return match.group(0)
+
+    return {
+        filename: IMAGE_REGEX.sub(replace, content)
+        for filename, content in contents.items()
+    }
+
+
+def convert_talks(year, month, languages, pack=None, store=None,
+                  budget=DEFAULT_BUDGET, size=DEFAULT_SIZE,
+                  quality=DEFAULT_QUALITY, workers=None, profiler=None):
+    """
+    Convert a conference's talks with their images, writing each talk once
+    with its links already local. Every language is converted before any
+    is written so the images of the whole book share one budget.
+
+    Returns {lang: md paths}.
+    """
+    talks = {
+        lang: list(converter.convert_conference(
+            year, month, lang, pack, True, profiler))
+        for lang in languages
+    }
+    contents = localize_images(
+        year,
+        month,
+        dict(itertools.chain.from_iterable(talks.values())),
+        budget,
+        size,
+        quality,
+        workers,
+    )
+    return {
+        lang: converter.write_talks(
+            year,
+            month,
+            lang,
+            [(filename, contents[filename]) for filename, _ in talks[lang]],
+            store,
+        )
+        for lang in languages
+    }
+
+
+def process_images(year, month, languages, budget=DEFAULT_BUDGET,
+                   size=DEFAULT_SIZE, quality=DEFAULT_QUALITY, workers=None,
+                   store=None):
+    """
+    Localize the images of a conference's converted talks within a size
+    budget. Returns the paths that changed.
+    """
+    contents = {}
+    names = {}
+    for lang in languages:
+        folder_md = FOLDER_MD.format(year=year, month=month, lang=lang)
+        for entry in os.scandir(folder_md):
+            if entry.name.endswith('.md'):
+                with open(entry.path, encoding='utf-8') as fin:
+                    contents[entry.path] = fin.read()
+                names[entry.path] = (lang, entry.name)
+
+    updated = localize_images(year, month, contents, budget, size, quality,
+                              workers)
+
+    changed = []
+    manifests = {}
+    for path, content in updated.items():
+        if content == contents[path]:
+            continue
+        changed.append(path)
+
+        lang, name = names[path]
+        if store is not None:
+            if lang not in manifests:
+                manifests[lang] = store.manifest(year, month, lang)
+            store.write_file(path, content.encode('utf-8'), manifests[lang],
+                             'md/' + name)
+            continue
+
+        with open(path, 'w', encoding='utf-8') as fout:
+            fout.write(content)
+
+    for manifest in manifests.values():
+        manifest.save()
+
+    return changed
+
+
+def ensure_path_exists(path):
+    dirs = os.path.dirname(path)
+    if not os.path.exists(dirs):
+        os.makedirs(dirs)
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    process_images(
+        args.year,
+        args.month,
+        args.languages,
+        args.budget,
+        args.size,
+        args.quality,
+    )
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    # Required positional argument
+    parser.add_argument("year", help="The year of the conference (e.g. 2017).")
+    parser.add_argument(
+        "month",
+        help="The month of the conference (i.e. 04 or 10).",
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--languages',
+        action='store',
+        dest='languages',
+        default=['eng', 'hun'],
+        nargs='+',
+    )
+
+    parser.add_argument(
+        '--budget',
+        action='store',
+        dest='budget',
+        default=DEFAULT_BUDGET,
+        type=int,
+        help="Maximum total size of the book's images in bytes.",
+    )
+
+    parser.add_argument(
+        '--size',
+        action='store',
+        dest='size',
+        default=DEFAULT_SIZE,
+        type=int,
+        help="Maximum width and height of an image in pixels.",
+    )
+
+    parser.add_argument(
+        '--quality',
+        action='store',
+        dest='quality',
+        default=DEFAULT_QUALITY,
+        type=int,
+        help="JPEG quality (1-95).",
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""
+Read the curated speech catalog (data.yaml)
+
+The catalog is a flat list of `key: value` records. Titles such as
+"Truth: The Foundation of Correct Decisions" aren't quoted, so the file is
+read line by line rather than with a YAML parser.
+
+python catalog.py
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+
+from urllib.parse import urlsplit
+
+if __package__:
+    from .logger import setup_logger
+else:
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+DEFAULT_CATALOG = '../data.yaml'
+ENTRY_START = '- '
+
+HOST_ALIASES = {
+    'lds.org': 'www.churchofjesuschrist.org',
+    'www.lds.org': 'www.churchofjesuschrist.org',
+    'churchofjesuschrist.org': 'www.churchofjesuschrist.org',
+}
+
+
+def read_catalog(path=DEFAULT_CATALOG):
+    """
+    Return the catalog entries as a list of dicts.
+    """
+    entries = []
+    entry = None
+    with open(path, encoding='utf-8') as fin:
+        for number, line in enumerate(fin, start=1):
+            stripped = line.strip()
+            if not stripped or stripped.startswith('#'):
+                continue
+
+            if stripped.startswith(ENTRY_START):
+                entry = {'line': number}
+                entries.append(entry)
+                stripped = stripped[len(ENTRY_START):]
+
+            key, _, value = stripped.partition(':')
+            if entry is None or not _:
+                logger.warning('{}:{} skipped: {}'.format(path, number, line))
+                continue
+            entry[key.strip()] = value.strip()
+
+    return entries
+
+
+def normalize_url(url):
+    """
+    Reduce a catalog URL to host and path so aliases of one page compare
+    equal (lds.org vs churchofjesuschrist.org, query strings, case).
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    host = HOST_ALIASES.get(host, host)
+    return host + parts.path.rstrip('/').lower()
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    for entry in read_catalog(args.catalog):
+        print('{type}: {speaker} - {title}'.format(**entry))
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--catalog',
+        action='store',
+        dest='catalog',
+        default=DEFAULT_CATALOG,
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
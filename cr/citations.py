@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+
+"""
+Extract scripture citations from talk footnotes into a searchable index
+
+The footnotes written by converter (`[^n]: ...`) are parsed into normalized
+references (book, chapter, verse range) using English and Hungarian book
+names, and stored in an SQLite index:
+
+python citations.py YYYY MM
+python citations.py --ref "Moroni 10:4-5"
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import os
+import re
+import sqlite3
+
+if __package__:
+    from .logger import setup_logger
+else:
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+DEFAULT_INDEX = 'citations.db'
+FOLDER_MD = '{year}/{month}/{lang}/md/'
+
+NOTE_LINE = r'^\[\^(\d+)\]:\s*(.*)$'
+NOTE_REGEX = re.compile(NOTE_LINE, re.MULTILINE)
+
+# Canonical (English) book name -> other English and Hungarian spellings
+BOOKS = {
+    'Genesis': ['Gen.', '1 Mózes', '1 Móz.'],
+    'Exodus': ['Ex.', '2 Mózes', '2 Móz.'],
+    'Leviticus': ['Lev.', '3 Mózes', '3 Móz.'],
+    'Numbers': ['Num.', '4 Mózes', '4 Móz.'],
+    'Deuteronomy': ['Deut.', '5 Mózes', '5 Móz.'],
+    'Joshua': ['Józsué'],
+    'Judges': ['Bírák'],
+    'Ruth': [],
+    '1 Samuel': ['1 Sámuel'],
+    '2 Samuel': ['2 Sámuel'],
+    '1 Kings': ['1 Királyok'],
+    '2 Kings': ['2 Királyok'],
+    '1 Chronicles': ['1 Krónikák'],
+    '2 Chronicles': ['2 Krónikák'],
+    'Ezra': ['Ezsdrás'],
+    'Nehemiah': ['Nehémiás'],
+    'Esther': ['Eszter'],
+    'Job': ['Jób'],
+    'Psalms': ['Psalm', 'Ps.', 'Zsoltárok', 'Zsolt.'],
+    'Proverbs': ['Prov.', 'Példabeszédek', 'Péld.'],
+    'Ecclesiastes': ['Prédikátor'],
+    'Song of Solomon': ['Énekek éneke'],
+    'Isaiah': ['Isa.', 'Ésaiás', 'Ésa.'],
+    'Jeremiah': ['Jer.', 'Jeremiás'],
+    'Lamentations': ['Jeremiás siralmai'],
+    'Ezekiel': ['Ezek.', 'Ezékiel'],
+    'Daniel': ['Dániel'],
+    'Hosea': ['Hóseás'],
+    'Joel': ['Jóel'],
+    'Amos': ['Ámós'],
+    'Obadiah': ['Abdiás'],
+    'Jonah': ['Jónás'],
+    'Micah': ['Mikeás'],
+    'Nahum': ['Náhum'],
+    'Habakkuk': ['Habakuk'],
+    'Zephaniah': ['Sofóniás'],
+    'Haggai': ['Aggeus'],
+    'Zechariah': ['Zakariás'],
+    'Malachi': ['Mal.', 'Malakiás'],
+    'Matthew': ['Matt.', 'Máté'],
+    'Mark': ['Márk'],
+    'Luke': ['Lukács'],
+    'John': ['János'],
+    'Acts': ['Apostolok cselekedetei', 'ApCsel'],
+    'Romans': ['Rom.', 'Róma', 'Róm.'],
+    '1 Corinthians': ['1 Cor.', '1 Korinthus', '1 Kor.'],
+    '2 Corinthians': ['2 Cor.', '2 Korinthus', '2 Kor.'],
+    'Galatians': ['Gal.', 'Galata'],
+    'Ephesians': ['Eph.', 'Efézus', 'Ef.'],
+    'Philippians': ['Philip.', 'Filippi', 'Fil.'],
+    'Colossians': ['Col.', 'Kolossé', 'Kol.'],
+    '1 Thessalonians': ['1 Thes.', '1 Thesszalonika'],
+    '2 Thessalonians': ['2 Thes.', '2 Thesszalonika'],
+    '1 Timothy': ['1 Tim.', '1 Timóteus'],
+    '2 Timothy': ['2 Tim.', '2 Timóteus'],
+    'Titus': ['Titusz'],
+    'Philemon': ['Filemon'],
+    'Hebrews': ['Heb.', 'Zsidók', 'Zsid.'],
+    'James': ['Jakab'],
+    '1 Peter': ['1 Pet.', '1 Péter'],
+    '2 Peter': ['2 Pet.', '2 Péter'],
+    '1 John': ['1 János'],
+    '2 John': ['2 János'],
+    '3 John': ['3 János'],
+    'Jude': ['Júdás'],
+    'Revelation': ['Rev.', 'Jelenések'],
+    '1 Nephi': ['1 Ne.', '1 Nefi'],
+    '2 Nephi': ['2 Ne.', '2 Nefi'],
+    'Jacob': ['Jákób'],
+    'Enos': ['Énós'],
+    'Jarom': ['Járom'],
+    'Omni': [],
+    'Words of Mormon': ['Mormon szavai'],
+    'Mosiah': ['Móziás'],
+    'Alma': [],
+    'Helaman': ['Hel.', 'Hélamán'],
+    '3 Nephi': ['3 Ne.', '3 Nefi'],
+    '4 Nephi': ['4 Ne.', '4 Nefi'],
+    'Mormon': ['Morm.'],
+    'Ether': [],
+    'Moroni': ['Moro.', 'Moróni'],
+    'Doctrine and Covenants': ['D&C', 'Tan és a szövetségek', 'T&Sz'],
+    'Moses': ['Mózes'],
+    'Abraham': ['Abr.', 'Ábrahám'],
+    'Joseph Smith—Matthew': ['Joseph Smith – Máté'],
+    'Joseph Smith—History': ['Joseph Smith – Történet'],
+    'Articles of Faith': ['Hittételek'],
+}
+
+BOOK_NAMES = {
+    alias: book
+    for book, aliases in BOOKS.items()
+    for alias in [book] + aliases
+}
+
+DASHES = '-–—'
+VERSES = r'\d+(?:\s*[{d}]\s*\d+)?(?:\s*,\s*\d+(?:\s*[{d}]\s*\d+)?)*'.format(
+    d=DASHES,
+)
+BOOK_PATTERN = '|'.join(
+    re.escape(name) for name in sorted(BOOK_NAMES, key=len, reverse=True)
+)
+REFERENCE_REGEX = re.compile(
+    r'(?<!\w)(?P<book>{books})\s+(?P<chapter>\d+)(?::(?P<verses>{verses}))?'
+    .format(books=BOOK_PATTERN, verses=VERSES)
+)
+# "Moroni 10:4–5; 7:16" cites a second chapter of the same book
+CONTINUATION_REGEX = re.compile(
+    r'\s*;\s*(?P<chapter>\d+):(?P<verses>{verses})'.format(verses=VERSES)
+)
+RANGE_REGEX = re.compile(r'\s*[{d}]\s*'.format(d=DASHES))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS citations (
+    book TEXT NOT NULL,
+    chapter INTEGER NOT NULL,
+    verse_start INTEGER,
+    verse_end INTEGER,
+    year TEXT NOT NULL,
+    month TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    slug TEXT NOT NULL,
+    note INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS citations_reference
+    ON citations (book, chapter, verse_start, verse_end);
+CREATE INDEX IF NOT EXISTS citations_talk
+    ON citations (year, month, lang, slug);
+"""
+
+
+def parse_verses(verses):
+    """
+    Turn "4–5, 9" into [(4, 5), (9, 9)]. No verses means the whole chapter.
+    """
+    if not verses:
+        return [(None, None)]
+
+    ranges = []
+    for part in verses.split(','):
+        bounds = RANGE_REGEX.split(part.strip())
+        start = int(bounds[0])
+        end = int(bounds[-1])
+        ranges.append((start, max(start, end)))
+    return ranges
+
+
+def parse_references(text):
+    """
+    Return normalized (book, chapter, verse_start, verse_end) tuples.
+    """
+    references = []
+    for match in REFERENCE_REGEX.finditer(text):
+        book = BOOK_NAMES[match['book']]
+        chapters = [(match['chapter'], match['verses'])]
+
+        position = match.end()
+        while True:
+            continuation = CONTINUATION_REGEX.match(text, position)
+            if not continuation:
+                break
+            chapters.append((continuation['chapter'], continuation['verses']))
+            position = continuation.end()
+
+        for chapter, verses in chapters:
+            for start, end in parse_verses(verses):
+                references.append((book, int(chapter), start, end))
+
+    return references
+
+
+def parse_notes(content):
+    """
+    Yield (note number, references) for each footnote of a talk.
+    """
+    for match in NOTE_REGEX.finditer(content):
+        references = parse_references(match.group(2))
+        if references:
+            yield int(match.group(1)), references
+
+
+def connect(path=DEFAULT_INDEX):
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def index_conference(year, month, lang, path=DEFAULT_INDEX):
+    """
+    Replace the indexed citations of a conference with the current md/ files.
+    """
+    folder_md = FOLDER_MD.format(year=year, month=month, lang=lang)
+    rows = []
+    for entry in os.scandir(folder_md):
+        if not entry.name.endswith('.md'):
+            continue
+        slug = entry.name[:-len('.md')]
+        with open(entry.path, encoding='utf-8') as fin:
+            content = fin.read()
+
+        for note, references in parse_notes(content):
+            for book, chapter, start, end in references:
+                rows.append(
+                    (book, chapter, start, end, year, month, lang, slug, note)
+                )
+
+    with connect(path) as connection:
+        connection.execute(
+            'DELETE FROM citations WHERE year = ? AND month = ? AND lang = ?',
+            (year, month, lang),
+        )
+        connection.executemany(
+            'INSERT INTO citations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            rows,
+        )
+    connection.close()
+
+    logger.info('{} citations in {}'.format(len(rows), folder_md))
+    return len(rows)
+
+
+def find_talks(reference, path=DEFAULT_INDEX):
+    """
+    Return (year, month, lang, slug, note) for talks citing any verse of the
+    given reference string, e.g. "Moroni 10:4-5".
+    """
+    references = parse_references(reference)
+    if not references:
+        raise ValueError('Not a scripture reference: {}'.format(reference))
+
+    results = set()
+    connection = connect(path)
+    for book, chapter, start, end in references:
+        if start is None:
+            cursor = connection.execute(
+                'SELECT year, month, lang, slug, note FROM citations '
+                'WHERE book = ? AND chapter = ?',
+                (book, chapter),
+            )
+        else:
+            cursor = connection.execute(
+                'SELECT year, month, lang, slug, note FROM citations '
+                'WHERE book = ? AND chapter = ? AND ('
+                'verse_start IS NULL OR '
+                '(verse_start <= ? AND verse_end >= ?))',
+                (book, chapter, end, start),
+            )
+        results.update(cursor.fetchall())
+    connection.close()
+
+    return sorted(results)
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    if args.ref:
+        for year, month, lang, slug, note in find_talks(args.ref, args.index):
+            print('{}/{}/{}/{} [^{}]'.format(year, month, lang, slug, note))
+        return
+
+    for lang in args.languages:
+        index_conference(args.year, args.month, lang, args.index)
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "year",
+        nargs='?',
+        help="The year of the conference (e.g. 2017).",
+    )
+    parser.add_argument(
+        "month",
+        nargs='?',
+        help="The month of the conference (i.e. 04 or 10).",
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--languages',
+        action='store',
+        dest='languages',
+        default=['eng', 'hun'],
+        nargs='+',
+    )
+
+    parser.add_argument(
+        '--ref',
+        action='store',
+        dest='ref',
+        default=None,
+        help="Look up talks citing a reference (e.g. 'Moroni 10:4-5').",
+    )
+
+    parser.add_argument(
+        '--index',
+        action='store',
+        dest='index',
+        default=DEFAULT_INDEX,
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
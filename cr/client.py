@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+"""
+Send build jobs to a running daemon.py instead of running core.py
+
+Languages are handled concurrently by the daemon; build runs download,
+convert and publish in turn. Prints each job's result as JSON and exits
+non-zero if any job failed.
+
+python client.py download|convert|publish|build YYYY MM [-l eng hun]
+python client.py ping
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+
+# Same as daemon.DEFAULT_SOCKET, without importing the build modules
+DEFAULT_SOCKET = '.daemon.sock'
+ACTIONS = ['download', 'convert', 'publish', 'build', 'ping']
+
+_ids = itertools.count(1)
+
+
+async def submit(path, jobs):
+    """
+    Send jobs over one connection and return their replies in job order.
+    """
+    reader, writer = await asyncio.open_unix_connection(path)
+    for job in jobs:
+        job['id'] = next(_ids)
+        writer.write(json.dumps(job).encode('utf-8') + b'\n')
+    await writer.drain()
+    writer.write_eof()
+
+    replies = {}
+    while len(replies) < len(jobs):
+        line = await reader.readline()
+        if not line:
+            break
+        reply = json.loads(line)
+        replies[reply['id']] = reply
+    writer.close()
+    return [
+        replies.get(job['id'], {'id': job['id'], 'ok': False,
+                                'error': 'connection closed'})
+        for job in jobs
+    ]
+
+
+def jobs_for(action, year, month, languages, force=False):
+    if action == 'ping':
+        return [{'action': 'ping'}]
+    if action == 'publish':
+        return [{'action': 'publish', 'year': year, 'month': month,
+                 'languages': languages, 'force': force}]
+    return [{'action': action, 'year': year, 'month': month, 'lang': lang}
+            for lang in languages]
+
+
+async def run(args):
+    if args.action == 'build':
+        steps = ['download', 'convert', 'publish']
+    else:
+        steps = [args.action]
+
+    ok = True
+    for step in steps:
+        replies = await submit(args.socket, jobs_for(
+            step, args.year, args.month, args.languages, args.force))
+        for reply in replies:
+            print(json.dumps(reply))
+            ok = ok and reply.get('ok', False)
+        if not ok:
+            break
+    return ok
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("action", choices=ACTIONS, help="The job to run.")
+    parser.add_argument(
+        "year",
+        nargs='?',
+        help="The year of the conference (e.g. 2017).",
+    )
+    parser.add_argument(
+        "month",
+        nargs='?',
+        help="The month of the conference (i.e. 04 or 10).",
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--languages',
+        action='store',
+        dest='languages',
+        default=['eng', 'hun'],
+        nargs='+',
+    )
+
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        dest='force',
+        help="Publish even if the inputs match the last build.",
+    )
+
+    parser.add_argument(
+        '--socket',
+        action='store',
+        dest='socket',
+        default=DEFAULT_SOCKET,
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    sys.exit(0 if main(args) else 1)
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+
+"""
+Build EPUBs of talks chosen across the whole archive
+
+Every converted talk is listed in an index with its conference, language,
+speaker and title; only Markdown that changed since the last run is parsed
+again. Talks from other sources (sources.py, transcripts.py) have no
+conference and are listed under their source's name, without a year:
+
+    .build/index.json
+
+A collection selects talks by speaker, year range and language (e.g. all
+of one apostle's talks, or a decade omnibus) and is assembled from the
+conference EPUBs already built by epub.py: each chapter whose content
+still matches is copied from its conference's book without recompressing,
+and the rest are compressed in parallel. Talks are loaded in parallel from
+the IR cache, so nothing is converted again:
+
+    collections/{name}.epub
+
+python collection.py [--speaker NAME] [--from YYYY] [--to YYYY] [-l eng]
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import glob
+import json
+import os
+import re
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+if __package__:
+    from . import epub
+    from . import ir
+    from .logger import setup_logger
+else:
+    import epub
+    import ir
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+DEFAULT_INDEX = '.build/index.json'
+FILEPATH_COLLECTION = 'collections/{name}.epub'
+MD_GLOBS = [
+    '[0-9][0-9][0-9][0-9]/[0-9][0-9]/*/md/*.md',
+    'sources/*/*/md/*.md',
+]
+MD_PATH = re.compile(
+    r'^(?:(?P<year>\d{4})/(?P<month>\d{2})|sources/(?P<source>[^/]+))/'
+    r'(?P<lang>[^/]+)/md/(?P<slug>[^/]+)\.md$'
+)
+# Books of undated talks only, like the timestamps of zip entries
+UNDATED = '1980-01-01'
+NAME_REGEX = re.compile(r'[^a-z0-9]+')
+
+
+def talk_date(match):
+    """
+    The (year, month) a talk is filed under; ('', source) for a talk that
+    isn't from a conference.
+    """
+    if match['source']:
+        return '', match['source']
+    return match['year'], match['month']
+
+
+def index_talk(path):
+    """
+    The index entry of one talk's Markdown.
+    """
+    match = MD_PATH.match(path)
+    talk = ir.load(path, *talk_date(match), match['lang'])
+    stat = os.stat(path)
+    return {
+        'year': talk.year,
+        'month': talk.month,
+        'lang': talk.lang,
+        'slug': talk.slug,
+        'title': talk.title,
+        'speaker': talk.speaker,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+    }
+
+
+def build_index(path=DEFAULT_INDEX, workers=None):
+    """
+    Update the index of every converted talk and return it.
+
+    Returns {md path: entry}.
+    """
+    index = {}
+    if path and os.path.exists(path):
+        try:
+            with open(path, encoding='utf-8') as fin:
+                index = json.load(fin)
+        except ValueError:
+            index = {}
+
+    found = sorted(
+        md_path.replace(os.sep, '/')
+        for pattern in MD_GLOBS
+        for md_path in glob.glob(pattern)
+    )
+    changed = []
+    for md_path in found:
+        if not MD_PATH.match(md_path):
+            continue
+        stat = os.stat(md_path)
+        entry = index.get(md_path)
+        if entry is None or entry['size'] != stat.st_size or \
+                entry['mtime'] != stat.st_mtime_ns:
+            changed.append(md_path)
+
+    fresh = {md_path: index[md_path] for md_path in found
+             if md_path in index and md_path not in changed}
+    if changed:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            fresh.update(zip(
+                changed,
+                executor.map(index_talk, changed, chunksize=16),
+            ))
+
+    if path:
+        ensure_path_exists(path)
+        with open(path + '.tmp', 'w', encoding='utf-8') as fout:
+            json.dump(fresh, fout, ensure_ascii=False, indent=1,
+                      sort_keys=True)
+        os.replace(path + '.tmp', path)
+    logger.info('{} talks indexed, {} updated'.format(len(fresh), len(changed)))
+    return fresh
+
+
+def select(index, speaker=None, first=None, last=None, languages=None):
+    """
+    The md paths of the talks matching every given criterion, by date.
+
+    speaker matches any part of the speaker's name, ignoring case. A year
+    range leaves out talks without a year.
+    """
+    speaker = speaker.lower() if speaker else None
+    chosen = []
+    for md_path, entry in index.items():
+        if speaker and speaker not in (entry['speaker'] or '').lower():
+            continue
+        if first and entry['year'] < first:
+            continue
+        if last and entry['year'] > last:
+            continue
+        if languages and entry['lang'] not in languages:
+            continue
+        chosen.append(md_path)
+    return sorted(chosen, key=lambda md_path: (
+        index[md_path]['year'],
+        index[md_path]['month'],
+        index[md_path]['slug'],
+    ))
+
+
+def load_talks(md_paths):
+    """
+    Talks from the IR cache, for one conference.
+    """
+    talks = []
+    for md_path in md_paths:
+        match = MD_PATH.match(md_path)
+        talks.append(ir.load(md_path, *talk_date(match), match['lang']))
+    return talks
+
+
+def default_title(index, md_paths, speaker=None):
+    years = sorted({index[md_path]['year'] for md_path in md_paths} - {''})
+    span = ''
+    if years:
+        span = years[0] if years[0] == years[-1] else '{}–{}'.format(
+            years[0], years[-1])
+    if speaker:
+        names = sorted({index[md_path]['speaker'] for md_path in md_paths})
+        return 'Talks by {} {}'.format(' & '.join(names), span).strip()
+    return 'Conference Reports {}'.format(span).strip()
+
+
+def collection_name(title):
+    return NAME_REGEX.sub('-', title.lower()).strip('-')
+
+
+def build_collection(index, md_paths, title, filename=None, workers=None):
+    """
+    Build the EPUB of a collection and return its path.
+    """
+    filename = filename or FILEPATH_COLLECTION.format(
+        name=collection_name(title))
+
+    by_conference = defaultdict(list)
+    for md_path in md_paths:
+        entry = index[md_path]
+        by_conference[(entry['year'], entry['month'])].append(md_path)
+    conferences = sorted(by_conference)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        loaded = executor.map(
+            load_talks,
+            [by_conference[conference] for conference in conferences],
+        )
+        talks = {}
+        for conference_talks in loaded:
+            for talk in conference_talks:
+                talks[(talk.year, talk.month, talk.lang, talk.slug)] = talk
+    talks = [
+        talks[(index[p]['year'], index[p]['month'], index[p]['lang'],
+               index[p]['slug'])]
+        for p in md_paths
+    ]
+
+    languages = []
+    for talk in talks:
+        if talk.lang not in languages:
+            languages.append(talk.lang)
+    parts = [
+        (lang, [talk for talk in talks if talk.lang == lang])
+        for lang in languages
+    ]
+
+    # Each chapter as already compressed in its conference's book
+    sources = {
+        epub.chapter_path(talk, qualified=True): (
+            epub.FILEPATH_EPUB.format(year=talk.year, month=talk.month),
+            epub.chapter_path(talk),
+        )
+        for talk in talks if talk.year
+    }
+
+    dated = [conference for conference in conferences if conference[0]]
+    year, month = dated[-1] if dated else conferences[-1]
+    ensure_path_exists(filename)
+    written, reused = epub.write_epub(
+        filename,
+        epub.book_entries(year, month, parts, date=None if dated else UNDATED,
+                          title=title, qualified=True),
+        sources=sources,
+        workers=workers,
+    )
+    logger.info('{} ({} talks from {} conferences, {} entries compressed, '
+                '{} reused)'.format(filename, len(talks), len(conferences),
+                                    written, reused))
+    return filename
+
+
+def ensure_path_exists(path):
+    dirs = os.path.dirname(path)
+    if dirs and not os.path.exists(dirs):
+        os.makedirs(dirs)
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    index = build_index(args.index, args.workers)
+    md_paths = select(
+        index,
+        args.speaker,
+        args.first,
+        args.last,
+        args.languages,
+    )
+    if not md_paths:
+        logger.error('No talks match')
+        return None
+    if args.list:
+        for md_path in md_paths:
+            entry = index[md_path]
+            print('{}\t{}\t{}'.format(md_path, entry['speaker'] or '',
+                                      entry['title']))
+        return None
+    title = args.title or default_title(index, md_paths, args.speaker)
+    return build_collection(index, md_paths, title, args.output, args.workers)
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--speaker',
+        action='store',
+        dest='speaker',
+        default=None,
+        help="Part of the speaker's name (e.g. Holland).",
+    )
+
+    parser.add_argument(
+        '--from',
+        action='store',
+        dest='first',
+        default=None,
+        help="The first year to include (e.g. 2006).",
+    )
+
+    parser.add_argument(
+        '--to',
+        action='store',
+        dest='last',
+        default=None,
+        help="The last year to include (e.g. 2021).",
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--languages',
+        action='store',
+        dest='languages',
+        default=None,
+        nargs='+',
+    )
+
+    parser.add_argument(
+        '--title',
+        action='store',
+        dest='title',
+        default=None,
+    )
+
+    parser.add_argument(
+        '-o',
+        '--output',
+        action='store',
+        dest='output',
+        default=None,
+        help="Where to write the book (default collections/{title}.epub).",
+    )
+
+    parser.add_argument(
+        '--list',
+        action='store_true',
+        help="List the talks instead of building the book.",
+    )
+
+    parser.add_argument(
+        '--index',
+        action='store',
+        dest='index',
+        default=DEFAULT_INDEX,
+    )
+
+    parser.add_argument(
+        '--workers',
+        action='store',
+        dest='workers',
+        default=None,
+        type=int,
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
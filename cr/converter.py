@@ -14,7 +14,13 @@ import re
 
 from bs4 import BeautifulSoup
 from markdownify import markdownify as md
-from logger import setup_logger
+
+if __package__:
+    from . import profiles
+    from .logger import setup_logger
+else:
+    import profiles
+    from logger import setup_logger
 
 logger = setup_logger(logfile=None)
 
@@ -34,50 +40,100 @@ SPACES_REGEX = re.compile(LINE_SPACES, re.MULTILINE)
 CONTENT_TEMPLATE = '{body}\n\n{notes}'
 
 
-def convert_talks(year, month, lang):
+def read_talks(year, month, lang, pack=None):
     """
+    Yield (slug, html) for every downloaded talk, from a pack when given.
     """
-    md_dir = FOLDER_MD.format(year=year, month=month, lang=lang)
-    ensure_path_exists(md_dir)
+    if pack is not None:
+        for slug in pack.slugs(year, month, lang, 'html'):
+            yield slug, pack.text(year, month, lang, 'html', slug)
+        return
 
     html_dir = FOLDER_HTML.format(year=year, month=month, lang=lang)
     for filepath in os.scandir(html_dir):
-        content = ''
+        _, slug = os.path.split(filepath)
+        slug = slug.replace('.html', '')
         with open(filepath) as fin:
-            data = fin.read()
+            yield slug, fin.read()
 
-        soup = BeautifulSoup(data, 'html.parser')
 
-        # Remove tag line (i.e. kicker) that is an excerpt from the talk
-        try:
-            soup.find('p', id='kicker1').decompose()
-        except AttributeError:
-            # A kicker doesn't exist in this talk
-            pass
+def find_sections(soup, profile=None):
+    """
+    Return the talk article and its footnote panel from a talk page,
+    using the extraction profile of the page's layout (see profiles.py).
+    """
+    if profile is None:
+        profile = profiles.registry().match(str(soup))
 
-        section = soup.find_all(
-            'article',
-            class_='global-template-mobile_article',
-        )[0]
+    # Remove tag line (i.e. kicker) that is an excerpt from the talk
+    try:
+        soup.find('p', id='kicker1').decompose()
+    except AttributeError:
+        # A kicker doesn't exist in this talk
+        pass
 
-        panel = soup.find_all('div', class_='panelContent-2dg-k')[1]
+    section = profiles.find(soup, profile.get('article'))
+    if section is None:
+        raise ValueError('no talk body in this layout: {}'.format(
+            sorted(profile)))
 
-        body = md(str(section), heading_style='ATX', strip=['img'])
-        body = re.sub(SPACES_REGEX, '', body)
-        body = re.sub(NOTES_REGEX2, '[^\\1]', body)
+    panel = profiles.find(soup, profile.get('notes'))
+    if panel is not None and any(p is section for p in panel.parents):
+        # Older layouts keep the notes inside the article
+        panel.extract()
+    return section, panel
 
+
+def sections_to_markdown(section, panel=None, images=False):
+    """
+    Convert a talk body and optional footnote panel to talk Markdown.
+    Images are dropped unless asked for (see assets.py).
+    """
+    strip = [] if images else ['img']
+    body = md(str(section), heading_style='ATX', strip=strip)
+    body = re.sub(SPACES_REGEX, '', body)
+    body = re.sub(NOTES_REGEX2, '[^\\1]', body)
+
+    notes = ''
+    if panel is not None:
         notes = md(str(panel), heading_style='ATX', strip=['a'])
         notes = notes.replace('\n\n', '\n')
         notes = re.sub(NOTES_REGEX, '[^\\1]: ', notes)
         notes = re.sub(SPACES_REGEX, '', notes)
 
-        content = CONTENT_TEMPLATE.format(
-            body=body.strip(),
-            notes=notes.strip(),
-        )
+    return CONTENT_TEMPLATE.format(
+        body=body.strip(),
+        notes=notes.strip(),
+    )
 
-        _, slug = os.path.split(filepath)
-        slug = slug.replace('.html', '')
+
+def convert_talk(data, images=False):
+    profile = profiles.registry().match(data)
+    soup = BeautifulSoup(data, 'html.parser')
+    section, panel = find_sections(soup, profile)
+    content = sections_to_markdown(section, panel, images)
+    # The tree is full of reference cycles; free it now rather than at
+    # the next garbage collection
+    soup.decompose()
+    return content
+
+
+def convert_conference(year, month, lang, pack=None, images=False,
+                       profiler=None):
+    """
+    Yield (filename, content) for every talk of a conference that converts.
+    """
+    for slug, data in read_talks(year, month, lang, pack):
+        try:
+            if profiler is not None:
+                with profiler.talk(slug):
+                    content = convert_talk(data, images)
+            else:
+                content = convert_talk(data, images)
+        except ValueError as e:
+            # Keep going; the rest of the conference is still useful
+            logger.error('{} {}'.format(slug, e))
+            continue
 
         filename = FILEPATH_MD.format(
             year=year,
@@ -85,12 +141,55 @@ def convert_talks(year, month, lang):
             lang=lang,
             slug=slug,
         )
+        yield filename, content
+
+
+def write_talks(year, month, lang, talks, store=None):
+    """
+    Write (filename, content) pairs to md/, through the store when given.
+    """
+    manifest = None
+    if store is not None:
+        manifest = store.manifest(year, month, lang)
+
+    md_dir = FOLDER_MD.format(year=year, month=month, lang=lang)
+    ensure_path_exists(md_dir)
 
+    converted = []
+    for filename, content in talks:
         logger.info(filename)
+        converted.append(filename)
+
+        if manifest is not None:
+            name = 'md/' + os.path.basename(filename)
+            data = content.encode('utf-8')
+            if not store.write_file(filename, data, manifest, name):
+                logger.info('unchanged: {}'.format(filename))
+            continue
 
         with open(filename, 'w', encoding='utf-8') as fout:
             fout.write(content)
 
+    if manifest is not None:
+        manifest.save()
+
+    return converted
+
+
+def convert_talks(year, month, lang, pack=None, store=None, images=False,
+                  profiler=None):
+    """
+    Convert a conference's downloaded talks to Markdown. Image links are
+    left as they are on the website; see assets.convert_talks.
+    """
+    return write_talks(
+        year,
+        month,
+        lang,
+        convert_conference(year, month, lang, pack, images, profiler),
+        store,
+    )
+
 
 def ensure_path_exists(path):
     dirs = os.path.dirname(path)
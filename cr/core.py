@@ -3,7 +3,7 @@
 """
 Download Conference Addresses for the apostles from churchofjesuschrist.org
 
-python core.py YYYY MM
+python core.py ACTION [YYYY MM]
 """
 
 __author__ = "Greg Reeve"
@@ -11,39 +11,311 @@ __version__ = "0.1.0"
 __license__ = "MIT"
 
 import argparse
-import extractor
-import converter
-import publisher
+import multiprocessing
+import os
 
-from logger import setup_logger
+from functools import partial
+
+if __package__:
+    from . import assets
+    from . import citations
+    from . import collection
+    from . import epub
+    from . import epubcheck
+    from . import export
+    from . import extractor
+    from . import converter
+    from . import fetch
+    from . import jobqueue
+    from . import linkcheck
+    from . import memprofile
+    from . import pack
+    from . import publisher
+    from . import render
+    from . import server
+    from . import sources
+    from . import store
+    from . import transcripts
+    from . import verify
+    from .logger import setup_logger
+else:
+    import assets
+    import citations
+    import collection
+    import epub
+    import epubcheck
+    import export
+    import extractor
+    import converter
+    import fetch
+    import jobqueue
+    import linkcheck
+    import memprofile
+    import pack
+    import publisher
+    import render
+    import server
+    import sources
+    import store
+    import transcripts
+    import verify
+    from logger import setup_logger
+
+try:
+    if __package__:
+        from . import align
+        from . import analytics
+        from . import dedupe
+    else:
+        import align
+        import analytics
+        import dedupe
+except ImportError:
+    align = None
+    analytics = None
+    dedupe = None
 
 logger = setup_logger(logfile=None)
 
 
+def run_job(args, job):
+    """
+    Run one queued job as if its stage had been given on the command line.
+    """
+    job_args = argparse.Namespace(**vars(args))
+    job_args.action = job.stage
+    job_args.year = job.year
+    job_args.month = job.month
+    job_args.languages = job.lang.split(jobqueue.LANG_SEPARATOR)
+    main(job_args)
+
+
+def run_worker(args):
+    budget = None
+    if args.memory_budget:
+        budget = memprofile.MemoryBudget(args.memory_budget * memprofile.MB)
+    jobqueue.work(partial(run_job, args), args.queue, args.lease,
+                  budget=budget)
+
+
 def main(args):
     """
     Main entry point of the app
     """
     logger.info(args)
+    profiler = memprofile.Profiler(args.memprofile)
+    with profiler.stage(args.action):
+        run(args, profiler)
+    profiler.report()
+
+
+def run(args, profiler=None):
+    blobs = None
+    if args.store:
+        blobs = store.Store(args.store)
+
     if args.action == 'download':
+        controller = fetch.AdaptiveController(args.workers)
         for lang in args.languages:
-            slugs = extractor.get_slugs(args.year, args.month, lang)
+            slugs = extractor.get_slugs(args.year, args.month, lang, controller)
             paths = extractor.download_talks(
                 slugs,
                 args.year,
                 args.month,
                 lang,
+                blobs,
+                controller,
+                args.skip_duplicates,
             )
+        logger.info(controller.summary())
+
+    reader = None
+    if args.pack and args.action in ('convert', 'publish'):
+        reader = pack.PackReader(args.pack)
+
+    if args.action == 'ingest':
+        entries = sources.read_catalog(args.catalog or sources.DEFAULT_CATALOG)
+        entries = [e for e in entries if e.get('lang') in args.languages]
+        sources.ingest(entries, blobs, args.workers)
+
+    if args.action == 'transcripts':
+        transcripts.convert_transcripts(
+            args.transcripts,
+            args.languages[0],
+            store=blobs,
+        )
 
     if args.action == 'convert':
+        if args.images:
+            assets.convert_talks(
+                args.year,
+                args.month,
+                args.languages,
+                reader,
+                blobs,
+                args.image_budget,
+                profiler=profiler,
+            )
+        else:
+            for lang in args.languages:
+                converter.convert_talks(
+                    args.year,
+                    args.month,
+                    lang,
+                    reader,
+                    blobs,
+                    profiler=profiler,
+                )
+
         for lang in args.languages:
-            converter.convert_talks(args.year, args.month, lang)
+            citations.index_conference(args.year, args.month, lang)
 
-    if args.action == 'publish':
+        if analytics:
+            analytics.update(args.year, args.month, args.languages)
+
+    if args.action == 'publish' and args.incremental:
+        epub.build_conference(
+            args.year,
+            args.month,
+            args.languages,
+            force=args.force,
+        )
+
+    elif args.action == 'publish':
         publisher.make_title(args.year, args.month)
-        talks = publisher.gather_talks(args.year, args.month, args.languages)
+        talks = publisher.gather_talks(
+            args.year,
+            args.month,
+            args.languages,
+            reader,
+            args.skip_duplicates,
+        )
         publisher.create_epub_cmd(args.year, args.month, talks)
 
+    if args.action == 'render':
+        render.render_conference(
+            args.year,
+            args.month,
+            args.languages,
+            args.formats,
+        )
+
+    if args.action == 'pack':
+        for lang in args.languages:
+            pack.pack_conference(
+                args.year,
+                args.month,
+                lang,
+                args.pack or pack.DEFAULT_PACK,
+            )
+
+    if args.action in ('align', 'dedupe', 'analytics') and align is None:
+        logger.error('{} requires numpy and scipy'.format(args.action))
+        return
+
+    if args.action == 'align':
+        align.align_conference(args.year, args.month, *args.languages[:2])
+
+    if args.action == 'dedupe':
+        dedupe.main(args)
+
+    if args.action == 'citations':
+        for lang in args.languages:
+            citations.index_conference(args.year, args.month, lang)
+
+    if args.action == 'cite':
+        for year, month, lang, slug, note in citations.find_talks(args.ref):
+            print('{}/{}/{}/{} [^{}]'.format(year, month, lang, slug, note))
+
+    if args.action == 'analytics':
+        analytics.report(analytics.Corpus.load(), by=args.by, lang=args.lang)
+
+    if args.action == 'check-links':
+        args.catalog = args.catalog or linkcheck.DEFAULT_CATALOG
+        linkcheck.main(args)
+
+    if args.action == 'serve':
+        server.main(args)
+
+    if args.action == 'verify':
+        problems = verify.verify(
+            args.store or store.DEFAULT_STORE,
+            args.year,
+            args.month,
+            args.languages,
+            args.workers,
+        )
+        verify.report(problems)
+        if args.repair:
+            for year, month, lang, name in verify.repair(
+                    problems, args.store or store.DEFAULT_STORE):
+                logger.error('not in the store: {}/{}/{}/{}'.format(
+                    year, month, lang, name))
+
+    if args.action == 'validate':
+        paths = ['.']
+        if args.year:
+            paths = [os.path.join(*filter(None, [args.year, args.month]))]
+        epubcheck.report(epubcheck.validate_all(paths))
+
+    if args.action == 'collection':
+        index = collection.build_index()
+        md_paths = collection.select(
+            index,
+            args.speaker,
+            args.first,
+            args.last,
+            args.languages,
+        )
+        if not md_paths:
+            logger.error('No talks match')
+        else:
+            collection.build_collection(
+                index,
+                md_paths,
+                args.title or collection.default_title(
+                    index, md_paths, args.speaker),
+                args.output,
+            )
+
+    if args.action == 'export':
+        export.export(
+            args.year,
+            args.month,
+            args.languages,
+            args.format,
+            args.output,
+            not args.force,
+            args.workers,
+        )
+
+    if args.action == 'enqueue':
+        months = [args.month] if args.month else list(publisher.MONTHS)
+        conn = jobqueue.connect(args.queue)
+        for month in months:
+            added = jobqueue.enqueue(
+                conn,
+                args.year,
+                month,
+                args.languages,
+                args.stages,
+            )
+            logger.info('{}/{}: {} jobs queued'.format(args.year, month, added))
+        conn.close()
+
+    if args.action == 'worker':
+        workers = [
+            multiprocessing.Process(target=run_worker, args=(args,))
+            for _ in range(args.workers)
+        ]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+        conn = jobqueue.connect(args.queue)
+        logger.info(jobqueue.counts(conn))
+        conn.close()
+
 
 if __name__ == "__main__":
     """
@@ -53,9 +325,14 @@ if __name__ == "__main__":
 
     # Required positional argument
     parser.add_argument("action", help="The action to perform.")
-    parser.add_argument("year", help="The year of the conference (e.g. 2017).")
+    parser.add_argument(
+        "year",
+        nargs='?',
+        help="The year of the conference (e.g. 2017).",
+    )
     parser.add_argument(
         "month",
+        nargs='?',
         help="The month of the conference (i.e. 04 or 10).",
     )
 
@@ -69,6 +346,285 @@ if __name__ == "__main__":
         nargs='+',
     )
 
+    parser.add_argument(
+        '--formats',
+        action='store',
+        dest='formats',
+        default=['html'],
+        nargs='+',
+        choices=render.FORMATS,
+        help="Output formats to render.",
+    )
+
+    parser.add_argument(
+        '--pack',
+        action='store',
+        dest='pack',
+        default=None,
+        help="Read talks from (or write them to) a corpus pack.",
+    )
+
+    parser.add_argument(
+        '--store',
+        action='store',
+        dest='store',
+        default=store.DEFAULT_STORE,
+        help="Content-addressed store root ('' to disable).",
+    )
+
+    parser.add_argument(
+        '--images',
+        action='store_true',
+        help="Keep talk images, shrunk to fit --image-budget.",
+    )
+
+    parser.add_argument(
+        '--image-budget',
+        action='store',
+        dest='image_budget',
+        default=assets.DEFAULT_BUDGET,
+        type=int,
+        help="Maximum total size of a book's images in bytes.",
+    )
+
+    parser.add_argument(
+        '--skip-duplicates',
+        action='store_true',
+        dest='skip_duplicates',
+        help="Skip near-duplicate talks when downloading or publishing.",
+    )
+
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        dest='incremental',
+        help="Build the EPUB directly, reusing unchanged chapters, and skip "
+             "it when no input changed.",
+    )
+
+    parser.add_argument(
+        '--queue',
+        action='store',
+        dest='queue',
+        default=jobqueue.DEFAULT_QUEUE,
+        help="Job queue database, which may be on a shared filesystem.",
+    )
+
+    parser.add_argument(
+        '--stages',
+        action='store',
+        dest='stages',
+        default=['download', 'convert', 'publish'],
+        nargs='+',
+        choices=jobqueue.STAGES,
+    )
+
+    parser.add_argument(
+        '--lease',
+        action='store',
+        dest='lease',
+        default=jobqueue.DEFAULT_LEASE,
+        type=int,
+        help="Seconds a worker holds a job between heartbeats.",
+    )
+
+    parser.add_argument(
+        '--repair',
+        action='store_true',
+        dest='repair',
+        help="Restore files that fail verification from the store.",
+    )
+
+    parser.add_argument(
+        '--memprofile',
+        action='store_true',
+        dest='memprofile',
+        help="Report memory use and allocation sites per stage and talk.",
+    )
+
+    parser.add_argument(
+        '--memory-budget',
+        action='store',
+        dest='memory_budget',
+        default=None,
+        type=int,
+        help="Megabytes a host's workers may use before they stop "
+             "claiming jobs.",
+    )
+
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        dest='force',
+        help="Publish or export everything, ignoring the last build.",
+    )
+
+    parser.add_argument(
+        '--speaker',
+        action='store',
+        dest='speaker',
+        default=None,
+        help="Collect the talks of one speaker (e.g. Holland).",
+    )
+
+    parser.add_argument(
+        '--from',
+        action='store',
+        dest='first',
+        default=None,
+        help="The first year of a collection.",
+    )
+
+    parser.add_argument(
+        '--to',
+        action='store',
+        dest='last',
+        default=None,
+        help="The last year of a collection.",
+    )
+
+    parser.add_argument(
+        '--title',
+        action='store',
+        dest='title',
+        default=None,
+        help="Title of a collection.",
+    )
+
+    parser.add_argument(
+        '-o',
+        '--output',
+        action='store',
+        dest='output',
+        default=None,
+        help="Where to write a collection or export.",
+    )
+
+    parser.add_argument(
+        '--format',
+        action='store',
+        dest='format',
+        default=export.DEFAULT_FORMAT,
+        choices=export.FORMATS,
+        help="Bundle format for export.",
+    )
+
+    parser.add_argument(
+        '--catalog',
+        action='store',
+        dest='catalog',
+        default=None,
+        help="Catalog (e.g. ../data.yaml) to check for duplicate entries "
+             "with dedupe, ingest sources from, or check the links of with "
+             "check-links.",
+    )
+
+    parser.add_argument(
+        '--transcripts',
+        action='store',
+        dest='transcripts',
+        default=transcripts.DEFAULT_TRANSCRIPTS,
+        help="Folder of plain-text transcripts to convert.",
+    )
+
+    parser.add_argument(
+        '--ref',
+        action='store',
+        dest='ref',
+        default=None,
+        help="Scripture reference to look up (e.g. 'Moroni 10:4-5').",
+    )
+
+    parser.add_argument(
+        '--by',
+        action='store',
+        dest='by',
+        default='speaker',
+        help="Group analytics by speaker, year, decade, lang or conference.",
+    )
+
+    parser.add_argument(
+        '--lang',
+        action='store',
+        dest='lang',
+        default=None,
+        help="Restrict analytics to one language.",
+    )
+
+    parser.add_argument(
+        '--links',
+        action='store',
+        dest='links',
+        default=linkcheck.DEFAULT_LINKS,
+    )
+
+    parser.add_argument(
+        '--cache',
+        action='store',
+        dest='cache',
+        default=linkcheck.DEFAULT_CACHE,
+        help="Link check result cache.",
+    )
+
+    parser.add_argument(
+        '--ttl',
+        action='store',
+        dest='ttl',
+        default=linkcheck.DEFAULT_TTL,
+        type=int,
+        help="Seconds before a cached link check is repeated.",
+    )
+
+    parser.add_argument(
+        '--workers',
+        action='store',
+        dest='workers',
+        default=fetch.DEFAULT_WORKERS,
+        type=int,
+        help="Concurrent requests.",
+    )
+
+    parser.add_argument(
+        '--rate',
+        action='store',
+        dest='rate',
+        default=fetch.DEFAULT_RATE,
+        type=float,
+        help="Maximum requests per second to one host.",
+    )
+
+    parser.add_argument(
+        '--rewrite',
+        action='store_true',
+        help="Rewrite redirected links to churchofjesuschrist.org.",
+    )
+
+    parser.add_argument(
+        '--host',
+        action='store',
+        dest='host',
+        default='127.0.0.1',
+        help="Address to bind when serving.",
+    )
+
+    parser.add_argument(
+        '--port',
+        action='store',
+        dest='port',
+        default=8000,
+        type=int,
+        help="Port to bind when serving.",
+    )
+
+    parser.add_argument(
+        '--cache-size',
+        action='store',
+        dest='cache_size',
+        default=server.DEFAULT_CACHE_SIZE,
+        type=int,
+        help="Maximum size of the response cache in bytes.",
+    )
+
     # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
     parser.add_argument(
         "-v",
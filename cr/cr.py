@@ -12,7 +12,10 @@ import argparse
 import requests
 
 from bs4 import BeautifulSoup
-from logger import setup_logger
+if __package__:
+    from .logger import setup_logger
+else:
+    from logger import setup_logger
 
 logger = setup_logger(logfile=None)
 
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+"""
+Long-running build daemon listening on a Unix socket
+
+Imports, compiled regexes, extraction profiles, the adaptive download
+controller and pooled HTTP connections stay warm between jobs, so small
+jobs cost only their own work. Clients (see client.py) send one JSON
+object per line and get one back per job, in the order jobs finish:
+
+    {"id": 1, "action": "convert", "year": "2021", "month": "04",
+     "lang": "eng"}
+    {"id": 1, "ok": true, "result": {"paths": [...], ...}}
+
+Actions are download, convert and publish (see api.py), plus ping. Jobs
+run concurrently, except that jobs on the same conference and language
+wait for each other, and a publish waits for all of its languages.
+
+python daemon.py [--socket .daemon.sock] [--jobs 4]
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import signal
+import time
+
+from dataclasses import asdict
+
+if __package__:
+    from . import api
+    from . import fetch
+    from . import store
+    from .logger import setup_logger
+else:
+    import api
+    import fetch
+    import store
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+DEFAULT_SOCKET = '.daemon.sock'
+DEFAULT_JOBS = 4
+
+
+def job_languages(job):
+    return job.get('languages') or [job.get('lang', 'eng')]
+
+
+class BuildDaemon:
+
+    def __init__(self, jobs=DEFAULT_JOBS, store_root=None):
+        self.slots = asyncio.Semaphore(jobs)
+        self.store_root = store_root
+        self.controller = fetch.AdaptiveController()
+        self.locks = {}
+        self.started = time.time()
+        self.done = 0
+        self.failed = 0
+        self.running = 0
+
+    def lock_for(self, *key):
+        if key not in self.locks:
+            self.locks[key] = asyncio.Lock()
+        return self.locks[key]
+
+    def lock_keys(self, job):
+        """
+        The (year, month, lang) locks a job needs, in the order to take them.
+        A publish needs every language it reads.
+        """
+        action = job.get('action')
+        if action not in ('download', 'convert', 'publish'):
+            return []
+        languages = job_languages(job)
+        if action != 'publish':
+            languages = languages[:1]
+        return [
+            (job.get('year'), job.get('month'), lang)
+            for lang in sorted(set(languages))
+        ]
+
+    async def run(self, job):
+        action = job.get('action')
+        year = job.get('year')
+        month = job.get('month')
+        languages = job_languages(job)
+
+        if action == 'ping':
+            return {
+                'uptime': time.time() - self.started,
+                'running': self.running,
+                'done': self.done,
+                'failed': self.failed,
+                'downloads': self.controller.summary(),
+            }
+
+        if action == 'download':
+            result = await api.download_talks_async(
+                year,
+                month,
+                languages[0],
+                job.get('slugs'),
+                self.store_root,
+                self.controller,
+            )
+        elif action == 'convert':
+            result = await api.convert_talks_async(
+                year,
+                month,
+                languages[0],
+                self.store_root,
+                images=job.get('images', False),
+            )
+        elif action == 'publish':
+            result = await api.publish_async(
+                year,
+                month,
+                languages,
+                force=job.get('force', False),
+            )
+        else:
+            raise ValueError('unknown action {!r}'.format(action))
+        return asdict(result)
+
+    async def respond(self, job, writer, write_lock):
+        reply = {'id': job.get('id')}
+        start = time.monotonic()
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                # Wait for the conference before taking a slot, so jobs
+                # queued behind each other leave the slots to other work
+                for key in self.lock_keys(job):
+                    await stack.enter_async_context(self.lock_for(*key))
+                async with self.slots:
+                    self.running += 1
+                    try:
+                        reply['result'] = await self.run(job)
+                    finally:
+                        self.running -= 1
+            reply['ok'] = True
+            self.done += 1
+        except Exception as e:
+            logger.error('{} {}'.format(job, e))
+            reply['ok'] = False
+            reply['error'] = '{}: {}'.format(type(e).__name__, e)
+            self.failed += 1
+        reply['seconds'] = round(time.monotonic() - start, 3)
+
+        async with write_lock:
+            writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+            await writer.drain()
+
+    async def handle(self, reader, writer):
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    job = json.loads(line)
+                except ValueError:
+                    job = None
+                if not isinstance(job, dict):
+                    # Still answered, with an unknown action error
+                    job = {'action': None}
+                task = asyncio.create_task(
+                    self.respond(job, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            # The client closed its side: finish its jobs before hanging up
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+
+async def serve(path=DEFAULT_SOCKET, jobs=DEFAULT_JOBS, store_root=None):
+    daemon = BuildDaemon(jobs, store_root)
+    if os.path.exists(path):
+        os.remove(path)
+    server = await asyncio.start_unix_server(daemon.handle, path)
+    # Stop cleanly on kill as well as ctrl-c, so the socket is removed
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, asyncio.current_task().cancel)
+    logger.info('Listening on {}'.format(path))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    try:
+        asyncio.run(serve(args.socket, args.jobs, args.store))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.info('Stopped')
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--socket',
+        action='store',
+        dest='socket',
+        default=DEFAULT_SOCKET,
+    )
+
+    parser.add_argument(
+        '--jobs',
+        action='store',
+        dest='jobs',
+        default=DEFAULT_JOBS,
+        type=int,
+        help="Jobs to run at once.",
+    )
+
+    parser.add_argument(
+        '--store',
+        action='store',
+        dest='store',
+        default=store.DEFAULT_STORE,
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+
+"""
+Find near-duplicate talks and catalog entries with MinHash and LSH
+
+Each document is reduced to a MinHash signature of its shingles. Signatures
+are split into bands and hashed into buckets, so only documents sharing a
+bucket are compared and lookups stay sub-linear in the corpus size.
+
+python dedupe.py YYYY MM
+python dedupe.py --catalog ../data.yaml
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import collections
+import os
+import re
+import zlib
+
+import numpy as np
+
+if __package__:
+    from .catalog import DEFAULT_CATALOG, normalize_url, read_catalog
+    from .logger import setup_logger
+else:
+    from catalog import DEFAULT_CATALOG, normalize_url, read_catalog
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+FOLDER_HTML = '{year}/{month}/{lang}/html/'
+FOLDER_MD = '{year}/{month}/{lang}/md/'
+
+NUM_PERM = 128
+BANDS = 16
+THRESHOLD = 0.8
+WORD_SHINGLE = 5
+CHAR_SHINGLE = 3
+MERSENNE_PRIME = (1 << 31) - 1
+SEED = 1
+
+TAG_REGEX = re.compile(r'<[^>]+>')
+WORD_REGEX = re.compile(r'\w+')
+
+_random = np.random.RandomState(SEED)
+PERM_A = _random.randint(1, MERSENNE_PRIME, size=NUM_PERM).astype(np.uint64)
+PERM_B = _random.randint(0, MERSENNE_PRIME, size=NUM_PERM).astype(np.uint64)
+
+
+def word_shingles(text, size=WORD_SHINGLE):
+    words = WORD_REGEX.findall(TAG_REGEX.sub(' ', text).lower())
+    if len(words) < size:
+        return {' '.join(words)}
+    return {
+        ' '.join(words[i:i + size]) for i in range(len(words) - size + 1)
+    }
+
+
+def char_shingles(text, size=CHAR_SHINGLE):
+    text = ' '.join(WORD_REGEX.findall(text.lower()))
+    return {text[i:i + size] for i in range(max(len(text) - size + 1, 1))}
+
+
+def signature(shingles):
+    """
+    MinHash signature of a shingle set, computed for all permutations at once.
+    """
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode('utf-8')) for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    permuted = (np.outer(PERM_A, hashes) + PERM_B[:, None]) % MERSENNE_PRIME
+    return permuted.min(axis=1)
+
+
+def similarity(a, b):
+    """
+    Estimated Jaccard similarity of two signatures.
+    """
+    return float(np.mean(a == b))
+
+
+class LSHIndex:
+
+    def __init__(self, bands=BANDS, threshold=THRESHOLD):
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.threshold = threshold
+        self.signatures = {}
+        self.buckets = collections.defaultdict(list)
+
+    def _keys(self, sig):
+        for band in range(self.bands):
+            chunk = sig[band * self.rows:(band + 1) * self.rows]
+            yield band, chunk.tobytes()
+
+    def query(self, sig):
+        """
+        Return [(key, similarity)] of indexed documents similar to sig.
+        """
+        candidates = set()
+        for bucket in self._keys(sig):
+            candidates.update(self.buckets.get(bucket, ()))
+
+        matches = []
+        for key in candidates:
+            score = similarity(sig, self.signatures[key])
+            if score >= self.threshold:
+                matches.append((key, score))
+        return sorted(matches, key=lambda m: -m[1])
+
+    def add(self, key, sig):
+        self.signatures[key] = sig
+        for bucket in self._keys(sig):
+            self.buckets[bucket].append(key)
+
+    def insert(self, key, sig):
+        """
+        Add a document and return the matches it had before insertion.
+        """
+        matches = self.query(sig)
+        self.add(key, sig)
+        return matches
+
+
+def find_duplicates(documents, threshold=THRESHOLD):
+    """
+    Return (duplicate, original, similarity) for documents, a dict of
+    key -> shingle set. The first key in sorted order is the original.
+    """
+    index = LSHIndex(threshold=threshold)
+    duplicates = []
+    for key in sorted(documents):
+        matches = index.insert(key, signature(documents[key]))
+        if matches:
+            original, score = matches[0]
+            duplicates.append((key, original, score))
+    return duplicates
+
+
+def read_folder(folder, extension):
+    documents = {}
+    if not os.path.isdir(folder):
+        return documents
+    for entry in os.scandir(folder):
+        if entry.name.endswith(extension):
+            with open(entry.path, encoding='utf-8') as fin:
+                documents[entry.path] = word_shingles(fin.read())
+    return documents
+
+
+def conference_duplicates(year, month, lang, kind='md'):
+    folder = (FOLDER_MD if kind == 'md' else FOLDER_HTML).format(
+        year=year,
+        month=month,
+        lang=lang,
+    )
+    return find_duplicates(read_folder(folder, '.' + kind))
+
+
+def drop_near_duplicates(paths, threshold=THRESHOLD):
+    """
+    Keep the first of each group of near-identical files, preserving order.
+    """
+    index = LSHIndex(threshold=threshold)
+    kept = []
+    for path in paths:
+        with open(path, encoding='utf-8') as fin:
+            sig = signature(word_shingles(fin.read()))
+        matches = index.insert(path, sig)
+        if matches:
+            logger.info('skipping {} (duplicate of {})'.format(
+                path,
+                matches[0][0],
+            ))
+            continue
+        kept.append(path)
+    return kept
+
+
+def catalog_duplicates(entries):
+    """
+    Return (shared_pages, duplicate_entries) for catalog entries.
+
+    shared_pages maps a normalized URL to the entries that fetch it;
+    duplicate_entries pairs entries whose speaker and title nearly match.
+    """
+    pages = collections.defaultdict(list)
+    for entry in entries:
+        url = normalize_url(entry.get('url', ''))
+        if url:
+            pages[url].append(entry)
+    shared_pages = {
+        url: group for url, group in pages.items() if len(group) > 1
+    }
+
+    documents = {
+        i: char_shingles(entry.get('speaker', '') + ' ' + entry['title'])
+        for i, entry in enumerate(entries)
+        if entry.get('title')
+    }
+    duplicate_entries = [
+        (entries[dup], entries[orig], score)
+        for dup, orig, score in find_duplicates(documents)
+    ]
+    return shared_pages, duplicate_entries
+
+
+def report_catalog(path=DEFAULT_CATALOG):
+    shared_pages, duplicate_entries = catalog_duplicates(read_catalog(path))
+    for url, group in sorted(shared_pages.items()):
+        print('{} is shared by:'.format(url))
+        for entry in group:
+            print('    line {line}: {title}'.format(**entry))
+    for duplicate, original, score in duplicate_entries:
+        print('line {} duplicates line {} ({:.2f}): {}'.format(
+            duplicate['line'],
+            original['line'],
+            score,
+            duplicate['title'],
+        ))
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    if args.catalog:
+        report_catalog(args.catalog)
+
+    if args.year and args.month:
+        for lang in args.languages:
+            for kind in ('html', 'md'):
+                for duplicate, original, score in conference_duplicates(
+                        args.year, args.month, lang, kind):
+                    print('{} duplicates {} ({:.2f})'.format(
+                        duplicate,
+                        original,
+                        score,
+                    ))
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "year",
+        nargs='?',
+        help="The year of the conference (e.g. 2017).",
+    )
+    parser.add_argument(
+        "month",
+        nargs='?',
+        help="The month of the conference (i.e. 04 or 10).",
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--languages',
+        action='store',
+        dest='languages',
+        default=['eng', 'hun'],
+        nargs='+',
+    )
+
+    parser.add_argument(
+        '--catalog',
+        action='store',
+        dest='catalog',
+        default=None,
+        help="Report duplicate entries in a catalog (e.g. ../data.yaml).",
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
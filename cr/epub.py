@@ -0,0 +1,621 @@
+#!/usr/bin/env python3
+
+"""
+Build conference EPUBs directly from the talk IR, incrementally
+
+Each talk becomes one XHTML chapter built from the templates in
+templates.py. The hash of every entry is kept next to the book, and on the
+next build entries whose hash didn't change are copied from the old zip
+still compressed, so only changed chapters, package.opf and nav.xhtml are
+deflated again:
+
+    {year}/{month}/out/cr_{year}{month}.epub
+    {year}/{month}/out/cr_{year}{month}.epub.manifest.json
+
+Builds are reproducible: the book id is derived from its content, dates are
+the conference's (or SOURCE_DATE_EPOCH), and zip entries are sorted with
+fixed timestamps. A key over the inputs and settings of the last build is
+kept, and publishing is skipped while it still matches:
+
+    .build/{year}{month}.key
+
+python epub.py YYYY MM [--full]
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import datetime
+import hashlib
+import html
+import json
+import os
+import re
+import struct
+import uuid
+import zipfile
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+if __package__:
+    from . import ir
+    from . import render
+    from . import templates
+    from .logger import setup_logger
+else:
+    import ir
+    import render
+    import templates
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+FILEPATH_EPUB = '{year}/{month}/out/cr_{year}{month}.epub'
+FILEPATH_KEY = '.build/{year}{month}.key'
+FOLDER_MD = ir.FOLDER_MD
+MANIFEST_SUFFIX = '.manifest.json'
+# The earliest timestamp a zip entry can hold
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+ZIP_FILE_MODE = 0o644 << 16
+ZIP_SYSTEM = 3  # unix, wherever the book is built
+BOOK_NAMESPACE = uuid.uuid5(
+    uuid.NAMESPACE_URL,
+    'https://github.com/greeve/speeches',
+)
+MONTHS = render.MONTHS
+LANGUAGES = {
+    'eng': 'English',
+    'hun': 'Hungarian',
+    'bilingual': 'Bilingual',
+}
+
+ROOT = 'EPUB/'
+CHAPTER_PATH = 'xhtml/{lang}/{filename}'
+IMAGE_PATH = 'images/{filename}'
+IMAGE_LINK_REGEX = re.compile(r'!\[[^\]]*\]\(([^)\s]+)')
+MEDIA_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.svg': 'image/svg+xml',
+}
+PACKAGE_ITEM_IMAGE = """
+    <item href="{href}" id="{fileid}" media-type="{media_type}"/>"""
+
+# Local file header: signature, versions, flags, method, time, date, crc,
+# sizes, then the lengths of the name and extra field that follow it
+LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+DATA_DESCRIPTOR_FLAG = 0x08
+RAW_CHUNK_SIZE = 1024 * 1024
+
+
+def chapter_filename(talk, qualified=False):
+    """
+    The file name of a talk's chapter. Slugs are only unique within a
+    conference, so books spanning conferences qualify them with its date.
+    """
+    if qualified:
+        return '{}{}-{}.xhtml'.format(talk.year, talk.month, talk.slug)
+    return talk.slug + '.xhtml'
+
+
+def chapter_id(talk, qualified=False):
+    if qualified:
+        return '{}-{}{}-{}'.format(talk.lang, talk.year, talk.month, talk.slug)
+    return render.talk_id(talk)
+
+
+def chapter_path(talk, qualified=False):
+    return ROOT + CHAPTER_PATH.format(
+        lang=talk.lang,
+        filename=chapter_filename(talk, qualified),
+    )
+
+
+def localize_images(talk, images):
+    """
+    Point the image blocks of a talk at their copies inside the book.
+
+    images maps a book path to the local file, and is filled in here.
+    """
+    blocks = []
+    for block in talk.blocks:
+        src = block.refs[0] if block.kind == 'image' else None
+        if src is None or not os.path.exists(src):
+            blocks.append(block)
+            continue
+        href = IMAGE_PATH.format(filename=os.path.basename(src))
+        images[href] = src
+        # Chapters live two folders below the package root
+        blocks.append(replace(block, refs=['../../' + href]))
+    return replace(talk, blocks=blocks)
+
+
+def chapter(talk):
+    title = html.escape(talk.title, quote=True)
+    return templates.TALK.format(
+        title=title,
+        body=render.talk_html(talk, heading_offset=0),
+    )
+
+
+def publication_date(year, month):
+    """
+    The conference month, unless SOURCE_DATE_EPOCH says otherwise.
+    """
+    epoch = os.environ.get('SOURCE_DATE_EPOCH')
+    if epoch:
+        return datetime.datetime.fromtimestamp(
+            int(epoch),
+            datetime.timezone.utc,
+        ).date().isoformat()
+    return '{}-{}-01'.format(year, month)
+
+
+def book_id(entries):
+    """
+    A uuid that only changes when the content of the book does.
+    """
+    digest = hashlib.sha256()
+    for name, data, _ in sorted(entries):
+        digest.update(name.encode('utf-8') + b'\0')
+        digest.update(hashlib.sha256(data).digest())
+    return str(uuid.uuid5(BOOK_NAMESPACE, digest.hexdigest()))
+
+
+def book_entries(year, month, parts, date=None, title=None, qualified=False):
+    """
+    Every entry of the book as (name, data, compress_type).
+
+    parts is a list of (lang, talks). The title defaults to the
+    conference's; qualified names chapters for books of many conferences.
+    """
+    month_name = MONTHS.get(month, month)
+    date = date or publication_date(year, month)
+    title = html.escape(
+        title or render.TITLE.format(month=month_name, year=year),
+        quote=True,
+    )
+
+    entries = [
+        ('mimetype', templates.MIMETYPE, zipfile.ZIP_STORED),
+        ('META-INF/container.xml', templates.CONTAINER, zipfile.ZIP_DEFLATED),
+        (ROOT + 'xhtml/title.xhtml',
+         templates.TITLE.format(title=title),
+         zipfile.ZIP_DEFLATED),
+    ]
+
+    images = {}
+    items = []
+    refs = []
+    contents = []
+    for lang, talks in parts:
+        language = LANGUAGES.get(lang, lang)
+        entries.append((
+            ROOT + 'xhtml/{}.xhtml'.format(lang),
+            templates.LANG_PART.format(language=language),
+            zipfile.ZIP_DEFLATED,
+        ))
+        items.append(templates.PACKAGE_ITEM_LANG_PART.format(lang=lang))
+        refs.append(templates.PACKAGE_REF_LANG_PART.format(lang=lang))
+
+        nav_talks = []
+        for talk in talks:
+            filename = chapter_filename(talk, qualified)
+            fileid = chapter_id(talk, qualified)
+            entries.append((
+                ROOT + CHAPTER_PATH.format(lang=lang, filename=filename),
+                chapter(localize_images(talk, images)),
+                zipfile.ZIP_DEFLATED,
+            ))
+            items.append(templates.PACKAGE_ITEM_LANG.format(
+                lang=lang,
+                filename=filename,
+                fileid=fileid,
+            ))
+            refs.append(templates.PACKAGE_REF_LANG.format(fileid=fileid))
+            nav_talks.append(templates.NAV_TALK.format(
+                lang=lang,
+                filename=filename,
+                author=html.escape(talk.speaker or '', quote=True),
+                title=html.escape(talk.title, quote=True),
+            ))
+        contents.append(templates.NAV_LANG.format(
+            lang=lang,
+            language=language,
+            talks=''.join(nav_talks),
+        ))
+
+    for href, src in sorted(images.items()):
+        with open(src, 'rb') as fin:
+            # Images are already compressed
+            entries.append((ROOT + href, fin.read(), zipfile.ZIP_STORED))
+        extension = os.path.splitext(href)[1].lower()
+        items.append(PACKAGE_ITEM_IMAGE.format(
+            href=href,
+            fileid='img-' + os.path.splitext(os.path.basename(href))[0],
+            media_type=MEDIA_TYPES.get(extension, 'application/octet-stream'),
+        ))
+
+    entries.append((
+        ROOT + 'xhtml/nav.xhtml',
+        templates.NAV.format(
+            title=title,
+            contents=''.join(contents),
+        ),
+        zipfile.ZIP_DEFLATED,
+    ))
+    entries = [
+        (name, data.encode('utf-8') if isinstance(data, str) else data, ctype)
+        for name, data, ctype in entries
+    ]
+    entries.append((
+        ROOT + 'package.opf',
+        templates.PACKAGE.format(
+            uuid=book_id(entries),
+            date=date,
+            title=title,
+            year=year,
+            items=''.join(items),
+            refs=''.join(refs),
+        ).encode('utf-8'),
+        zipfile.ZIP_DEFLATED,
+    ))
+    return entries
+
+
+def load_manifest(filename):
+    try:
+        with open(filename + MANIFEST_SUFFIX, encoding='utf-8') as fin:
+            return json.load(fin)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(filename, manifest):
+    tmp_filename = filename + MANIFEST_SUFFIX + '.tmp'
+    with open(tmp_filename, 'w', encoding='utf-8') as fout:
+        json.dump(manifest, fout, indent=1, sort_keys=True)
+    os.replace(tmp_filename, filename + MANIFEST_SUFFIX)
+
+
+def read_raw(zin, info):
+    """
+    The compressed bytes of a zip entry, without inflating them.
+    """
+    return b''.join(iter_raw(zin, info))
+
+
+def iter_raw(zin, info, chunk_size=RAW_CHUNK_SIZE):
+    """
+    Like read_raw, a chunk at a time.
+    """
+    zin.fp.seek(info.header_offset)
+    header = LOCAL_HEADER.unpack(zin.fp.read(LOCAL_HEADER.size))
+    zin.fp.seek(header[-2] + header[-1], os.SEEK_CUR)
+    remaining = info.compress_size
+    while remaining:
+        chunk = zin.fp.read(min(chunk_size, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile('{} is truncated'.format(info.filename))
+        remaining -= len(chunk)
+        yield chunk
+
+
+def write_raw(zout, info, data, date_time=None, name=None):
+    """
+    Append an already compressed entry to a zip opened for writing,
+    optionally under another name. data is bytes or an iterable of chunks.
+    """
+    copy = zipfile.ZipInfo(name or info.filename, date_time or info.date_time)
+    copy.compress_type = info.compress_type
+    copy.create_system = info.create_system
+    copy.external_attr = info.external_attr
+    copy.flag_bits = info.flag_bits & ~DATA_DESCRIPTOR_FLAG
+    copy.CRC = info.CRC
+    copy.compress_size = info.compress_size
+    copy.file_size = info.file_size
+    copy.header_offset = zout.fp.tell()
+
+    zout.fp.write(copy.FileHeader())
+    if isinstance(data, bytes):
+        data = [data]
+    for chunk in data:
+        zout.fp.write(chunk)
+    zout.filelist.append(copy)
+    zout.NameToInfo[copy.filename] = copy
+    zout.start_dir = zout.fp.tell()
+    zout._didModify = True
+    return copy
+
+
+def zip_order(entry):
+    # mimetype must come first, the rest in a stable order
+    return (entry[0] != 'mimetype', entry[0])
+
+
+def deflate(name, data, compress_type, level=zlib.Z_DEFAULT_COMPRESSION):
+    """
+    A ZipInfo and the compressed bytes of an entry, ready for write_raw.
+
+    The bytes are the same zipfile would write, but this can run on many
+    threads at once: zlib releases the GIL.
+    """
+    info = zipfile.ZipInfo(name, ZIP_DATE_TIME)
+    info.compress_type = compress_type
+    info.create_system = ZIP_SYSTEM
+    info.external_attr = ZIP_FILE_MODE
+    info.CRC = zlib.crc32(data)
+    info.file_size = len(data)
+    if compress_type == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(
+            level,
+            zlib.DEFLATED,
+            -15,
+        )
+        data = compressor.compress(data) + compressor.flush()
+    info.compress_size = len(data)
+    return info, data
+
+
+class Sources:
+    """
+    Books built earlier, opened once, for copying unchanged entries.
+    """
+
+    def __init__(self):
+        self.books = {}
+
+    def locate(self, filename, name, digest, compress_type):
+        """
+        The open book and ZipInfo of name in filename if its content hashes
+        to digest, or None.
+        """
+        if filename not in self.books:
+            manifest = load_manifest(filename)
+            book = None
+            if manifest and os.path.exists(filename):
+                try:
+                    book = zipfile.ZipFile(filename)
+                except zipfile.BadZipFile:
+                    pass
+            self.books[filename] = (manifest, book)
+
+        manifest, book = self.books[filename]
+        if book is None or manifest.get(name) != digest:
+            return None
+        try:
+            info = book.getinfo(name)
+        except KeyError:
+            return None
+        if info.compress_type != compress_type or \
+                info.external_attr != ZIP_FILE_MODE:
+            return None
+        return book, info
+
+    def find(self, filename, name, digest, compress_type):
+        """
+        The ZipInfo and compressed bytes of name in filename if its content
+        hashes to digest, or None.
+        """
+        found = self.locate(filename, name, digest, compress_type)
+        if found is None:
+            return None
+        book, info = found
+        return info, read_raw(book, info)
+
+    def close(self):
+        for _, book in self.books.values():
+            if book is not None:
+                book.close()
+
+
+def write_epub(filename, entries, incremental=True, sources=None,
+               workers=None):
+    """
+    Write entries to filename, reusing unchanged ones from the last build.
+
+    sources maps an entry name to (book, name) of the same entry in another
+    book, to copy it from there instead. Everything else is compressed on
+    a pool of threads. Returns (written, reused) counts.
+    """
+    sources = sources or {}
+    books = Sources()
+    manifest = {}
+    found = []
+    missing = []
+    try:
+        for name, data, compress_type in sorted(entries, key=zip_order):
+            digest = hashlib.sha256(data).hexdigest()
+            manifest[name] = digest
+            candidates = [(filename, name)] if incremental else []
+            if name in sources:
+                candidates.append(sources[name])
+            copy = None
+            for book, book_name in candidates:
+                copy = books.find(book, book_name, digest, compress_type)
+                if copy is not None:
+                    break
+            found.append((name, copy))
+            if copy is None:
+                missing.append((name, data, compress_type))
+    finally:
+        books.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        compressed = executor.map(lambda entry: deflate(*entry), missing)
+        tmp_filename = filename + '.tmp'
+        with zipfile.ZipFile(tmp_filename, 'w') as zout:
+            for name, copy in found:
+                info, data = copy or next(compressed)
+                write_raw(zout, info, data, ZIP_DATE_TIME, name)
+
+    os.replace(tmp_filename, filename)
+    save_manifest(filename, manifest)
+    return len(missing), len(found) - len(missing)
+
+
+def build_key(year, month, languages):
+    """
+    Hash everything a conference's EPUB is built from.
+
+    Images keep their name when they are recompressed with other settings
+    (see assets.py), so the bytes of every image the book embeds are
+    hashed too.
+    """
+    digest = hashlib.sha256()
+    settings = {
+        'languages': languages,
+        'date': publication_date(year, month),
+        'ir': ir.IR_VERSION,
+    }
+    digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    for module in (ir, render, templates):
+        with open(module.__file__, 'rb') as fin:
+            digest.update(fin.read())
+    with open(__file__, 'rb') as fin:
+        digest.update(fin.read())
+
+    images = set()
+    for lang in languages:
+        folder_md = FOLDER_MD.format(year=year, month=month, lang=lang)
+        for name in sorted(os.listdir(folder_md)):
+            if not name.endswith('.md'):
+                continue
+            with open(folder_md + name, 'rb') as fin:
+                data = fin.read()
+            digest.update('{}/{}\0'.format(lang, name).encode('utf-8'))
+            digest.update(hashlib.sha256(data).digest())
+            images.update(IMAGE_LINK_REGEX.findall(data.decode('utf-8')))
+
+    for src in sorted(images):
+        # Like localize_images, only images on disk are embedded
+        if not os.path.isfile(src):
+            continue
+        with open(src, 'rb') as fin:
+            data = fin.read()
+        digest.update('{}\0'.format(src).encode('utf-8'))
+        digest.update(hashlib.sha256(data).digest())
+    return digest.hexdigest()
+
+
+def read_key(year, month):
+    try:
+        with open(FILEPATH_KEY.format(year=year, month=month)) as fin:
+            return fin.read().strip()
+    except OSError:
+        return None
+
+
+def write_key(year, month, key):
+    filename = FILEPATH_KEY.format(year=year, month=month)
+    ensure_path_exists(filename)
+    with open(filename, 'w') as fout:
+        fout.write(key + '\n')
+
+
+def build_conference(year, month, languages, incremental=True, force=False):
+    """
+    Build the EPUB of a conference and return its path.
+
+    Nothing is done if the inputs match the last build, unless forced.
+    """
+    filename = FILEPATH_EPUB.format(year=year, month=month)
+    key = build_key(year, month, languages)
+    if not force and os.path.exists(filename) and \
+            read_key(year, month) == key:
+        logger.info('{} is up to date'.format(filename))
+        return filename
+
+    talks = ir.load_conference(year, month, languages)
+    parts = [
+        (lang, [talk for talk in talks if talk.lang == lang])
+        for lang in languages
+    ]
+
+    ensure_path_exists(filename)
+    written, reused = write_epub(
+        filename,
+        book_entries(year, month, parts),
+        incremental,
+    )
+    write_key(year, month, key)
+    logger.info('{} ({} entries compressed, {} reused)'.format(
+        filename, written, reused))
+    return filename
+
+
+def ensure_path_exists(path):
+    dirs = os.path.dirname(path)
+    if not os.path.exists(dirs):
+        os.makedirs(dirs)
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    build_conference(
+        args.year,
+        args.month,
+        args.languages,
+        not args.full,
+        args.full,
+    )
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    # Required positional argument
+    parser.add_argument("year", help="The year of the conference (e.g. 2017).")
+    parser.add_argument(
+        "month",
+        help="The month of the conference (i.e. 04 or 10).",
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--languages',
+        action='store',
+        dest='languages',
+        default=['eng', 'hun'],
+        nargs='+',
+    )
+
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        default=False,
+        help="Rebuild and recompress everything, ignoring the last build.",
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+
+"""
+Structural checks for EPUB books, without leaving Python
+
+Each book is read once, entry by entry, and every XML document is fed
+through expat as it is inflated. The checks cover what reader apps reject
+us for:
+
+    mimetype is the first entry, stored and exact
+    META-INF/container.xml points at a package document that exists
+    every manifest item exists, ids are unique, and the spine and nav
+        only refer to manifest items and ids that exist
+    every XML document is well-formed
+
+A directory of books is checked in parallel.
+
+python epubcheck.py [PATH ...]
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import os
+import posixpath
+import sys
+import zipfile
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import unquote, urldefrag
+from xml.parsers import expat
+
+if __package__:
+    from .logger import setup_logger
+else:
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+MIMETYPE = b'application/epub+zip'
+CONTAINER = 'META-INF/container.xml'
+XML_TYPES = {
+    'application/xhtml+xml',
+    'application/oebps-package+xml',
+    'application/x-dtbncx+xml',
+    'image/svg+xml',
+}
+CHUNK_SIZE = 64 * 1024
+
+ERROR = 'error'
+WARNING = 'warning'
+
+Problem = namedtuple('Problem', 'level name message')
+Document = namedtuple('Document', 'ids links elements')
+
+
+def local_name(name):
+    # expat reports namespaced names as "uri local" with namespace_separator
+    return name.rsplit(' ', 1)[-1]
+
+
+def parse_xml(stream):
+    """
+    Parse an XML stream, collecting ids, links and the elements of a
+    package document. Raises expat.ExpatError if it isn't well-formed.
+    """
+    ids = set()
+    links = []
+    elements = []
+    parser = expat.ParserCreate(namespace_separator=' ')
+
+    def start(name, attrs):
+        name = local_name(name)
+        attrs = {local_name(k): v for k, v in attrs.items()}
+        if 'id' in attrs:
+            ids.add(attrs['id'])
+        if name == 'a' and 'href' in attrs:
+            links.append(attrs['href'])
+        if name in ('rootfile', 'item', 'itemref'):
+            elements.append((name, attrs))
+
+    parser.StartElementHandler = start
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        parser.Parse(chunk, not chunk)
+        if not chunk:
+            break
+    return Document(ids, links, elements)
+
+
+def check_mimetype(zin, infos, problems):
+    if not infos or infos[0].filename != 'mimetype':
+        problems.append(Problem(ERROR, 'mimetype', 'not the first entry'))
+        return
+    info = infos[0]
+    if info.compress_type != zipfile.ZIP_STORED:
+        problems.append(Problem(ERROR, 'mimetype', 'compressed'))
+    if info.extra:
+        problems.append(Problem(ERROR, 'mimetype', 'has an extra field'))
+    if zin.read(info) != MIMETYPE:
+        problems.append(Problem(ERROR, 'mimetype', 'is not {}'.format(
+            MIMETYPE.decode('ascii'))))
+
+
+def validate(path):
+    """
+    Check one book. Returns a list of Problems.
+    """
+    problems = []
+    try:
+        zin = zipfile.ZipFile(path)
+    except (OSError, zipfile.BadZipFile) as e:
+        return [Problem(ERROR, path, str(e))]
+
+    with zin:
+        infos = zin.infolist()
+        names = {info.filename for info in infos}
+        check_mimetype(zin, infos, problems)
+
+        documents = {}
+        for info in infos:
+            if not info.filename.endswith(
+                    ('.xml', '.opf', '.xhtml', '.html', '.ncx', '.svg')):
+                continue
+            try:
+                with zin.open(info) as stream:
+                    documents[info.filename] = parse_xml(stream)
+            except (expat.ExpatError, zipfile.BadZipFile, OSError,
+                    EOFError) as e:
+                # Kept as None so it isn't reported again below
+                documents[info.filename] = None
+                problems.append(Problem(ERROR, info.filename, str(e)))
+
+        if CONTAINER not in names:
+            problems.append(Problem(ERROR, CONTAINER, 'missing'))
+            return problems
+        container = documents.get(CONTAINER)
+        if container is None:
+            return problems
+
+        rootfiles = [
+            attrs.get('full-path') for name, attrs in container.elements
+            if name == 'rootfile'
+        ]
+        if not rootfiles:
+            problems.append(Problem(ERROR, CONTAINER, 'no rootfile'))
+        for opf_name in rootfiles:
+            if opf_name not in names:
+                problems.append(Problem(ERROR, CONTAINER,
+                                        '{} is missing'.format(opf_name)))
+            elif documents.get(opf_name) is not None:
+                check_package(opf_name, documents, names, problems)
+
+    return problems
+
+
+def check_package(opf_name, documents, names, problems):
+    base = posixpath.dirname(opf_name)
+    package = documents[opf_name]
+
+    items = {}
+    nav = []
+    for name, attrs in package.elements:
+        if name != 'item':
+            continue
+        item_id = attrs.get('id')
+        href = posixpath.normpath(
+            posixpath.join(base, unquote(attrs.get('href', ''))))
+        if item_id in items:
+            problems.append(Problem(ERROR, opf_name,
+                                    'duplicate id {}'.format(item_id)))
+        items[item_id] = (href, attrs.get('media-type'))
+        if href not in names:
+            problems.append(Problem(ERROR, opf_name,
+                                    'manifest item {} is missing'.format(
+                                        href)))
+        if 'nav' in attrs.get('properties', '').split():
+            nav.append(href)
+
+    spine = [attrs.get('idref') for name, attrs in package.elements
+             if name == 'itemref']
+    if not spine:
+        problems.append(Problem(ERROR, opf_name, 'empty spine'))
+    for idref in spine:
+        if idref not in items:
+            problems.append(Problem(ERROR, opf_name,
+                                    'spine refers to unknown id {}'.format(
+                                        idref)))
+
+    if len(nav) != 1:
+        problems.append(Problem(ERROR, opf_name,
+                                '{} nav documents'.format(len(nav))))
+
+    manifest = {href for href, _ in items.values()}
+    for href, media_type in items.values():
+        if media_type in XML_TYPES and href in names and \
+                href not in documents:
+            # Listed as XML but not parsed: it has the wrong extension
+            problems.append(Problem(WARNING, href,
+                                    'not checked ({})'.format(media_type)))
+
+    for name in sorted(names):
+        if name in ('mimetype', opf_name) or name.startswith('META-INF/') \
+                or name.endswith('/'):
+            continue
+        if name not in manifest:
+            problems.append(Problem(WARNING, name, 'not in the manifest'))
+
+    for href in nav:
+        check_links(href, documents, manifest, problems)
+
+
+def check_links(name, documents, manifest, problems):
+    """
+    Every relative link in a document must reach a manifest item, and its
+    fragment an id in that item.
+    """
+    document = documents.get(name)
+    if document is None:
+        return
+    base = posixpath.dirname(name)
+    for link in document.links:
+        url, fragment = urldefrag(link)
+        if '://' in url or url.startswith('mailto:'):
+            continue
+        target = name if not url else posixpath.normpath(
+            posixpath.join(base, unquote(url)))
+        if target not in manifest:
+            problems.append(Problem(ERROR, name,
+                                    'link to {} outside the manifest'.format(
+                                        link)))
+            continue
+        if fragment and documents.get(target) is not None and \
+                fragment not in documents[target].ids:
+            problems.append(Problem(ERROR, name,
+                                    'link to missing id {}'.format(link)))
+
+
+def find_books(paths):
+    books = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                books.extend(
+                    os.path.join(root, f) for f in files
+                    if f.endswith('.epub')
+                )
+        else:
+            books.append(path)
+    return sorted(books)
+
+
+def validate_all(paths, workers=None):
+    """
+    Check every book under paths in parallel. Yields (book, problems).
+    """
+    books = find_books(paths)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from zip(books, executor.map(validate, books))
+
+
+def report(results):
+    """
+    Print problems and return the number of books with errors.
+    """
+    failed = 0
+    checked = 0
+    for book, problems in results:
+        checked += 1
+        if any(p.level == ERROR for p in problems):
+            failed += 1
+        for problem in problems:
+            print('{}: {}: {} {}'.format(
+                book, problem.level, problem.name, problem.message))
+    logger.info('{} books checked, {} with errors'.format(checked, failed))
+    return failed
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    return report(validate_all(args.paths, args.workers))
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "paths",
+        nargs='*',
+        default=['.'],
+        help="Books, or folders to search for books.",
+    )
+
+    parser.add_argument(
+        '--workers',
+        action='store',
+        dest='workers',
+        default=None,
+        type=int,
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    sys.exit(1 if main(args) else 0)
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+
+"""
+Export conferences as zip or tar.zst bundles for the mirrors
+
+The language folders of the chosen conferences, and the images their
+talks link to, are packed with their paths as they are on disk. The hash
+of every member is kept next to the bundle:
+
+    {year}/{month}/{lang}/...  ->  exports/cr_{year}{month}.zip
+    {year}/{month}/img/...         exports/cr_{year}{month}.zip.manifest.json
+
+Members are read and compressed a chunk at a time on a pool of threads, a
+bounded number at once, and written in order as they finish, so memory
+stays flat however large the export or its members are. Members whose
+content matches the last export are copied from it still compressed. A
+tar.zst bundle compresses every member as its own zstd frame so it can be
+copied the same way; zstd reads the frames back as one stream.
+
+python export.py [YYYY [MM]] [-l eng hun] [--format zip|tar.zst] [--full]
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import glob
+import hashlib
+import os
+import tarfile
+import tempfile
+import zipfile
+import zlib
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+if __package__:
+    from . import assets
+    from . import epub
+    from .logger import setup_logger
+else:
+    import assets
+    import epub
+    from logger import setup_logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = setup_logger(logfile=None)
+
+
+FOLDER_EXPORT = 'exports/'
+FORMATS = ['zip', 'tar.zst']
+DEFAULT_FORMAT = 'zip'
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Members in flight per worker
+WINDOW = 4
+# Files are read a chunk at a time, and compressed members larger than
+# SPOOL_SIZE wait for the writer on disk, so memory doesn't grow with them
+CHUNK_SIZE = 1024 * 1024
+SPOOL_SIZE = 1024 * 1024
+ZIP_LEVEL = 9
+ZSTD_LEVEL = 10
+# Already compressed, so stored as they are
+STORED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.zip', '.epub', '.zst'}
+CONFERENCE_GLOB = '{year}/{month}/'
+LANGUAGE_FOLDERS = ('md', 'html')
+# 1980-01-01, like the timestamps of zip entries
+TAR_MTIME = 315532800
+TAR_FILE_MODE = 0o644
+TAR_BLOCK = tarfile.BLOCKSIZE
+TAR_RECORD = tarfile.RECORDSIZE
+
+
+def find_members(year=None, month=None, languages=None):
+    """
+    Paths of every file in the chosen conferences' language folders, and
+    of the images their Markdown links to.
+
+    A language folder is one with an md/ or html/ folder, which leaves out
+    the build state in out/ and the shared img/.
+    """
+    pattern = CONFERENCE_GLOB.format(
+        year=year or '[0-9]' * 4,
+        month=month or '[0-9]' * 2,
+    )
+    members = []
+    for folder in sorted(glob.glob(pattern)):
+        images = set()
+        for lang in sorted(os.listdir(folder)):
+            lang_folder = os.path.join(folder, lang)
+            if not any(os.path.isdir(os.path.join(lang_folder, sub))
+                       for sub in LANGUAGE_FOLDERS):
+                continue
+            if languages and lang not in languages:
+                continue
+            for root, dirs, files in os.walk(lang_folder):
+                dirs.sort()
+                for f in sorted(files):
+                    if f.endswith('.tmp'):
+                        continue
+                    path = os.path.join(root, f).replace(os.sep, '/')
+                    members.append(path)
+                    if f.endswith('.md'):
+                        images.update(find_images(path))
+        members.extend(
+            path for path in sorted(images) if os.path.isfile(path))
+    return members
+
+
+def find_images(path):
+    """
+    The local images a talk's Markdown links to (see assets.py).
+    """
+    with open(path, encoding='utf-8') as fin:
+        return {
+            match['src'] for match in assets.IMAGE_REGEX.finditer(fin.read())
+            if not assets.REMOTE_REGEX.match(match['src'])
+        }
+
+
+def export_name(year=None, month=None, languages=None, fmt=DEFAULT_FORMAT):
+    name = 'cr'
+    if year:
+        name += '_' + year + (month or '')
+    if languages:
+        name += '_' + '-'.join(languages)
+    return FOLDER_EXPORT + name + '.' + fmt
+
+
+def read_chunks(fin, size=CHUNK_SIZE):
+    return iter(lambda: fin.read(size), b'')
+
+
+def hash_member(path):
+    """
+    The sha256 and size of a file, read a chunk at a time.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as fin:
+        for chunk in read_chunks(fin):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def spool(chunks):
+    """
+    Write chunks to a temporary file that only goes to disk once it is
+    large. Returns the file, rewound, and its length.
+    """
+    spooled = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+    for chunk in chunks:
+        spooled.write(chunk)
+    length = spooled.tell()
+    spooled.seek(0)
+    return spooled, length
+
+
+def read_range(fin, offset, length):
+    """
+    Yield length bytes of a file from offset, a chunk at a time.
+    """
+    fin.seek(offset)
+    while length:
+        chunk = fin.read(min(CHUNK_SIZE, length))
+        if not chunk:
+            raise EOFError('{} is truncated'.format(fin.name))
+        length -= len(chunk)
+        yield chunk
+
+
+def bounded_map(executor, fn, items, window):
+    """
+    Like executor.map, but with at most window items in flight.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def compress_type(path):
+    if os.path.splitext(path)[1].lower() in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def deflate_member(path, compress_type):
+    """
+    A ZipInfo and the spooled compressed bytes of a file, as epub.deflate
+    makes them but a chunk at a time.
+    """
+    info = zipfile.ZipInfo(path, epub.ZIP_DATE_TIME)
+    info.compress_type = compress_type
+    info.create_system = epub.ZIP_SYSTEM
+    info.external_attr = epub.ZIP_FILE_MODE
+    info.CRC = 0
+    info.file_size = 0
+    compressor = None
+    if compress_type == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(ZIP_LEVEL, zlib.DEFLATED, -15)
+
+    def compressed(fin):
+        for chunk in read_chunks(fin):
+            info.CRC = zlib.crc32(chunk, info.CRC)
+            info.file_size += len(chunk)
+            yield compressor.compress(chunk) if compressor else chunk
+        if compressor:
+            yield compressor.flush()
+
+    with open(path, 'rb') as fin:
+        data, info.compress_size = spool(compressed(fin))
+    return info, data
+
+
+def export_zip(filename, members, incremental=True, workers=DEFAULT_WORKERS):
+    """
+    Write members to a zip. Returns (written, reused) counts.
+    """
+    previous = epub.load_manifest(filename) if incremental else {}
+
+    def prepare(path):
+        digest, _ = hash_member(path)
+        if previous.get(path) == digest:
+            # Copied from the last export by the writer
+            return path, digest, None
+        return path, digest, deflate_member(path, compress_type(path))
+
+    books = epub.Sources()
+    manifest = {}
+    written = reused = 0
+    tmp_filename = filename + '.tmp'
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor, \
+                zipfile.ZipFile(tmp_filename, 'w', allowZip64=True) as zout:
+            for path, digest, compressed in bounded_map(
+                    executor, prepare, members, workers * WINDOW):
+                manifest[path] = digest
+                if compressed is None:
+                    found = books.locate(
+                        filename, path, digest, compress_type(path))
+                    if found is not None:
+                        book, info = found
+                        epub.write_raw(zout, info, epub.iter_raw(book, info),
+                                       epub.ZIP_DATE_TIME)
+                        reused += 1
+                        continue
+                    compressed = deflate_member(path, compress_type(path))
+                written += 1
+                info, data = compressed
+                with data:
+                    epub.write_raw(zout, info, read_chunks(data),
+                                   epub.ZIP_DATE_TIME)
+    finally:
+        books.close()
+
+    os.replace(tmp_filename, filename)
+    epub.save_manifest(filename, manifest)
+    return written, reused
+
+
+def tar_header(path, size):
+    """
+    The header of one member of a tar stream, and the padding after its
+    data.
+    """
+    info = tarfile.TarInfo(path)
+    info.size = size
+    info.mtime = TAR_MTIME
+    info.mode = TAR_FILE_MODE
+    header = info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+    return header, b'\0' * (-size % TAR_BLOCK)
+
+
+def compress_tar_member(path, size):
+    """
+    One zstd frame of a member's tar header, data and padding, spooled.
+    Returns the frame, its length and the length of the tar data.
+    """
+    header, padding = tar_header(path, size)
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compressed():
+        yield compressor.compress(header)
+        read = 0
+        with open(path, 'rb') as fin:
+            for chunk in read_chunks(fin):
+                read += len(chunk)
+                yield compressor.compress(chunk)
+        if read != size:
+            raise RuntimeError('{} changed while exporting'.format(path))
+        yield compressor.compress(padding)
+        yield compressor.flush()
+
+    frame, frame_length = spool(compressed())
+    return frame, frame_length, len(header) + size + len(padding)
+
+
+def export_tar_zst(filename, members, incremental=True,
+                   workers=DEFAULT_WORKERS):
+    """
+    Write members to a tar.zst, one zstd frame each. Returns (written,
+    reused) counts.
+
+    The manifest maps each member to [hash, offset, length] of its frame
+    and the size of its tar data.
+    """
+    if zstandard is None:
+        raise RuntimeError('zstandard is required for tar.zst exports')
+
+    previous = epub.load_manifest(filename) if incremental else {}
+    old = open(filename, 'rb') if previous and os.path.exists(filename) \
+        else None
+
+    def prepare(path):
+        digest, size = hash_member(path)
+        if old is not None and previous.get(path, [None])[0] == digest:
+            _, _, frame_length, length = previous[path]
+            return path, digest, None, frame_length, length
+        return (path, digest) + compress_tar_member(path, size)
+
+    manifest = {}
+    written = reused = 0
+    size = 0
+    tmp_filename = filename + '.tmp'
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor, \
+                open(tmp_filename, 'wb') as fout:
+            for path, digest, frame, frame_length, length in bounded_map(
+                    executor, prepare, members, workers * WINDOW):
+                manifest[path] = [digest, fout.tell(), frame_length, length]
+                if frame is None:
+                    offset = previous[path][1]
+                    for chunk in read_range(old, offset, frame_length):
+                        fout.write(chunk)
+                    reused += 1
+                else:
+                    with frame:
+                        for chunk in read_chunks(frame):
+                            fout.write(chunk)
+                    written += 1
+                size += length
+
+            # End of archive: two empty blocks, padded to a whole record
+            end = 2 * TAR_BLOCK
+            end += -(size + end) % TAR_RECORD
+            fout.write(zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(
+                b'\0' * end))
+    finally:
+        if old is not None:
+            old.close()
+
+    os.replace(tmp_filename, filename)
+    epub.save_manifest(filename, manifest)
+    return written, reused
+
+
+EXPORTERS = {
+    'zip': export_zip,
+    'tar.zst': export_tar_zst,
+}
+
+
+def export(year=None, month=None, languages=None, fmt=DEFAULT_FORMAT,
+           filename=None, incremental=True, workers=DEFAULT_WORKERS):
+    """
+    Export the chosen conferences and return the bundle's path.
+    """
+    filename = filename or export_name(year, month, languages, fmt)
+    members = find_members(year, month, languages)
+    if not members:
+        logger.error('Nothing to export')
+        return None
+    ensure_path_exists(filename)
+    written, reused = EXPORTERS[fmt](filename, members, incremental, workers)
+    logger.info('{} ({} members compressed, {} reused, {} bytes)'.format(
+        filename, written, reused, os.path.getsize(filename)))
+    return filename
+
+
+def ensure_path_exists(path):
+    dirs = os.path.dirname(path)
+    if dirs and not os.path.exists(dirs):
+        os.makedirs(dirs)
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    export(
+        args.year,
+        args.month,
+        args.languages,
+        args.format,
+        args.output,
+        not args.full,
+        args.workers,
+    )
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "year",
+        nargs='?',
+        help="The year of the conference (e.g. 2017).",
+    )
+    parser.add_argument(
+        "month",
+        nargs='?',
+        help="The month of the conference (i.e. 04 or 10).",
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--languages',
+        action='store',
+        dest='languages',
+        default=None,
+        nargs='+',
+    )
+
+    parser.add_argument(
+        '--format',
+        action='store',
+        dest='format',
+        default=DEFAULT_FORMAT,
+        choices=FORMATS,
+    )
+
+    parser.add_argument(
+        '-o',
+        '--output',
+        action='store',
+        dest='output',
+        default=None,
+        help="Where to write the bundle (default exports/cr_*.FORMAT).",
+    )
+
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        default=False,
+        help="Compress everything again, ignoring the last export.",
+    )
+
+    parser.add_argument(
+        '--workers',
+        action='store',
+        dest='workers',
+        default=DEFAULT_WORKERS,
+        type=int,
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
@@ -10,11 +10,25 @@ __license__ = "MIT"
 
 import argparse
 import os
-import re
-import requests
 
 from bs4 import BeautifulSoup
-from logger import setup_logger
+
+if __package__:
+    from . import fetch
+    from . import profiles
+    from .logger import setup_logger
+else:
+    import fetch
+    import profiles
+    from logger import setup_logger
+
+try:
+    if __package__:
+        from . import dedupe
+    else:
+        import dedupe
+except ImportError:
+    dedupe = None
 
 logger = setup_logger(logfile=None)
 
@@ -76,67 +90,171 @@ FOLDER_HTML = '{year}/{month}/{lang}/html/'
 FILEPATH_HTML = FOLDER_HTML + '{slug}.html'
 
 
-def get_slugs(year, month, lang):
-    slugs = []
-    r = requests.get(
-        TOC_URL.format(year=year, month=month, lang=lang),
-    )
+def get_slugs(year, month, lang, controller=None):
+    _, r = next(fetch.fetch_all(
+        [TOC_URL.format(year=year, month=month, lang=lang)],
+        controller=controller,
+    ))
+    if isinstance(r, Exception):
+        raise r
+    # An error page would be learned as a layout without landmarks
+    r.raise_for_status()
+    profile = profiles.registry().match(r.content)
     soup = BeautifulSoup(r.content, 'html.parser')
-    sub_items = soup.find('ul', class_=re.compile('^subItems-'))
+    toc = profiles.find(soup, profile.get('toc'))
+    if toc is None:
+        raise ValueError('no table of contents in this layout: {}'.format(
+            sorted(profile)))
+
+    if profile['toc']['layout'] == 'lumen':
+        talks = lumen_talks(toc)
+    else:
+        talks = subitems_talks(toc)
+
+    slugs = []
+    for section_title, link, title, speaker_name in talks:
+        if section_title in IGNORE_SECTIONS or title in IGNORE_TITLES:
+            continue
+        if clean_speaker(speaker_name) in APOSTLES:
+            slugs.append(link.split('/')[-1].split('?')[0])
+    return slugs
+
+
+def subitems_talks(sub_items):
+    """
+    Yield (section, link, title, speaker) from a table of contents list.
+    """
     for section in sub_items.contents:
         section_title = section.p.text
-        if section_title not in IGNORE_SECTIONS:
-            for item in section.find_all('li'):
-                link = item.a['href']
-                slug = link.split('/')[-1].split('?')[0]
-                title, speaker_name = [x.text for x in item.find_all('p')]
-                if title not in IGNORE_TITLES:
-                    if ' püspök' in speaker_name:
-                        speaker_name = speaker_name.replace(' püspök', '')
-                    if ' elder' in speaker_name:
-                        speaker_name = speaker_name.replace(' elder', '')
-                    if ' elnök' in speaker_name:
-                        speaker_name = speaker_name.replace(' elnök', '')
-                    if 'Benyújtotta: ' in speaker_name:
-                        speaker_name = speaker_name.replace('Benyújtotta: ', '')
-                    if '\xa0' in speaker_name:
-                        speaker_name = speaker_name.replace('\xa0', ' ')
-
-                    if speaker_name in APOSTLES:
-                        slugs.append(slug)
+        for item in section.find_all('li'):
+            title, speaker_name = [x.text for x in item.find_all('p')]
+            yield section_title, item.a['href'], title, speaker_name
 
-    return slugs
+
+def lumen_talks(sections):
+    """
+    Yield (section, link, title, speaker) from the tiles of older pages.
+    """
+    for section in sections:
+        header = section.find('span', class_='section__header__title')
+        if header is None:
+            continue
+        for speaker in section.find_all('div', class_='lumen-tile__content'):
+            title = speaker.previous_sibling.previous_sibling.text.strip()
+            link = speaker.parent.parent['href']
+            yield header.text, link, title, speaker.text
+
+
+def clean_speaker(speaker_name):
+    if ' püspök' in speaker_name:
+        speaker_name = speaker_name.replace(' püspök', '')
+    if ' elder' in speaker_name:
+        speaker_name = speaker_name.replace(' elder', '')
+    if ' elnök' in speaker_name:
+        speaker_name = speaker_name.replace(' elnök', '')
+    if 'Benyújtotta: ' in speaker_name:
+        speaker_name = speaker_name.replace('Benyújtotta: ', '')
+    if '\xa0' in speaker_name:
+        speaker_name = speaker_name.replace('\xa0', ' ')
+    return speaker_name
+
+
+def speaker_of(text):
+    """
+    Return the apostle named in the opening lines of a talk, or None.
+    """
+    head = text[:1000].replace('\xa0', ' ')
+    found = [(head.find(name), name) for name in APOSTLES if name in head]
+    if not found:
+        return None
+    return min(found)[1]
 
 
-def download_talks(slugs, year, month, lang):
+def download_talks(slugs, year, month, lang, store=None, controller=None,
+                   skip_duplicates=False):
     """
+    Download talks and return the html/ paths written.
+
+    With skip_duplicates, a page nearly identical to one with an earlier
+    slug (a talk published twice) is left out, so it isn't converted or
+    published again.
     """
-    paths = []
-    for slug in slugs:
-        filename = FILEPATH_HTML.format(
+    manifest = None
+    if store is not None:
+        manifest = store.manifest(year, month, lang)
+        # Recorded before downloading, so verify can tell what failed
+        store.expect(year, month, lang, [
+            'html/{slug}.html'.format(slug=slug) for slug in slugs
+        ])
+
+    urls = {
+        TALK_URL.format(
             lang=lang,
             month=month,
             slug=slug,
             year=year,
-        )
+        ): slug
+        for slug in slugs
+    }
+
+    responses = fetch.fetch_all(urls, controller=controller)
+    index = None
+    if skip_duplicates and dedupe is not None:
+        # In slug order, so the same copy is kept on every run
+        responses = sorted(responses, key=lambda response: urls[response[0]])
+        index = dedupe.LSHIndex()
+
+    downloaded = {}
+    skipped = []
+    for url, r in responses:
+        slug = urls[url]
+        if isinstance(r, Exception) or r.status_code >= 400:
+            logger.error('{} {}'.format(url, getattr(r, 'status_code', r)))
+            continue
 
-        ensure_path_exists(filename)
-        paths.append(filename)
+        soup = BeautifulSoup(r.content, 'html.parser')
 
-        r = requests.get(TALK_URL.format(
+        if index is not None:
+            # The talk body only; every page shares the site's navigation
+            profile = profiles.registry().match(r.content)
+            body = profiles.find(soup, profile.get('article')) or soup
+            shingles = dedupe.word_shingles(body.get_text(' '))
+            matches = index.insert(slug, dedupe.signature(shingles))
+            if matches:
+                logger.info('skipping {} (duplicate of {})'.format(
+                    slug,
+                    matches[0][0],
+                ))
+                skipped.append('html/{slug}.html'.format(slug=slug))
+                continue
+
+        filename = FILEPATH_HTML.format(
             lang=lang,
             month=month,
             slug=slug,
             year=year,
-        ))
+        )
 
-        soup = BeautifulSoup(r.content, 'html.parser')
+        ensure_path_exists(filename)
+        downloaded[slug] = filename
 
         logger.info(filename)
+        if manifest is not None:
+            name = 'html/{slug}.html'.format(slug=slug)
+            data = str(soup).encode('utf-8')
+            if not store.write_file(filename, data, manifest, name):
+                logger.info('unchanged: {}'.format(filename))
+            continue
+
         with open(filename, 'w', encoding='utf-8') as fout:
             fout.write(str(soup))
 
-    return paths
+    if manifest is not None:
+        manifest.save()
+        if skipped:
+            store.expect(year, month, lang, [], skipped)
+
+    return [downloaded[slug] for slug in slugs if slug in downloaded]
 
 
 def ensure_path_exists(path):
@@ -151,8 +269,11 @@ def main(args):
     """
     logger.info("hello world")
     logger.info(args)
-    slugs = get_slugs(args.year, args.month, args.lang)
-    paths = download_talks(slugs, args.year, args.month, args.lang)
+    controller = fetch.AdaptiveController()
+    slugs = get_slugs(args.year, args.month, args.lang, controller)
+    paths = download_talks(slugs, args.year, args.month, args.lang,
+                           controller=controller)
+    logger.info(controller.summary())
 
 
 if __name__ == "__main__":
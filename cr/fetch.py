@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+
+"""
+Shared concurrent fetch pool for churchofjesuschrist.org and other sources
+
+One pooled requests session is shared by a thread pool, and requests to
+the same host are spaced out by a per-host rate limit. An optional
+AdaptiveController sizes the number of requests in flight: it grows by one
+while latency is steady and halves on 429/5xx responses, errors or latency
+spikes, pausing for as long as a Retry-After header asks.
+
+python fetch.py URL [URL ...]
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import email.utils
+import hashlib
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+if __package__:
+    from .logger import setup_logger
+else:
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+DEFAULT_WORKERS = 8
+DEFAULT_RATE = 4.0
+DEFAULT_TIMEOUT = 30
+DEFAULT_CACHE = '.cache/fetch'
+USER_AGENT = 'speeches/{version}'.format(version=__version__)
+
+# Adaptive concurrency: additive increase, multiplicative decrease
+MIN_CONCURRENCY = 1
+START_CONCURRENCY = 2
+DECREASE_FACTOR = 0.5
+LATENCY_SPIKE = 2.0
+LATENCY_SMOOTHING = 0.2
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0
+MAX_RETRY_AFTER = 300
+THROTTLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def make_session(pool_size=DEFAULT_WORKERS):
+    """
+    A session whose connection pool is large enough for every worker.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def shared_session(pool_size=DEFAULT_WORKERS):
+    """
+    A session kept for the life of the process, so a long-running caller
+    reuses its open connections.
+    """
+    with _sessions_lock:
+        if pool_size not in _sessions:
+            _sessions[pool_size] = make_session(pool_size)
+        return _sessions[pool_size]
+
+
+class HostRateLimiter:
+    """
+    Allow at most `rate` requests per second to each host.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE):
+        self.interval = 1.0 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def retry_after(response):
+    """
+    Seconds a response asks us to wait, from its Retry-After header.
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return 0
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return 0
+        seconds = when.timestamp() - time.time()
+    return min(max(seconds, 0), MAX_RETRY_AFTER)
+
+
+class AdaptiveController:
+    """
+    Limit requests in flight, adapting the limit to how the server copes.
+
+    The limit grows by one after each window of `limit` good responses and
+    is multiplied by DECREASE_FACTOR on a throttle or a latency spike, at
+    most once per window so a burst of failures counts once.
+    """
+
+    def __init__(self, maximum=DEFAULT_WORKERS, minimum=MIN_CONCURRENCY,
+                 start=START_CONCURRENCY):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(max(minimum, min(start, maximum)))
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.successes = 0
+        self.window_start = 0
+        self.sent = 0
+        self.resume_at = 0
+        self.latency = None
+
+        self.peak = self.limit
+        self.requests = 0
+        self.total_latency = 0.0
+        self.throttles = 0
+        self.spikes = 0
+        self.errors = 0
+        self.retries = 0
+
+    def acquire(self):
+        with self.condition:
+            while True:
+                wait = self.resume_at - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    break
+                self.condition.wait(wait if wait > 0 else None)
+            self.in_flight += 1
+            self.sent += 1
+            return self.sent
+
+    def release(self, ticket, latency, status=None, delay=0):
+        """
+        Record a finished request. status is None if it raised.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            self.requests += 1
+            self.total_latency += latency
+
+            spike = (
+                self.latency is not None
+                and latency > self.latency * LATENCY_SPIKE
+            )
+            throttled = status is None or status in THROTTLE_STATUS
+            if status is None:
+                self.errors += 1
+            elif status in THROTTLE_STATUS:
+                self.throttles += 1
+            elif spike:
+                self.spikes += 1
+
+            if delay:
+                self.resume_at = max(self.resume_at,
+                                     time.monotonic() + delay)
+
+            if throttled or spike:
+                # Requests sent before the last decrease saw the old limit
+                if ticket > self.window_start:
+                    self.limit = max(self.minimum,
+                                     self.limit * DECREASE_FACTOR)
+                    self.window_start = self.sent
+                    self.successes = 0
+            else:
+                self.successes += 1
+                if self.successes >= int(self.limit):
+                    self.limit = min(self.maximum, self.limit + 1)
+                    self.peak = max(self.peak, self.limit)
+                    self.successes = 0
+
+            # Spikes move the baseline too, so that a lasting rise in
+            # latency becomes the new normal instead of a spike forever
+            if not throttled:
+                if self.latency is None:
+                    self.latency = latency
+                else:
+                    self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+            self.condition.notify_all()
+
+    def summary(self):
+        mean = self.total_latency / self.requests if self.requests else 0
+        return (
+            'concurrency {limit} (peak {peak}), {requests} requests, '
+            'mean latency {mean:.2f}s, {throttles} throttled, '
+            '{spikes} latency spikes, {errors} errors, {retries} retries'
+        ).format(
+            limit=int(self.limit),
+            peak=int(self.peak),
+            requests=self.requests,
+            mean=mean,
+            throttles=self.throttles,
+            spikes=self.spikes,
+            errors=self.errors,
+            retries=self.retries,
+        )
+
+
+def fetch_all(urls, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE,
+              session=None, method='GET', controller=None, **kwargs):
+    """
+    Fetch urls concurrently and yield (url, response) as they finish.
+
+    A failed request yields its exception in place of the response. With
+    a controller, throttled requests are retried after Retry-After.
+    """
+    if controller is not None:
+        workers = max(workers, controller.maximum)
+    session = session or shared_session(workers)
+    limiter = HostRateLimiter(rate)
+    kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+
+    def request(url):
+        limiter.wait(url)
+        return session.request(method, url, **kwargs)
+
+    def fetch(url):
+        if controller is None:
+            return request(url)
+
+        for attempt in range(MAX_RETRIES + 1):
+            ticket = controller.acquire()
+            # Time the server only, not our own wait for the rate limit
+            limiter.wait(url)
+            start = time.monotonic()
+            try:
+                response = session.request(method, url, **kwargs)
+            except requests.RequestException:
+                controller.release(ticket, time.monotonic() - start)
+                raise
+            delay = 0
+            if response.status_code in THROTTLE_STATUS:
+                delay = retry_after(response) or RETRY_BACKOFF * 2 ** attempt
+            controller.release(
+                ticket,
+                time.monotonic() - start,
+                response.status_code,
+                delay,
+            )
+            if response.status_code not in THROTTLE_STATUS or \
+                    attempt == MAX_RETRIES:
+                return response
+            with controller.condition:
+                controller.retries += 1
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fetch, url): url for url in urls}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                yield url, future.result()
+            except requests.RequestException as e:
+                yield url, e
+
+
+def fetch_cached(urls, cache_dir=DEFAULT_CACHE, **kwargs):
+    """
+    Like fetch_all, but yield (url, bytes) and keep successful responses
+    on disk so each URL is downloaded only once.
+    """
+    misses = []
+    for url in urls:
+        path = cache_path(url, cache_dir)
+        if os.path.exists(path):
+            with open(path, 'rb') as fin:
+                yield url, fin.read()
+        else:
+            misses.append(url)
+
+    for url, response in fetch_all(misses, **kwargs):
+        if isinstance(response, Exception):
+            yield url, response
+            continue
+        if response.status_code >= 400:
+            yield url, requests.HTTPError(response.status_code)
+            continue
+
+        path = cache_path(url, cache_dir)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        with open(path + '.tmp', 'wb') as fout:
+            fout.write(response.content)
+        os.replace(path + '.tmp', path)
+        yield url, response.content
+
+
+def cache_path(url, cache_dir=DEFAULT_CACHE):
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, digest)
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    controller = AdaptiveController(args.workers) if args.adaptive else None
+    for url, response in fetch_all(args.urls, args.workers, args.rate,
+                                   controller=controller):
+        if isinstance(response, Exception):
+            logger.error('{} {}'.format(url, response))
+        else:
+            logger.info('{} {}'.format(url, response.status_code))
+    if controller is not None:
+        logger.info(controller.summary())
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("urls", nargs='+', help="URLs to fetch.")
+
+    parser.add_argument(
+        '--workers',
+        action='store',
+        dest='workers',
+        default=DEFAULT_WORKERS,
+        type=int,
+    )
+
+    parser.add_argument(
+        '--rate',
+        action='store',
+        dest='rate',
+        default=DEFAULT_RATE,
+        type=float,
+        help="Maximum requests per second to one host.",
+    )
+
+    parser.add_argument(
+        '--adaptive',
+        action='store_true',
+        dest='adaptive',
+        help="Adapt the requests in flight (up to --workers) to the server.",
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
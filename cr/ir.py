@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+"""
+Parsed intermediate representation of a talk
+
+A talk's Markdown is parsed once into headings, paragraphs, quotes, images
+and notes, and the result is cached on disk next to a hash of the source so
+every output format can reuse it:
+
+    .ir/{year}/{month}/{lang}/{slug}.json
+
+python ir.py YYYY MM
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import hashlib
+import json
+import os
+import re
+
+from dataclasses import asdict, dataclass, field
+from typing import List
+
+if __package__:
+    from .extractor import speaker_of
+    from .logger import setup_logger
+else:
+    from extractor import speaker_of
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+FOLDER_MD = '{year}/{month}/{lang}/md/'
+CACHE_DIR = '.ir'
+CACHE_PATH = '{root}/{year}/{month}/{lang}/{slug}.json'
+IR_VERSION = 1
+
+PARAGRAPH_SPLIT = re.compile(r'\n\s*\n')
+HEADING_REGEX = re.compile(r'^(#{1,6})\s+(.*)$')
+IMAGE_REGEX = re.compile(r'^!\[(?P<alt>[^\]]*)\]\((?P<src>[^)\s]+)[^)]*\)$')
+NOTE_REGEX = re.compile(r'^\[\^(\w[\w-]*)\]:\s*(.*)$')
+REF_REGEX = re.compile(r'\[\^(\w[\w-]*)\](?!:)')
+LIST_REGEX = re.compile(r'^(?:[*+-]|\d+\.)\s+')
+
+
+@dataclass
+class Block:
+    kind: str
+    text: str
+    level: int = 0
+    refs: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Note:
+    label: str
+    text: str
+
+
+@dataclass
+class Talk:
+    year: str
+    month: str
+    lang: str
+    slug: str
+    title: str
+    speaker: str
+    blocks: List[Block]
+    notes: List[Note]
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data['blocks'] = [Block(**b) for b in data['blocks']]
+        data['notes'] = [Note(**n) for n in data['notes']]
+        return cls(**data)
+
+
+def parse_block(chunk):
+    lines = chunk.split('\n')
+    match = HEADING_REGEX.match(chunk)
+    if match and len(lines) == 1:
+        return Block('heading', match.group(2).strip(), len(match.group(1)))
+
+    match = IMAGE_REGEX.match(chunk)
+    if match:
+        return Block('image', match['alt'], refs=[match['src']])
+
+    if all(line.startswith('>') for line in lines):
+        text = '\n'.join(line[1:].strip() for line in lines)
+        return Block('quote', text, refs=REF_REGEX.findall(text))
+
+    if LIST_REGEX.match(chunk):
+        items = [LIST_REGEX.sub('', line).strip() for line in lines]
+        return Block('list', '\n'.join(items), refs=REF_REGEX.findall(chunk))
+
+    text = ' '.join(line.strip() for line in lines)
+    return Block('paragraph', text, refs=REF_REGEX.findall(text))
+
+
+def parse(content, year, month, lang, slug):
+    """
+    Parse talk Markdown as written by converter into a Talk.
+    """
+    blocks = []
+    notes = []
+    for chunk in PARAGRAPH_SPLIT.split(content.strip()):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+
+        lines = chunk.split('\n')
+        if NOTE_REGEX.match(lines[0]):
+            for line in lines:
+                match = NOTE_REGEX.match(line)
+                if match:
+                    notes.append(Note(match.group(1), match.group(2).strip()))
+                elif notes:
+                    notes[-1].text += ' ' + line.strip()
+            continue
+
+        blocks.append(parse_block(chunk))
+
+    title = next((b.text for b in blocks if b.kind == 'heading'), slug)
+    return Talk(
+        year=year,
+        month=month,
+        lang=lang,
+        slug=slug,
+        title=title,
+        speaker=speaker_of(content) or '',
+        blocks=blocks,
+        notes=notes,
+    )
+
+
+def load(filepath, year, month, lang, cache_dir=CACHE_DIR):
+    """
+    Return the Talk for a Markdown file, parsing it only if it changed.
+    """
+    slug = os.path.basename(filepath)[:-len('.md')]
+    with open(filepath, 'rb') as fin:
+        data = fin.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    cache_path = CACHE_PATH.format(
+        root=cache_dir,
+        year=year,
+        month=month,
+        lang=lang,
+        slug=slug,
+    )
+    if os.path.exists(cache_path):
+        with open(cache_path, encoding='utf-8') as fin:
+            cached = json.load(fin)
+        if cached['version'] == IR_VERSION and cached['source'] == digest:
+            return Talk.from_dict(cached['talk'])
+
+    talk = parse(data.decode('utf-8'), year, month, lang, slug)
+    ensure_path_exists(cache_path)
+    with open(cache_path + '.tmp', 'w', encoding='utf-8') as fout:
+        json.dump(
+            {'version': IR_VERSION, 'source': digest, 'talk': asdict(talk)},
+            fout,
+            ensure_ascii=False,
+        )
+    os.replace(cache_path + '.tmp', cache_path)
+    return talk
+
+
+def load_conference(year, month, languages, cache_dir=CACHE_DIR):
+    """
+    Talks of a conference, in the order publisher.gather_talks uses.
+    """
+    talks = []
+    for lang in languages:
+        folder_md = FOLDER_MD.format(year=year, month=month, lang=lang)
+        for entry in os.scandir(folder_md):
+            if entry.name.endswith('.md'):
+                talks.append(load(entry.path, year, month, lang, cache_dir))
+    talks.sort(key=lambda talk: talk.slug)
+    return talks
+
+
+def ensure_path_exists(path):
+    dirs = os.path.dirname(path)
+    if not os.path.exists(dirs):
+        os.makedirs(dirs)
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    for talk in load_conference(args.year, args.month, args.languages):
+        logger.info('{} {} blocks, {} notes'.format(
+            talk.slug,
+            len(talk.blocks),
+            len(talk.notes),
+        ))
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    # Required positional argument
+    parser.add_argument("year", help="The year of the conference (e.g. 2017).")
+    parser.add_argument(
+        "month",
+        help="The month of the conference (i.e. 04 or 10).",
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--languages',
+        action='store',
+        dest='languages',
+        default=['eng', 'hun'],
+        nargs='+',
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+
+"""
+Durable build queue shared by worker processes
+
+Jobs are (year, month, lang, stage) rows in a SQLite database, so the queue
+can sit on a shared filesystem and be served by workers on several hosts.
+A worker claims a job with a lease and renews it with heartbeats while the
+job runs. If a worker dies its lease expires and the job is handed to
+another worker, up to MAX_ATTEMPTS times. A job only becomes ready once the
+earlier stages of the same conference and language are done.
+
+    jobs.db
+
+python jobqueue.py status
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+
+from collections import namedtuple
+
+if __package__:
+    from .logger import setup_logger
+else:
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+DEFAULT_QUEUE = 'jobs.db'
+DEFAULT_LEASE = 300
+DEFAULT_POLL = 5
+MAX_ATTEMPTS = 3
+# Stages run in this order for a conference and language
+STAGES = ['download', 'convert', 'render', 'publish']
+# Stages that work on every language of a conference at once
+BOOK_STAGES = {'render', 'publish'}
+LANG_SEPARATOR = '+'
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    year TEXT NOT NULL,
+    month TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    error TEXT,
+    UNIQUE (year, month, lang, stage)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+"""
+
+Job = namedtuple('Job', 'id year month lang stage attempts')
+
+
+def worker_name():
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def connect(path=DEFAULT_QUEUE):
+    # Transactions are explicit, and BEGIN IMMEDIATE takes the write lock
+    # up front so two workers never claim the same job. WAL is avoided as
+    # it doesn't work over network filesystems.
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def enqueue(conn, year, month, languages, stages=STAGES):
+    """
+    Add the jobs to build a conference; existing jobs are left alone.
+    """
+    rows = []
+    for stage in stages:
+        if stage in BOOK_STAGES:
+            rows.append((year, month, LANG_SEPARATOR.join(languages), stage))
+        else:
+            rows.extend((year, month, lang, stage) for lang in languages)
+
+    conn.execute('BEGIN IMMEDIATE')
+    before = conn.total_changes
+    conn.executemany(
+        'INSERT OR IGNORE INTO jobs (year, month, lang, stage) '
+        'VALUES (?, ?, ?, ?)',
+        rows,
+    )
+    added = conn.total_changes - before
+    conn.execute('COMMIT')
+    return added
+
+
+def blockers(conn, job):
+    """
+    States of the earlier-stage jobs of the same conference and languages
+    that aren't done yet.
+    """
+    earlier = STAGES[:STAGES.index(job.stage)]
+    if not earlier:
+        return []
+    languages = set(job.lang.split(LANG_SEPARATOR))
+    rows = conn.execute(
+        'SELECT lang, state FROM jobs WHERE year = ? AND month = ? '
+        'AND state != ? AND stage IN ({})'.format(
+            ', '.join('?' * len(earlier))),
+        [job.year, job.month, DONE] + earlier,
+    )
+    return [
+        state for lang, state in rows
+        if languages & set(lang.split(LANG_SEPARATOR))
+    ]
+
+
+def expire_leases(conn, now):
+    conn.execute(
+        'UPDATE jobs SET state = ?, worker = NULL '
+        'WHERE state = ? AND lease_until < ? AND attempts >= ?',
+        (FAILED, RUNNING, now, MAX_ATTEMPTS),
+    )
+    conn.execute(
+        'UPDATE jobs SET state = ?, worker = NULL '
+        'WHERE state = ? AND lease_until < ?',
+        (PENDING, RUNNING, now),
+    )
+
+
+def claim(conn, worker, lease=DEFAULT_LEASE):
+    """
+    Lease the next ready job to worker, or return None.
+    """
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        expire_leases(conn, now)
+        rows = conn.execute(
+            'SELECT id, year, month, lang, stage, attempts FROM jobs '
+            'WHERE state = ? ORDER BY year, month, id',
+            (PENDING,),
+        ).fetchall()
+        for row in rows:
+            job = Job(*row)
+            waiting_on = blockers(conn, job)
+            if FAILED in waiting_on:
+                conn.execute(
+                    'UPDATE jobs SET state = ?, error = ? WHERE id = ?',
+                    (FAILED, 'an earlier stage failed', job.id),
+                )
+                continue
+            if waiting_on:
+                continue
+            conn.execute(
+                'UPDATE jobs SET state = ?, worker = ?, lease_until = ?, '
+                'attempts = attempts + 1 WHERE id = ?',
+                (RUNNING, worker, now + lease, job.id),
+            )
+            conn.execute('COMMIT')
+            return job._replace(attempts=job.attempts + 1)
+        conn.execute('COMMIT')
+        return None
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def heartbeat(conn, job, worker, lease=DEFAULT_LEASE):
+    """
+    Extend the lease on a job. False if the worker no longer holds it.
+    """
+    cursor = conn.execute(
+        'UPDATE jobs SET lease_until = ? '
+        'WHERE id = ? AND worker = ? AND state = ?',
+        (time.time() + lease, job.id, worker, RUNNING),
+    )
+    return cursor.rowcount == 1
+
+
+def complete(conn, job, worker):
+    conn.execute(
+        'UPDATE jobs SET state = ?, lease_until = NULL, error = NULL '
+        'WHERE id = ? AND worker = ?',
+        (DONE, job.id, worker),
+    )
+
+
+def fail(conn, job, worker, error):
+    state = FAILED if job.attempts >= MAX_ATTEMPTS else PENDING
+    conn.execute(
+        'UPDATE jobs SET state = ?, worker = NULL, lease_until = NULL, '
+        'error = ? WHERE id = ? AND worker = ?',
+        (state, error, job.id, worker),
+    )
+
+
+def unfinished(conn):
+    """
+    Jobs that are pending, or running under a live lease.
+    """
+    (count,) = conn.execute(
+        'SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)',
+        (PENDING, RUNNING),
+    ).fetchone()
+    return count
+
+
+def counts(conn):
+    return dict(conn.execute(
+        'SELECT state, COUNT(*) FROM jobs GROUP BY state'
+    ).fetchall())
+
+
+class Heartbeat(threading.Thread):
+    """
+    Renew a job's lease in the background while it runs.
+    """
+
+    def __init__(self, path, job, worker, lease):
+        super().__init__(daemon=True)
+        self.path = path
+        self.job = job
+        self.worker = worker
+        self.lease = lease
+        self.stopped = threading.Event()
+
+    def run(self):
+        conn = connect(self.path)
+        try:
+            while not self.stopped.wait(self.lease / 3):
+                if not heartbeat(conn, self.job, self.worker, self.lease):
+                    logger.error('lost the lease on job {}'.format(
+                        self.job.id))
+                    return
+        finally:
+            conn.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def running(conn, host=None):
+    """
+    Jobs running anywhere, or only on one host's workers.
+    """
+    if host is None:
+        (count,) = conn.execute(
+            'SELECT COUNT(*) FROM jobs WHERE state = ?',
+            (RUNNING,),
+        ).fetchone()
+        return count
+    (count,) = conn.execute(
+        'SELECT COUNT(*) FROM jobs WHERE state = ? AND worker LIKE ?',
+        (RUNNING, host + ':%'),
+    ).fetchone()
+    return count
+
+
+def work(handler, path=DEFAULT_QUEUE, lease=DEFAULT_LEASE,
+         poll=DEFAULT_POLL, worker=None, budget=None):
+    """
+    Run handler(job) on claimed jobs until nothing is left to do.
+
+    With a memprofile.MemoryBudget, no job is claimed while this host's
+    workers are over budget and other jobs on the host are running, which
+    will free memory when they finish. Jobs on other hosts don't count.
+
+    Returns the number of jobs completed by this worker.
+    """
+    worker = worker or worker_name()
+    conn = connect(path)
+    done = 0
+    try:
+        while True:
+            if budget is not None and not budget.available() and \
+                    running(conn, socket.gethostname()):
+                time.sleep(poll)
+                continue
+
+            job = claim(conn, worker, lease)
+            if job is None:
+                if not unfinished(conn):
+                    break
+                # Waiting on other workers' stages or expired leases
+                time.sleep(poll)
+                continue
+
+            logger.info('{} {} {}/{} {} (attempt {})'.format(
+                worker, job.stage, job.year, job.month, job.lang,
+                job.attempts))
+            beat = Heartbeat(path, job, worker, lease)
+            beat.start()
+            try:
+                handler(job)
+            except Exception:
+                beat.stop()
+                error = traceback.format_exc()
+                logger.error(error)
+                fail(conn, job, worker, error)
+                continue
+            beat.stop()
+            complete(conn, job, worker)
+            done += 1
+    finally:
+        conn.close()
+    return done
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    conn = connect(args.queue)
+    if args.action == 'status':
+        for state, count in sorted(counts(conn).items()):
+            print('{}\t{}'.format(state, count))
+    if args.action == 'failed':
+        for row in conn.execute(
+                'SELECT year, month, lang, stage, error FROM jobs '
+                'WHERE state = ?', (FAILED,)):
+            print('{}/{} {} {}\n{}'.format(*row))
+    if args.action == 'retry':
+        conn.execute(
+            'UPDATE jobs SET state = ?, attempts = 0 WHERE state = ?',
+            (PENDING, FAILED),
+        )
+    conn.close()
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "action",
+        choices=['status', 'failed', 'retry'],
+        help="The action to perform.",
+    )
+
+    parser.add_argument(
+        '--queue',
+        action='store',
+        dest='queue',
+        default=DEFAULT_QUEUE,
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
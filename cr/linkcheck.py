@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+
+"""
+Check the links in links.text and data.yaml and migrate redirected URLs
+
+Every URL is fetched concurrently through the shared fetch pool. Results,
+including redirect chains, are cached with a TTL so repeated runs only
+recheck stale entries. With --rewrite, URLs that redirect to
+churchofjesuschrist.org are replaced in place.
+
+python linkcheck.py [--rewrite]
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import json
+import os
+import re
+import time
+
+from urllib.parse import urlsplit
+
+if __package__:
+    from . import fetch
+    from .catalog import DEFAULT_CATALOG, read_catalog
+    from .logger import setup_logger
+else:
+    import fetch
+    from catalog import DEFAULT_CATALOG, read_catalog
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+DEFAULT_LINKS = '../links.text'
+DEFAULT_CACHE = '.linkcheck.json'
+DEFAULT_TTL = 7 * 24 * 60 * 60
+TARGET_HOST = 'churchofjesuschrist.org'
+
+
+def read_links(path=DEFAULT_LINKS):
+    with open(path, encoding='utf-8') as fin:
+        return [line.strip() for line in fin if line.strip()]
+
+
+def collect_urls(links=DEFAULT_LINKS, catalog=DEFAULT_CATALOG):
+    urls = read_links(links)
+    urls.extend(entry['url'] for entry in read_catalog(catalog)
+                if entry.get('url'))
+    return sorted(set(urls))
+
+
+def load_cache(path=DEFAULT_CACHE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as fin:
+        return json.load(fin)
+
+
+def save_cache(cache, path=DEFAULT_CACHE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fout:
+        json.dump(cache, fout, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def check_links(urls, cache, ttl=DEFAULT_TTL, workers=fetch.DEFAULT_WORKERS,
+                rate=fetch.DEFAULT_RATE):
+    """
+    Update cache with a result for every url older than ttl.
+    """
+    now = time.time()
+    stale = [
+        url for url in urls
+        if url not in cache or now - cache[url]['checked'] > ttl
+    ]
+    logger.info('{} of {} links to check'.format(len(stale), len(urls)))
+
+    for url, response in fetch.fetch_all(stale, workers, rate, stream=True):
+        if isinstance(response, Exception):
+            result = {
+                'checked': now,
+                'status': None,
+                'chain': [],
+                'final': None,
+                'error': str(response),
+            }
+        else:
+            response.close()
+            result = {
+                'checked': now,
+                'status': response.status_code,
+                'chain': [r.url for r in response.history],
+                'final': response.url,
+                'error': None,
+            }
+        logger.info('{} {}'.format(result['status'], url))
+        cache[url] = result
+
+    return cache
+
+
+def is_dead(result):
+    return result['status'] is None or result['status'] >= 400
+
+
+def migrations(cache, urls):
+    """
+    Map each url that redirects to a live churchofjesuschrist.org page to
+    its final URL.
+    """
+    moves = {}
+    for url in urls:
+        result = cache.get(url)
+        if not result or is_dead(result) or not result['chain']:
+            continue
+        host = urlsplit(result['final']).netloc
+        if host == TARGET_HOST or host.endswith('.' + TARGET_HOST):
+            moves[url] = result['final']
+    return moves
+
+
+def rewrite(path, moves):
+    with open(path, encoding='utf-8') as fin:
+        content = fin.read()
+
+    updated = content
+    for old, new in moves.items():
+        # Only whole URLs, so a longer URL sharing this prefix is left alone
+        pattern = re.compile(re.escape(old) + r'(?=\s|$)', re.MULTILINE)
+        updated = pattern.sub(lambda match: new, updated)
+
+    if updated != content:
+        with open(path, 'w', encoding='utf-8') as fout:
+            fout.write(updated)
+        logger.info('rewrote {}'.format(path))
+
+
+def report(cache, urls):
+    for url in urls:
+        result = cache[url]
+        if is_dead(result):
+            print('DEAD {} {}'.format(result['status'] or result['error'], url))
+        elif result['chain']:
+            print('MOVED {} -> {}'.format(url, result['final']))
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    urls = collect_urls(args.links, args.catalog)
+    cache = load_cache(args.cache)
+    try:
+        check_links(urls, cache, args.ttl, args.workers, args.rate)
+    finally:
+        save_cache(cache, args.cache)
+
+    report(cache, urls)
+
+    if args.rewrite:
+        moves = migrations(cache, urls)
+        for path in (args.links, args.catalog):
+            rewrite(path, moves)
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--links',
+        action='store',
+        dest='links',
+        default=DEFAULT_LINKS,
+    )
+
+    parser.add_argument(
+        '--catalog',
+        action='store',
+        dest='catalog',
+        default=DEFAULT_CATALOG,
+    )
+
+    parser.add_argument(
+        '--cache',
+        action='store',
+        dest='cache',
+        default=DEFAULT_CACHE,
+    )
+
+    parser.add_argument(
+        '--ttl',
+        action='store',
+        dest='ttl',
+        default=DEFAULT_TTL,
+        type=int,
+        help="Seconds before a cached result is checked again.",
+    )
+
+    parser.add_argument(
+        '--workers',
+        action='store',
+        dest='workers',
+        default=fetch.DEFAULT_WORKERS,
+        type=int,
+    )
+
+    parser.add_argument(
+        '--rate',
+        action='store',
+        dest='rate',
+        default=fetch.DEFAULT_RATE,
+        type=float,
+        help="Maximum requests per second to one host.",
+    )
+
+    parser.add_argument(
+        '--rewrite',
+        action='store_true',
+        help="Replace redirected URLs with their churchofjesuschrist.org targets.",  # noqa
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
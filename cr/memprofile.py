@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+"""
+Memory profiling and a memory budget for build stages
+
+With profiling on, every stage and every talk within it is measured: the
+peak of Python allocations (tracemalloc), the resident set size after it
+ran and the allocation sites that grew the most. The report lists the
+heaviest talks and the top sites per stage.
+
+A MemoryBudget caps the resident memory of the workers on one host (the
+process group started by `core.py worker`). While it's exceeded, workers
+stop claiming jobs until the jobs already running on the host finish,
+instead of the box running out of memory.
+
+python core.py convert YYYY MM --memprofile
+python core.py worker --workers 4 --memory-budget 2048
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import os
+import resource
+import time
+import tracemalloc
+
+from collections import namedtuple
+from contextlib import contextmanager
+
+if __package__:
+    from .logger import setup_logger
+else:
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+TOP_SITES = 10
+TOP_TALKS = 10
+TRACE_FRAMES = 1
+MB = 1024 * 1024
+
+Measurement = namedtuple('Measurement', 'stage name seconds peak rss sites')
+
+
+def page_size():
+    return os.sysconf('SC_PAGE_SIZE')
+
+
+def rss(pid='self'):
+    """
+    Resident set size of a process in bytes, 0 if it can't be read.
+    """
+    try:
+        with open('/proc/{}/statm'.format(pid)) as fin:
+            return int(fin.read().split()[1]) * page_size()
+    except (OSError, ValueError, IndexError):
+        if pid != 'self':
+            return 0
+        # ru_maxrss is the peak, in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def group_rss(pgid=None):
+    """
+    Resident memory of every process in a process group.
+    """
+    pgid = pgid if pgid is not None else os.getpgid(0)
+    total = 0
+    try:
+        pids = [name for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return rss()
+    for pid in pids:
+        try:
+            with open('/proc/{}/stat'.format(pid)) as fin:
+                # The command may contain spaces, so split after it
+                fields = fin.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[2]) == pgid:
+            total += rss(pid)
+    return total
+
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryBudget:
+    """
+    Hold back new jobs while the workers use more than limit bytes.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+
+    def used(self):
+        return group_rss()
+
+    def available(self):
+        return self.used() <= self.limit
+
+
+class Profiler:
+    """
+    Measure stages and talks; a disabled profiler does nothing.
+    """
+
+    def __init__(self, enabled=True, top=TOP_SITES):
+        self.enabled = enabled
+        self.top = top
+        self.stage_name = None
+        self.measurements = []
+        # Peaks of the measurements in progress; an inner one resets the
+        # tracemalloc peak, so it hands its peak on to the outer one
+        self.peaks = []
+
+    def start(self):
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+    def filter(self, snapshot):
+        # Leave out the profiler's own bookkeeping
+        return snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+
+    @contextmanager
+    def stage(self, name):
+        previous = self.stage_name
+        self.stage_name = name
+        try:
+            with self.measure(name, name):
+                yield
+        finally:
+            self.stage_name = previous
+
+    @contextmanager
+    def talk(self, name):
+        with self.measure(self.stage_name, name):
+            yield
+
+    @contextmanager
+    def measure(self, stage, name):
+        if not self.enabled:
+            yield
+            return
+
+        self.start()
+        before = tracemalloc.take_snapshot()
+        if self.peaks:
+            self.peaks[-1] = max(self.peaks[-1],
+                                 tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self.peaks.append(0)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            seconds = time.monotonic() - start
+            peak = max(self.peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if self.peaks:
+                self.peaks[-1] = max(self.peaks[-1], peak)
+            after = tracemalloc.take_snapshot()
+            sites = self.filter(after).compare_to(
+                self.filter(before),
+                'lineno',
+            )[:self.top]
+            self.measurements.append(Measurement(
+                stage,
+                name,
+                seconds,
+                peak,
+                rss(),
+                sites,
+            ))
+
+    def report(self):
+        if not self.enabled:
+            return
+
+        for m in self.measurements:
+            if m.stage != m.name:
+                continue
+            logger.info('stage {}: {:.1f}s, peak {:.1f} MB traced, '
+                        'rss {:.1f} MB'.format(
+                            m.stage, m.seconds, m.peak / MB, m.rss / MB))
+            for site in m.sites:
+                logger.info('    {}'.format(site))
+
+        talks = [m for m in self.measurements if m.stage != m.name]
+        talks.sort(key=lambda m: -m.peak)
+        for m in talks[:TOP_TALKS]:
+            logger.info('{} {}: {:.2f}s, peak {:.1f} MB traced, '
+                        'rss {:.1f} MB'.format(
+                            m.stage, m.name, m.seconds, m.peak / MB,
+                            m.rss / MB))
+        logger.info('peak rss {:.1f} MB'.format(peak_rss() / MB))
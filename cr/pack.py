@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+"""
+Pack downloaded and converted talks into a single memory-mapped archive
+
+A pack is two files:
+
+    corpus.pack        append-only talk contents after an 8 byte header
+    corpus.pack.idx    offset/length index keyed by year/month/lang/kind/slug
+
+Appending a talk that is already packed with identical contents is a no-op.
+A changed talk is appended again and the index points at the newest copy.
+
+python pack.py YYYY MM
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import mmap
+import os
+import struct
+
+if __package__:
+    from .logger import setup_logger
+else:
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+DEFAULT_PACK = 'corpus.pack'
+INDEX_SUFFIX = '.idx'
+
+PACK_MAGIC = b'CRPK\x01\x00\x00\x00'
+INDEX_MAGIC = b'CRIX\x01\x00\x00\x00'
+INDEX_COUNT = struct.Struct('<I')
+INDEX_ENTRY = struct.Struct('<HQI')
+
+KINDS = {
+    'html': ('{year}/{month}/{lang}/html/', '.html'),
+    'md': ('{year}/{month}/{lang}/md/', '.md'),
+}
+
+KEY_TEMPLATE = '{year}/{month}/{lang}/{kind}/{slug}'
+
+
+def make_key(year, month, lang, kind, slug):
+    return KEY_TEMPLATE.format(
+        year=year,
+        month=month,
+        lang=lang,
+        kind=kind,
+        slug=slug,
+    )
+
+
+def read_index(index_path):
+    """
+    Load an index file into a dict of key -> (offset, length).
+    """
+    index = {}
+    if not os.path.exists(index_path):
+        return index
+
+    with open(index_path, 'rb') as fin:
+        data = fin.read()
+
+    if data[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+        raise ValueError('Not a pack index: {}'.format(index_path))
+
+    position = len(INDEX_MAGIC)
+    (count,) = INDEX_COUNT.unpack_from(data, position)
+    position += INDEX_COUNT.size
+    for _ in range(count):
+        key_length, offset, length = INDEX_ENTRY.unpack_from(data, position)
+        position += INDEX_ENTRY.size
+        key = data[position:position + key_length].decode('utf-8')
+        position += key_length
+        index[key] = (offset, length)
+
+    return index
+
+
+def write_index(index_path, index):
+    """
+    Atomically replace the index file with the given entries.
+    """
+    parts = [INDEX_MAGIC, INDEX_COUNT.pack(len(index))]
+    for key in sorted(index):
+        offset, length = index[key]
+        encoded = key.encode('utf-8')
+        parts.append(INDEX_ENTRY.pack(len(encoded), offset, length))
+        parts.append(encoded)
+
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'wb') as fout:
+        fout.write(b''.join(parts))
+    os.replace(tmp_path, index_path)
+
+
+class PackReader:
+    """
+    Zero-copy random access to the talks in a pack.
+    """
+
+    def __init__(self, path=DEFAULT_PACK):
+        self.path = path
+        self.index = read_index(path + INDEX_SUFFIX)
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(PACK_MAGIC)] != PACK_MAGIC:
+            self.close()
+            raise ValueError('Not a pack: {}'.format(path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def get(self, year, month, lang, kind, slug):
+        """
+        Return a memoryview over the stored bytes without copying them.
+        """
+        offset, length = self.index[make_key(year, month, lang, kind, slug)]
+        return memoryview(self._map)[offset:offset + length]
+
+    def text(self, year, month, lang, kind, slug):
+        return str(self.get(year, month, lang, kind, slug), 'utf-8')
+
+    def slugs(self, year, month, lang, kind):
+        prefix = make_key(year, month, lang, kind, '')
+        return sorted(
+            key[len(prefix):] for key in self.index if key.startswith(prefix)
+        )
+
+    def extract(self, year, month, lang, kind, slug, filepath):
+        """
+        Write a stored talk to disk unless an identical file is already there.
+        """
+        data = self.get(year, month, lang, kind, slug)
+        if os.path.exists(filepath) and os.path.getsize(filepath) == len(data):
+            with open(filepath, 'rb') as fin:
+                if fin.read() == data:
+                    return filepath
+
+        ensure_path_exists(filepath)
+        with open(filepath, 'wb') as fout:
+            fout.write(data)
+        return filepath
+
+
+def pack_conference(year, month, lang, path=DEFAULT_PACK):
+    """
+    Append the html/ and md/ talks of a conference to the pack.
+    """
+    index_path = path + INDEX_SUFFIX
+    index = read_index(index_path)
+
+    if not os.path.exists(path):
+        with open(path, 'wb') as fout:
+            fout.write(PACK_MAGIC)
+
+    added = 0
+    with open(path, 'r+b') as fpack:
+        fpack.seek(0, os.SEEK_END)
+        offset = fpack.tell()
+        existing = None
+        if offset > len(PACK_MAGIC):
+            existing = mmap.mmap(fpack.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            for kind, (folder, extension) in KINDS.items():
+                folder = folder.format(year=year, month=month, lang=lang)
+                if not os.path.isdir(folder):
+                    continue
+
+                for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+                    if not entry.name.endswith(extension):
+                        continue
+                    slug = entry.name[:-len(extension)]
+                    key = make_key(year, month, lang, kind, slug)
+
+                    with open(entry.path, 'rb') as fin:
+                        data = fin.read()
+
+                    if key in index and existing is not None:
+                        old_offset, old_length = index[key]
+                        if (old_length == len(data) and
+                                existing[old_offset:old_offset + old_length] == data):
+                            continue
+
+                    fpack.write(data)
+                    index[key] = (offset, len(data))
+                    offset += len(data)
+                    added += 1
+                    logger.info(key)
+        finally:
+            if existing is not None:
+                existing.close()
+
+    write_index(index_path, index)
+    return added
+
+
+def ensure_path_exists(path):
+    dirs = os.path.dirname(path)
+    if dirs and not os.path.exists(dirs):
+        os.makedirs(dirs)
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    for lang in args.languages:
+        pack_conference(args.year, args.month, lang, args.pack)
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    # Required positional argument
+    parser.add_argument("year", help="The year of the conference (e.g. 2017).")
+    parser.add_argument(
+        "month",
+        help="The month of the conference (i.e. 04 or 10).",
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--languages',
+        action='store',
+        dest='languages',
+        default=['eng', 'hun'],
+        nargs='+',
+    )
+
+    parser.add_argument(
+        '--pack',
+        action='store',
+        dest='pack',
+        default=DEFAULT_PACK,
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
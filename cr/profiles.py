@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+"""
+Extraction profiles for the layouts churchofjesuschrist.org has used
+
+The site is redesigned every few years, and its class names carry build
+hashes (e.g. `panelContent-2dg-k`) that change even more often. A page's
+layout fingerprint is the set of known landmark classes and ids found in
+its raw HTML, which is cheap to compute without parsing. Each fingerprint
+maps to a profile: the exact tag and class (or id) of the table of
+contents, the talk body and the notes for that era, so extraction is a
+direct lookup. Profiles for new fingerprints are learned on first sight
+and cached:
+
+    .profiles.json
+
+python profiles.py FILE [FILE ...]
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+
+from collections import namedtuple
+
+if __package__:
+    from .logger import setup_logger
+else:
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+DEFAULT_PROFILES = '.profiles.json'
+
+# How each role has been marked up, newest layout first. A tag of None
+# matches any tag; index picks one of several matches, None keeps them all.
+Candidate = namedtuple('Candidate', 'layout tag attr pattern index')
+ROLES = {
+    'toc': [
+        Candidate('subitems', 'ul', 'class', re.compile(r'^subItems-'), 0),
+        Candidate('lumen', 'div', 'class', re.compile(r'^section$'), None),
+    ],
+    'article': [
+        Candidate('template', 'article', 'class',
+                  re.compile(r'^global-template-mobile_article$'), 0),
+        Candidate('lumen', 'section', 'class',
+                  re.compile(r'^article-page$'), 0),
+    ],
+    'notes': [
+        Candidate('panel', 'div', 'class', re.compile(r'^panelContent-'), 1),
+        Candidate('lumen', None, 'id', re.compile(r'^toggledReferences$'), 0),
+    ],
+}
+TAG_REGEX = re.compile(r'<([a-zA-Z][\w-]*)\s([^>]*)>')
+ATTR_REGEX = re.compile(r'\b(class|id)\s*=\s*["\']([^"\']*)["\']')
+
+
+def landmarks(page):
+    """
+    The (tag, attr, value) landmarks of a page, from its raw HTML.
+    """
+    if isinstance(page, bytes):
+        page = page.decode('utf-8', 'replace')
+    found = set()
+    for match in TAG_REGEX.finditer(page):
+        tag = match.group(1).lower()
+        for attr, value in ATTR_REGEX.findall(match.group(2)):
+            for token in value.split() if attr == 'class' else [value]:
+                found.add((tag, attr, token))
+    return {
+        (tag, attr, value) for tag, attr, value in found
+        if any(
+            matches(c, tag, attr, value)
+            for cs in ROLES.values() for c in cs
+        )
+    }
+
+
+def matches(candidate, tag, attr, value):
+    return (
+        candidate.tag in (None, tag)
+        and candidate.attr == attr
+        and candidate.pattern.match(value)
+    )
+
+
+def fingerprint(marks):
+    data = '\n'.join(' '.join(mark) for mark in sorted(marks))
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+
+
+def learn(marks):
+    """
+    Build a profile from a page's landmarks: for each role, the first
+    candidate that matches.
+    """
+    profile = {}
+    for role, candidates in ROLES.items():
+        for candidate in candidates:
+            values = sorted(
+                value for tag, attr, value in marks
+                if matches(candidate, tag, attr, value)
+            )
+            if values:
+                profile[role] = {
+                    'layout': candidate.layout,
+                    'tag': candidate.tag,
+                    'attr': candidate.attr,
+                    'value': values[0],
+                    'index': candidate.index,
+                }
+                break
+    return profile
+
+
+def find(soup, spec):
+    """
+    The element(s) a profile role points to, or None.
+    """
+    if not spec:
+        return None
+    found = soup.find_all(spec['tag'], attrs={spec['attr']: spec['value']})
+    if spec['index'] is None:
+        return found
+    if len(found) > spec['index']:
+        return found[spec['index']]
+    return None
+
+
+class Registry:
+    """
+    Fingerprint -> profile, learned as new layouts are seen.
+    """
+
+    def __init__(self, path=DEFAULT_PROFILES):
+        self.path = path
+        self.lock = threading.Lock()
+        self.profiles = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as fin:
+                self.profiles = json.load(fin)
+
+    def match(self, page):
+        marks = landmarks(page)
+        key = fingerprint(marks)
+        with self.lock:
+            profile = self.profiles.get(key)
+            if profile is None:
+                profile = learn(marks)
+                self.profiles[key] = profile
+                self.save()
+                logger.info('learned extraction profile {}: {}'.format(
+                    key,
+                    ', '.join(
+                        '{}={}'.format(role, spec['value'])
+                        for role, spec in sorted(profile.items())
+                    ) or 'no known landmarks',
+                ))
+        return profile
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as fout:
+            json.dump(self.profiles, fout, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+_registry = None
+
+
+def registry():
+    """
+    The registry shared by the extractor and converter.
+    """
+    global _registry
+    if _registry is None:
+        _registry = Registry()
+    return _registry
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    profiles = Registry(args.profiles)
+    for filename in args.files:
+        with open(filename, 'rb') as fin:
+            profile = profiles.match(fin.read())
+        print('{}\t{}'.format(filename, ' '.join(
+            '{}:{}'.format(role, spec['layout'])
+            for role, spec in sorted(profile.items())
+        )))
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("files", nargs='+', help="Pages to fingerprint.")
+
+    parser.add_argument(
+        '--profiles',
+        action='store',
+        dest='profiles',
+        default=DEFAULT_PROFILES,
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
@@ -11,7 +11,18 @@ __license__ = "MIT"
 import argparse
 import os
 
-from logger import setup_logger
+if __package__:
+    from .logger import setup_logger
+else:
+    from logger import setup_logger
+
+try:
+    if __package__:
+        from . import dedupe
+    else:
+        import dedupe
+except ImportError:
+    dedupe = None
 
 logger = setup_logger(logfile=None)
 
@@ -44,16 +55,35 @@ def make_title(year, month):
     title = TITLE.format(month=month, year=year)
     contents = TITLE_TEMPLATE.format(title=title)
 
+    # Leave the file alone when it's current, so its mtime stays stable
+    if os.path.exists(filepath):
+        with open(filepath) as fin:
+            if fin.read() == contents:
+                return
+
     with open(filepath, 'w') as fout:
         fout.write(contents)
 
 
-def gather_talks(year, month, languages):
+def gather_talks(year, month, languages, pack=None, skip_duplicates=False):
     """
     """
     talks = []
     for lang in languages:
+        if skip_duplicates and dedupe is not None:
+            lang_talks = gather_talks(year, month, [lang], pack)
+            talks.extend(dedupe.drop_near_duplicates(lang_talks))
+            continue
+
         folder_md = FOLDER_MD.format(year=year, month=month, lang=lang)
+        if pack is not None:
+            # pandoc reads files, so packed talks are extracted in place
+            for slug in pack.slugs(year, month, lang, 'md'):
+                filepath = folder_md + slug + '.md'
+                pack.extract(year, month, lang, 'md', slug, filepath)
+                talks.append(filepath)
+            continue
+
         for filepath in os.scandir(folder_md):
             talks.append(filepath.path)
 
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+
+"""
+Render conference talks to several output formats from the cached IR
+
+Talks are parsed once into ir.Talk objects and every renderer works from
+those, running concurrently:
+
+    html    single-page HTML
+    text    plain text
+    json    the IR itself, for the API
+    pdf     the HTML rendered by a local weasyprint or wkhtmltopdf
+
+    {year}/{month}/out/cr_{year}{month}.{ext}
+
+python render.py YYYY MM --formats html text json
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import html
+import json
+import os
+import re
+import shutil
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+
+if __package__:
+    from . import ir
+    from .logger import setup_logger
+else:
+    import ir
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+FILEPATH_OUT = '{year}/{month}/out/cr_{year}{month}.{ext}'
+MONTHS = {
+    '04': 'April',
+    '10': 'October',
+}
+TITLE = '{month} {year} Conference Report'
+PDF_RENDERERS = ['weasyprint', 'wkhtmltopdf']
+
+LINK_REGEX = re.compile(r'(?<!!)\[([^\]^][^\]]*)\]\(([^)\s]+)[^)]*\)')
+REF_REGEX = re.compile(r'\[\^(\w[\w-]*)\](?!:)')
+BOLD_REGEX = re.compile(r'\*\*(?!\s)(.+?)(?<!\s)\*\*')
+ITALIC_REGEX = re.compile(
+    r'(?<![\w*])[*_](?![\s*_])(.+?)(?<![\s*_])[*_](?![\w*])'
+)
+ESCAPE_REGEX = re.compile(r'\\([\\`*_{}\[\]()#+\-.!>])')
+
+HTML_DOCUMENT = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8" />
+<title>{title}</title>
+</head>
+<body>
+<h1>{title}</h1>
+{body}
+</body>
+</html>
+"""
+
+TEXT_RULE = '\n\n' + '-' * 72 + '\n\n'
+
+
+def talk_id(talk):
+    return '{}-{}'.format(talk.lang, talk.slug)
+
+
+def ref_id(anchor, label, occurrence):
+    return '{}-ref-{}-{}'.format(anchor, label, occurrence)
+
+
+def inline_html(text, anchor, refs=None):
+    """
+    Render the inline Markdown of a block as (X)HTML.
+
+    refs counts the references to each note so far in the talk, so a note
+    referenced twice gets a distinct id for each reference.
+    """
+    refs = {} if refs is None else refs
+
+    def reference(match):
+        label = match.group(1)
+        refs[label] = refs.get(label, 0) + 1
+        return '<sup><a href="#{a}-note-{n}" id="{i}">{n}</a></sup>'.format(
+            a=anchor,
+            n=label,
+            i=ref_id(anchor, label, refs[label]),
+        )
+
+    text = html.escape(text, quote=True)
+    text = REF_REGEX.sub(reference, text)
+    text = LINK_REGEX.sub(r'<a href="\2">\1</a>', text)
+    text = BOLD_REGEX.sub(r'<strong>\1</strong>', text)
+    text = ITALIC_REGEX.sub(r'<em>\1</em>', text)
+    return ESCAPE_REGEX.sub(r'\1', text)
+
+
+def inline_text(text):
+    text = REF_REGEX.sub(r'[\1]', text)
+    text = LINK_REGEX.sub(r'\1', text)
+    text = BOLD_REGEX.sub(r'\1', text)
+    text = ITALIC_REGEX.sub(r'\1', text)
+    return ESCAPE_REGEX.sub(r'\1', text)
+
+
+def back_references(anchor, label, count):
+    """
+    The note number linking back to its first reference, then links to
+    any later references numbered by occurrence.
+    """
+    if not count:
+        return '{}.'.format(label)
+    links = ['<a href="#{}">{}.</a>'.format(ref_id(anchor, label, 1), label)]
+    links.extend(
+        '<a href="#{}">{}</a>'.format(ref_id(anchor, label, k), k)
+        for k in range(2, count + 1)
+    )
+    return ' '.join(links)
+
+
+def talk_html(talk, heading_offset=1):
+    """
+    The body of one talk as well-formed XHTML, for pages and EPUB chapters.
+    """
+    anchor = talk_id(talk)
+    refs = {}
+    parts = []
+    for block in talk.blocks:
+        if block.kind == 'heading':
+            level = min(block.level + heading_offset, 6)
+            parts.append('<h{l}>{t}</h{l}>'.format(
+                l=level,
+                t=inline_html(block.text, anchor, refs),
+            ))
+        elif block.kind == 'image':
+            parts.append('<p><img src="{src}" alt="{alt}" /></p>'.format(
+                src=html.escape(block.refs[0], quote=True),
+                alt=html.escape(block.text, quote=True),
+            ))
+        elif block.kind == 'quote':
+            lines = [
+                inline_html(line, anchor, refs)
+                for line in block.text.split('\n')
+            ]
+            parts.append('<blockquote><p>{}</p></blockquote>'.format(
+                '<br />'.join(lines),
+            ))
+        elif block.kind == 'list':
+            items = ''.join(
+                '<li>{}</li>'.format(inline_html(item, anchor, refs))
+                for item in block.text.split('\n')
+            )
+            parts.append('<ul>{}</ul>'.format(items))
+        else:
+            parts.append('<p>{}</p>'.format(
+                inline_html(block.text, anchor, refs)))
+
+    if talk.notes:
+        notes = ''.join(
+            '<li id="{a}-note-{n}">{b} {t}</li>'.format(
+                a=anchor,
+                n=note.label,
+                b=back_references(anchor, note.label, refs.get(note.label, 0)),
+                t=inline_html(note.text, anchor, refs),
+            )
+            for note in talk.notes
+        )
+        parts.append('<ol class="notes">{}</ol>'.format(notes))
+
+    return '<section id="{}">\n{}\n</section>'.format(
+        anchor,
+        '\n'.join(parts),
+    )
+
+
+def render_html(talks, title):
+    body = '\n'.join(talk_html(talk) for talk in talks)
+    return HTML_DOCUMENT.format(title=html.escape(title), body=body)
+
+
+def render_text(talks, title):
+    chapters = []
+    for talk in talks:
+        lines = []
+        for block in talk.blocks:
+            text = inline_text(block.text)
+            if block.kind == 'heading':
+                text = text.upper()
+            elif block.kind == 'image':
+                text = '[Image: {}]'.format(text)
+            elif block.kind == 'quote':
+                text = '\n'.join('    ' + line for line in text.split('\n'))
+            elif block.kind == 'list':
+                text = '\n'.join('  - ' + line for line in text.split('\n'))
+            lines.append(text)
+        lines.extend(
+            '[{}] {}'.format(note.label, inline_text(note.text))
+            for note in talk.notes
+        )
+        chapters.append('\n\n'.join(lines))
+    return title + TEXT_RULE + TEXT_RULE.join(chapters) + '\n'
+
+
+def render_json(talks, title):
+    return json.dumps(
+        {'title': title, 'talks': [asdict(talk) for talk in talks]},
+        ensure_ascii=False,
+        indent=2,
+    )
+
+
+def render_pdf(talks, title, filename):
+    renderer = next(filter(shutil.which, PDF_RENDERERS), None)
+    if renderer is None:
+        raise RuntimeError('No PDF renderer found ({})'.format(
+            ', '.join(PDF_RENDERERS),
+        ))
+    html_filename = filename[:-len('.pdf')] + '.pdf.html'
+    with open(html_filename, 'w', encoding='utf-8') as fout:
+        fout.write(render_html(talks, title))
+    try:
+        subprocess.run([renderer, html_filename, filename], check=True)
+    finally:
+        os.remove(html_filename)
+
+
+RENDERERS = {
+    'html': render_html,
+    'text': render_text,
+    'json': render_json,
+}
+FORMATS = sorted(list(RENDERERS) + ['pdf'])
+EXTENSIONS = {
+    'html': 'html',
+    'text': 'txt',
+    'json': 'json',
+    'pdf': 'pdf',
+}
+
+
+def write(fmt, talks, title, filename):
+    ensure_path_exists(filename)
+    if fmt == 'pdf':
+        render_pdf(talks, title, filename)
+    else:
+        with open(filename, 'w', encoding='utf-8') as fout:
+            fout.write(RENDERERS[fmt](talks, title))
+    logger.info(filename)
+    return filename
+
+
+def render_conference(year, month, languages, formats=('html',)):
+    """
+    Render a conference to each format concurrently. Returns fmt -> path.
+    """
+    talks = ir.load_conference(year, month, languages)
+    title = TITLE.format(month=MONTHS.get(month, month), year=year)
+
+    with ThreadPoolExecutor(max_workers=len(formats)) as executor:
+        futures = {
+            fmt: executor.submit(
+                write,
+                fmt,
+                talks,
+                title,
+                FILEPATH_OUT.format(year=year, month=month,
+                                    ext=EXTENSIONS[fmt]),
+            )
+            for fmt in formats
+        }
+        return {fmt: future.result() for fmt, future in futures.items()}
+
+
+def ensure_path_exists(path):
+    dirs = os.path.dirname(path)
+    if not os.path.exists(dirs):
+        os.makedirs(dirs)
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    render_conference(args.year, args.month, args.languages, args.formats)
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    # Required positional argument
+    parser.add_argument("year", help="The year of the conference (e.g. 2017).")
+    parser.add_argument(
+        "month",
+        help="The month of the conference (i.e. 04 or 10).",
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--languages',
+        action='store',
+        dest='languages',
+        default=['eng', 'hun'],
+        nargs='+',
+    )
+
+    parser.add_argument(
+        '--formats',
+        action='store',
+        dest='formats',
+        default=['html'],
+        nargs='+',
+        choices=FORMATS,
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+
+"""
+Serve downloaded talks and built EPUBs over a local read-only HTTP service
+
+Routes:
+
+    /talks/{year}/{month}/{lang}/{slug}.md      Markdown from the md/ folder
+    /talks/{year}/{month}/{lang}/{slug}.html    Markdown rendered as HTML
+    /epub/cr_{year}{month}.epub                 EPUB built by epub.py, or
+                                                else by publisher
+
+python server.py --port 8000
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import asyncio
+import collections
+import email.utils
+import hashlib
+import os
+import re
+
+import markdown
+
+if __package__:
+    from . import epub
+    from .logger import setup_logger
+else:
+    import epub
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+FOLDER_MD = '{year}/{month}/{lang}/md/'
+FILEPATH_MD = FOLDER_MD + '{slug}.md'
+# Where pandoc writes, for books not built by epub.py
+FILEPATH_EPUB = '{name}'
+
+TALK_ROUTE = re.compile(
+    r'^/talks/(?P<year>\d{4})/(?P<month>\d{2})/(?P<lang>[a-z]+)/'
+    r'(?P<slug>[\w-]+)\.(?P<ext>md|html)$'
+)
+EPUB_ROUTE = re.compile(
+    r'^/epub/(?P<name>cr_(?P<year>\d{4})(?P<month>\d{2})\.epub)$'
+)
+RANGE_REGEX = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+CONTENT_TYPES = {
+    'md': 'text/markdown; charset=utf-8',
+    'html': 'text/html; charset=utf-8',
+    'epub': 'application/epub+zip',
+}
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+</head>
+<body>
+{body}
+</body>
+</html>"""
+
+STATUS_TEXT = {
+    200: 'OK',
+    206: 'Partial Content',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    416: 'Range Not Satisfiable',
+    500: 'Internal Server Error',
+}
+
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+
+class LRUCache:
+    """
+    A least recently used cache bounded by the total size of its values.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        body = value[0]
+        if len(body) > self.max_bytes:
+            return
+        if key in self._entries:
+            self.size -= len(self._entries.pop(key)[0])
+        self._entries[key] = value
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted[0])
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def render_html(text, title):
+    body = markdown.markdown(
+        text,
+        extensions=['markdown.extensions.footnotes'],
+    )
+    return HTML_TEMPLATE.format(title=title, body=body)
+
+
+def resolve(path):
+    """
+    Map a request path to (filepath, ext) or None when it isn't served.
+    """
+    match = TALK_ROUTE.match(path)
+    if match:
+        filepath = FILEPATH_MD.format(
+            year=match['year'],
+            month=match['month'],
+            lang=match['lang'],
+            slug=match['slug'],
+        )
+        return filepath, match['ext']
+
+    match = EPUB_ROUTE.match(path)
+    if match:
+        filepath = epub.FILEPATH_EPUB.format(
+            year=match['year'],
+            month=match['month'],
+        )
+        if not os.path.exists(filepath):
+            filepath = FILEPATH_EPUB.format(name=match['name'])
+        return filepath, 'epub'
+
+    return None
+
+
+def load(filepath, ext):
+    """
+    Read a file from disk and render it for the given extension.
+    """
+    with open(filepath, 'rb') as fin:
+        data = fin.read()
+
+    if ext == 'html':
+        slug = os.path.basename(filepath).replace('.md', '')
+        data = render_html(data.decode('utf-8'), slug).encode('utf-8')
+
+    etag = '"{}"'.format(hashlib.sha1(data).hexdigest())
+    return data, etag
+
+
+def parse_range(value, length):
+    """
+    Return (start, end) for a single byte range, inclusive, or None when the
+    range can't be satisfied.
+    """
+    match = RANGE_REGEX.match(value.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    start, end = match.groups()
+    if start == '':
+        start = max(length - int(end), 0)
+        end = length - 1
+    else:
+        start = int(start)
+        end = min(int(end), length - 1) if end else length - 1
+
+    if start > end or start >= length:
+        return None
+    return start, end
+
+
+class TalkServer:
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE):
+        self.cache = LRUCache(cache_size)
+
+    async def respond(self, method, path, headers):
+        if method not in ('GET', 'HEAD'):
+            return 405, {'Allow': 'GET, HEAD'}, b''
+
+        resolved = resolve(path.split('?')[0])
+        if resolved is None:
+            return 404, {}, b''
+
+        filepath, ext = resolved
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return 404, {}, b''
+
+        key = (filepath, ext, stat.st_mtime_ns, stat.st_size)
+        cached = self.cache.get(key)
+        if cached is None:
+            loop = asyncio.get_running_loop()
+            cached = await loop.run_in_executor(None, load, filepath, ext)
+            self.cache.put(key, cached)
+        body, etag = cached
+
+        response_headers = {
+            'Content-Type': CONTENT_TYPES[ext],
+            'ETag': etag,
+            'Last-Modified': email.utils.formatdate(stat.st_mtime, usegmt=True),
+            'Accept-Ranges': 'bytes',
+        }
+
+        if_none_match = headers.get('if-none-match')
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            if '*' in tags or etag in tags:
+                return 304, response_headers, b''
+
+        range_header = headers.get('range')
+        if range_header and headers.get('if-range', etag) == etag:
+            byte_range = parse_range(range_header, len(body))
+            if byte_range is None:
+                response_headers['Content-Range'] = 'bytes */{}'.format(
+                    len(body),
+                )
+                return 416, response_headers, b''
+            start, end = byte_range
+            response_headers['Content-Range'] = 'bytes {}-{}/{}'.format(
+                start,
+                end,
+                len(body),
+            )
+            return 206, response_headers, body[start:end + 1]
+
+        return 200, response_headers, body
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            try:
+                method, target, _ = request_line.decode('latin-1').split()
+            except ValueError:
+                await self.write(writer, 'GET', 400, {}, b'')
+                return
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            try:
+                status, response_headers, body = await self.respond(
+                    method,
+                    target,
+                    headers,
+                )
+            except Exception:
+                logger.exception(target)
+                status, response_headers, body = 500, {}, b''
+
+            logger.info('{} {} {}'.format(method, target, status))
+            await self.write(writer, method, status, response_headers, body)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def write(self, writer, method, status, headers, body):
+        lines = ['HTTP/1.1 {} {}'.format(status, STATUS_TEXT[status])]
+        headers = dict(headers)
+        headers['Content-Length'] = str(len(body))
+        headers['Connection'] = 'close'
+        for name, value in headers.items():
+            lines.append('{}: {}'.format(name, value))
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if method != 'HEAD':
+            writer.write(body)
+        await writer.drain()
+
+
+async def serve(host, port, cache_size=DEFAULT_CACHE_SIZE):
+    talk_server = TalkServer(cache_size)
+    server = await asyncio.start_server(talk_server.handle, host, port)
+    logger.info('Serving on http://{}:{}/'.format(host, port))
+    async with server:
+        await server.serve_forever()
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    asyncio.run(serve(args.host, args.port, args.cache_size))
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--host',
+        action='store',
+        dest='host',
+        default='127.0.0.1',
+    )
+
+    parser.add_argument(
+        '--port',
+        action='store',
+        dest='port',
+        default=8000,
+        type=int,
+    )
+
+    parser.add_argument(
+        '--cache-size',
+        action='store',
+        dest='cache_size',
+        default=DEFAULT_CACHE_SIZE,
+        type=int,
+        help="Maximum size of the response cache in bytes.",
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
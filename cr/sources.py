@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+
+"""
+Source adapters for ingesting catalogued speeches from every website
+
+Each adapter knows how to recognise its catalog entries, resolve archive
+listing pages to talk pages, and find the talk body and notes in a page.
+One bulk job fetches every listing page once and every talk page once on
+the shared fetch pool, then converts them with converter:
+
+    sources/{source}/{lang}/html/{slug}.html
+    sources/{source}/{lang}/md/{slug}.md
+
+python sources.py [--catalog ../data.yaml]
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import abc
+import argparse
+import collections
+import os
+
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from bs4 import BeautifulSoup
+
+if __package__:
+    from . import converter
+    from . import fetch
+    from .catalog import (
+        DEFAULT_CATALOG, HOST_ALIASES, normalize_url, read_catalog)
+    from .logger import setup_logger
+else:
+    import converter
+    import fetch
+    from catalog import DEFAULT_CATALOG, HOST_ALIASES, normalize_url, read_catalog
+    from logger import setup_logger
+
+try:
+    if __package__:
+        from . import dedupe
+    else:
+        import dedupe
+except ImportError:
+    dedupe = None
+
+logger = setup_logger(logfile=None)
+
+
+FOLDER_SOURCE = 'sources/{source}/{lang}/'
+FILEPATH_HTML = FOLDER_SOURCE + 'html/{slug}.html'
+FILEPATH_MD = FOLDER_SOURCE + 'md/{slug}.md'
+
+
+class Source(abc.ABC):
+    """
+    Base adapter. Subclasses describe one website.
+    """
+
+    name = None
+    types = ()
+    hosts = ()
+    archive_marker = None
+
+    def matches(self, entry):
+        if entry.get('type') in self.types:
+            return True
+        return urlsplit(entry.get('url', '')).netloc in self.hosts
+
+    def talk_url(self, url, lang):
+        """
+        The canonical URL of a catalogued page in the requested language.
+        """
+        parts = urlsplit(url)
+        host = HOST_ALIASES.get(parts.netloc, parts.netloc)
+        query = parts.query
+        if 'lang=' in query:
+            query = urlencode(
+                [(k, lang if k == 'lang' else v) for k, v in parse_qsl(query)]
+            )
+        return urlunsplit(('https', host, parts.path, query, ''))
+
+    def is_archive(self, url):
+        return bool(self.archive_marker) and self.archive_marker in url
+
+    def find_talk_link(self, soup, entry, base_url):
+        """
+        Find the link to a catalogued talk on an archive listing page.
+        """
+        title = entry['title'].lower()
+        for link in soup.find_all('a', href=True):
+            if title in link.get_text(' ', strip=True).lower():
+                return urljoin(base_url, link['href'])
+        return None
+
+    def slug(self, url):
+        return urlsplit(url).path.rstrip('/').split('/')[-1]
+
+    @abc.abstractmethod
+    def find_sections(self, soup):
+        """
+        Return (body, notes) tags; notes may be None.
+        """
+
+
+class GeneralConference(Source):
+
+    name = 'general-conference'
+    types = ('General Conference',)
+
+    def find_sections(self, soup):
+        return converter.find_sections(soup)
+
+
+class ChurchBroadcast(Source):
+    """
+    CES and Worldwide devotionals share the General Conference article
+    layout, but not every broadcast has a footnote panel.
+    """
+
+    name = 'broadcasts'
+    types = ('CES Devotional', 'Worldwide Devotional')
+    archive_marker = '/broadcasts/archive/'
+
+    def find_sections(self, soup):
+        try:
+            return converter.find_sections(soup)
+        except ValueError:
+            article = soup.find('article')
+            return article, None
+
+
+class CesDevotionals(ChurchBroadcast):
+
+    name = 'ces-devotionals'
+    types = ('CES Devotional',)
+
+
+class WorldwideDevotionals(ChurchBroadcast):
+
+    name = 'worldwide-devotionals'
+    types = ('Worldwide Devotional',)
+
+
+class ByuSpeeches(Source):
+
+    name = 'byu'
+    types = ('BYU Devotional', 'BYU Speech')
+    hosts = ('speeches.byu.edu',)
+    archive_marker = '/speakers/'
+
+    def find_sections(self, soup):
+        body = soup.find('div', class_='single-speech__content')
+        notes = soup.find('div', class_='single-speech__notes')
+        return body or soup.find('article'), notes
+
+
+class ByuIdaho(Source):
+
+    name = 'byui'
+    types = ('BYU-Idaho Devotional', 'BYU Idaho Devotional')
+    hosts = ('web.byui.edu', 'www.byui.edu')
+    archive_marker = '/devotionalsandspeeches/default'
+
+    def find_sections(self, soup):
+        body = soup.find('div', id='speechContent')
+        return body or soup.find('article'), None
+
+
+SOURCES = [
+    GeneralConference(),
+    CesDevotionals(),
+    WorldwideDevotionals(),
+    ByuSpeeches(),
+    ByuIdaho(),
+]
+
+
+def source_for(entry):
+    for source in SOURCES:
+        if source.matches(entry):
+            return source
+    return None
+
+
+def plan(entries):
+    """
+    Group catalog entries by source and page so each page is fetched once.
+
+    Returns {page_url: (source, [entries])}.
+    """
+    pages = collections.OrderedDict()
+    for entry in entries:
+        if not entry.get('url'):
+            continue
+        source = source_for(entry)
+        if source is None:
+            logger.warning('no source for line {line}: {title}'.format(**entry))
+            continue
+        url = source.talk_url(entry['url'], entry.get('lang', 'eng'))
+        pages.setdefault(url, (source, []))[1].append(entry)
+    return pages
+
+
+def resolve_talks(pages, workers=fetch.DEFAULT_WORKERS):
+    """
+    Map talk URL -> (source, entry), fetching archive listings as needed.
+    """
+    talks = collections.OrderedDict()
+    archives = {}
+    for url, (source, entries) in pages.items():
+        if source.is_archive(url):
+            archives[url] = (source, entries)
+        else:
+            talks[url] = (source, entries[0])
+
+    for url, response in fetch.fetch_all(archives, workers):
+        source, entries = archives[url]
+        if isinstance(response, Exception) or response.status_code >= 400:
+            logger.error('{} {}'.format(url, getattr(response, 'status_code',
+                                                     response)))
+            continue
+        soup = BeautifulSoup(response.content, 'html.parser')
+        for entry in entries:
+            link = source.find_talk_link(soup, entry, response.url)
+            if link is None:
+                logger.warning('no link for "{title}" on {url}'.format(
+                    title=entry['title'],
+                    url=url,
+                ))
+                continue
+            talk_url = source.talk_url(link, entry.get('lang', 'eng'))
+            talks.setdefault(talk_url, (source, entry))
+
+    return talks
+
+
+def ingest(entries, store=None, workers=fetch.DEFAULT_WORKERS):
+    """
+    Download and convert every catalogued talk. Returns the md/ paths.
+    """
+    if dedupe is not None:
+        _, duplicates = dedupe.catalog_duplicates(entries)
+        for duplicate, original, _ in duplicates:
+            logger.info('skipping line {} (duplicate of line {})'.format(
+                duplicate['line'],
+                original['line'],
+            ))
+        skipped = [id(duplicate) for duplicate, _, _ in duplicates]
+        entries = [e for e in entries if id(e) not in skipped]
+
+    talks = resolve_talks(plan(entries), workers)
+    manifests = {}
+    seen = set()
+    paths = []
+
+    for url, response in fetch.fetch_all(talks, workers):
+        source, entry = talks[url]
+        if isinstance(response, Exception) or response.status_code >= 400:
+            logger.error('{} {}'.format(url, getattr(response, 'status_code',
+                                                     response)))
+            continue
+        lang = entry.get('lang', 'eng')
+        # normalize_url drops the query, and with it ?lang=
+        page = (normalize_url(response.url), lang)
+        if page in seen:
+            continue
+        seen.add(page)
+
+        slug = source.slug(response.url)
+        soup = BeautifulSoup(response.content, 'html.parser')
+        html = str(soup)
+
+        try:
+            section, notes = source.find_sections(soup)
+        except ValueError as e:
+            # Keep going; the rest of the catalog is still useful
+            logger.error('{} {}'.format(url, e))
+            continue
+        if section is None:
+            logger.error('no talk body in {}'.format(url))
+            continue
+        content = converter.sections_to_markdown(section, notes)
+
+        params = dict(source=source.name, lang=lang, slug=slug)
+        files = [
+            (FILEPATH_HTML.format(**params), 'html/' + slug + '.html', html),
+            (FILEPATH_MD.format(**params), 'md/' + slug + '.md', content),
+        ]
+
+        key = (source.name, lang)
+        if store is not None and key not in manifests:
+            manifests[key] = store.manifest('sources', source.name, lang)
+
+        for filename, name, data in files:
+            logger.info(filename)
+            if store is not None:
+                store.write_file(filename, data.encode('utf-8'),
+                                 manifests[key], name)
+                continue
+            ensure_path_exists(filename)
+            with open(filename, 'w', encoding='utf-8') as fout:
+                fout.write(data)
+
+        paths.append(files[1][0])
+
+    for manifest in manifests.values():
+        manifest.save()
+
+    return paths
+
+
+def ensure_path_exists(path):
+    dirs = os.path.dirname(path)
+    if not os.path.exists(dirs):
+        os.makedirs(dirs)
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    entries = read_catalog(args.catalog)
+    if args.languages:
+        entries = [e for e in entries if e.get('lang') in args.languages]
+    ingest(entries, workers=args.workers)
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--catalog',
+        action='store',
+        dest='catalog',
+        default=DEFAULT_CATALOG,
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--languages',
+        action='store',
+        dest='languages',
+        default=None,
+        nargs='+',
+    )
+
+    parser.add_argument(
+        '--workers',
+        action='store',
+        dest='workers',
+        default=fetch.DEFAULT_WORKERS,
+        type=int,
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+
+"""
+Content-addressed store for downloaded and converted talks
+
+Blobs are zlib-compressed and saved under their SHA-256 hash, so identical
+pages are stored once no matter how many conferences or runs produce them.
+Each conference keeps a manifest of file name -> hash, and the list of
+files its download was expected to produce:
+
+    .store/objects/ab/cdef...
+    .store/manifests/{year}-{month}-{lang}.json
+    .store/manifests/{year}-{month}-{lang}.expected.json
+
+python store.py YYYY MM
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import hashlib
+import json
+import os
+import zlib
+
+if __package__:
+    from .logger import setup_logger
+else:
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+DEFAULT_STORE = '.store'
+OBJECT_PATH = '{root}/objects/{prefix}/{rest}'
+MANIFEST_PATH = '{root}/manifests/{year}-{month}-{lang}.json'
+EXPECTED_PATH = '{root}/manifests/{year}-{month}-{lang}.expected.json'
+COMPRESSION_LEVEL = 9
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class Manifest:
+    """
+    The file name -> content hash mapping for one conference and language.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.changed = False
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as fin:
+                self.entries = json.load(fin)
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def set(self, name, digest):
+        if self.entries.get(name) != digest:
+            self.entries[name] = digest
+            self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        ensure_path_exists(self.path)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fout:
+            json.dump(self.entries, fout, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self.changed = False
+
+
+class Store:
+
+    def __init__(self, root=DEFAULT_STORE):
+        self.root = root
+
+    def object_path(self, digest):
+        return OBJECT_PATH.format(
+            root=self.root,
+            prefix=digest[:2],
+            rest=digest[2:],
+        )
+
+    def __contains__(self, digest):
+        return os.path.exists(self.object_path(digest))
+
+    def put(self, data):
+        """
+        Save a blob unless it is already stored and return its hash.
+        """
+        digest = content_hash(data)
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            ensure_path_exists(path)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as fout:
+                fout.write(zlib.compress(data, COMPRESSION_LEVEL))
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest):
+        with open(self.object_path(digest), 'rb') as fin:
+            return zlib.decompress(fin.read())
+
+    def manifest(self, year, month, lang):
+        return Manifest(MANIFEST_PATH.format(
+            root=self.root,
+            year=year,
+            month=month,
+            lang=lang,
+        ))
+
+    def expected(self, year, month, lang):
+        """
+        The file names a conference's download should have produced.
+        """
+        path = EXPECTED_PATH.format(
+            root=self.root,
+            year=year,
+            month=month,
+            lang=lang,
+        )
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8') as fin:
+            return json.load(fin)
+
+    def expect(self, year, month, lang, names, dropped=()):
+        """
+        Add names to the files a conference's download should produce, and
+        remove dropped ones (e.g. skipped duplicates).
+        """
+        names = sorted(
+            (set(self.expected(year, month, lang)) | set(names))
+            - set(dropped)
+        )
+        path = EXPECTED_PATH.format(
+            root=self.root,
+            year=year,
+            month=month,
+            lang=lang,
+        )
+        ensure_path_exists(path)
+        with open(path + '.tmp', 'w', encoding='utf-8') as fout:
+            json.dump(names, fout, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def write_file(self, filename, data, manifest, name):
+        """
+        Store data and write it to filename only when the bytes changed.
+
+        Returns True when the working file was (re)written.
+        """
+        digest = self.put(data)
+        previous = manifest.get(name)
+        manifest.set(name, digest)
+
+        if os.path.exists(filename) and os.path.getsize(filename) == len(data):
+            if previous == digest:
+                return False
+            with open(filename, 'rb') as fin:
+                if content_hash(fin.read()) == digest:
+                    return False
+
+        ensure_path_exists(filename)
+        with open(filename, 'wb') as fout:
+            fout.write(data)
+        return True
+
+    def checkout(self, manifest, name, filename):
+        """
+        Restore a working file from the store.
+        """
+        data = self.get(manifest.get(name))
+        ensure_path_exists(filename)
+        with open(filename, 'wb') as fout:
+            fout.write(data)
+        return filename
+
+
+def ensure_path_exists(path):
+    dirs = os.path.dirname(path)
+    if dirs and not os.path.exists(dirs):
+        os.makedirs(dirs)
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    store = Store(args.store)
+    for lang in args.languages:
+        manifest = store.manifest(args.year, args.month, lang)
+        for name, digest in sorted(manifest.entries.items()):
+            logger.info('{} {}'.format(digest[:12], name))
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    # Required positional argument
+    parser.add_argument("year", help="The year of the conference (e.g. 2017).")
+    parser.add_argument(
+        "month",
+        help="The month of the conference (i.e. 04 or 10).",
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--languages',
+        action='store',
+        dest='languages',
+        default=['eng', 'hun'],
+        nargs='+',
+    )
+
+    parser.add_argument(
+        '--store',
+        action='store',
+        dest='store',
+        default=DEFAULT_STORE,
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
@@ -24,7 +24,7 @@ xmlns:dcterms="http://purl.org/dc/terms/" version="3.0" xml:lang="en"
 unique-identifier="bookid">
 <metadata>
     <dc:identifier id="bookid">urn:uuid:{uuid}</dc:identifier>
-    <dc:title id="pub-title">{month} {year} Conference Report</dc:title>
+    <dc:title id="pub-title">{title}</dc:title>
     <dc:language id="pub-language">en</dc:language>
     <dc:date>{date}</dc:date> <!-- yyyy-mm-dd -->
     <meta property="dcterms:modified">{date}T15:30:00Z</meta>
@@ -74,10 +74,10 @@ TITLE = """<?xml version="1.0" encoding="utf-8"?>
 <html xmlns="http://www.w3.org/1999/xhtml">
     <head>
         <meta charset="utf-8"/>
-        <title>{month} {year} Conference Report</title>
+        <title>{title}</title>
     </head>
     <body>
-        <h1 class="titlepage">{month} {year} Conference Report</h1>
+        <h1 class="titlepage">{title}</h1>
         <div class="legalnotice">
             <p>This edition is not affiliated with The Church of Jesus Christ of Latter-day Saints in any way. Any errors in this edition are the responsibility of the author.</p>
         </div>
@@ -88,7 +88,7 @@ NAV = """<?xml version="1.0" encoding="utf-8"?>
 <html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">
     <head>
         <meta charset="utf-8" />
-        <title>{month} {year} Conference Report - Table of Contents</title>
+        <title>{title} - Table of Contents</title>
     </head>
     <body>
         <nav epub:type="toc" id="toc">
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+"""
+Convert plain-text transcripts into talk Markdown
+
+A transcript starts with a header (title, then venue lines) ended by a
+`---` line, followed by paragraphs separated by blank lines. Files are
+streamed line by line, so their size doesn't matter, and a directory of
+transcripts is converted in parallel. With a store the Markdown is kept in
+its manifest, like the talks from sources.py, and collection.py can
+include it in a book:
+
+    ../transcripts/{slug}.text  ->  sources/transcripts/{lang}/md/{slug}.md
+
+python transcripts.py [--transcripts ../transcripts] [--store .store]
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import itertools
+import os
+import re
+
+from concurrent.futures import ProcessPoolExecutor
+
+if __package__:
+    from . import store
+    from .logger import setup_logger
+else:
+    import store
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+DEFAULT_TRANSCRIPTS = '../transcripts'
+TRANSCRIPT_EXTENSION = '.text'
+SOURCE = 'transcripts'
+FILEPATH_MD = 'sources/' + SOURCE + '/{lang}/md/{slug}.md'
+
+HEADER_END = '---'
+# How far into a transcript its header marker may be
+HEADER_LINES = 50
+HEADING_TEMPLATE = '# {title}'
+# Escape text that Markdown would otherwise read as a heading, list or rule
+BLOCK_MARKUP = re.compile(r'^(\s*)([#>*+-]|\d+\.)(?=\s|$)')
+
+
+def escape(paragraph):
+    return BLOCK_MARKUP.sub(r'\1\\\2', paragraph)
+
+
+def read_blocks(lines):
+    """
+    Group lines into blocks separated by blank lines.
+    """
+    block = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            block.append(line)
+        elif block:
+            yield ' '.join(block)
+            block = []
+    if block:
+        yield ' '.join(block)
+
+
+def read_transcript(lines):
+    """
+    Yield the Markdown blocks of a transcript: heading, venue, paragraphs.
+    """
+    lines = iter(lines)
+    header = []
+    for line in itertools.islice(lines, HEADER_LINES):
+        if line.strip() == HEADER_END:
+            break
+        header.append(line)
+    else:
+        # No header marker near the top: what was read is the talk itself
+        lines, header = itertools.chain(header, lines), []
+
+    header_blocks = list(read_blocks(header))
+    if header_blocks:
+        yield HEADING_TEMPLATE.format(title=header_blocks[0])
+        for venue in header_blocks[1:]:
+            yield escape(venue)
+
+    for paragraph in read_blocks(lines):
+        yield escape(paragraph)
+
+
+def convert_transcript(filepath, lang='eng'):
+    """
+    Stream one transcript to Markdown in a temporary file next to its
+    output path, and return the output path.
+    """
+    slug = os.path.basename(filepath)[:-len(TRANSCRIPT_EXTENSION)]
+    filename = FILEPATH_MD.format(lang=lang, slug=slug)
+    ensure_path_exists(filename)
+
+    with open(filepath, encoding='utf-8') as fin, \
+            open(filename + '.tmp', 'w', encoding='utf-8') as fout:
+        separator = ''
+        for block in read_transcript(fin):
+            fout.write(separator + block)
+            separator = '\n\n'
+        # Same shape as converter output for a talk without notes
+        fout.write('\n\n')
+    return filename
+
+
+def convert_transcripts(folder=DEFAULT_TRANSCRIPTS, lang='eng', workers=None,
+                        store=None):
+    """
+    Convert every transcript in a folder in parallel. Returns the md/ paths.
+    """
+    filepaths = sorted(
+        entry.path for entry in os.scandir(folder)
+        if entry.name.endswith(TRANSCRIPT_EXTENSION)
+    )
+    manifest = None
+    if store is not None:
+        manifest = store.manifest('sources', SOURCE, lang)
+
+    paths = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for filename in executor.map(
+                convert_transcript, filepaths, [lang] * len(filepaths)):
+            paths.append(filename)
+            tmp_filename = filename + '.tmp'
+            if store is None:
+                os.replace(tmp_filename, filename)
+                logger.info(filename)
+                continue
+
+            with open(tmp_filename, 'rb') as fin:
+                data = fin.read()
+            os.remove(tmp_filename)
+            name = 'md/' + os.path.basename(filename)
+            if store.write_file(filename, data, manifest, name):
+                logger.info(filename)
+            else:
+                logger.info('unchanged: {}'.format(filename))
+
+    if manifest is not None:
+        manifest.save()
+    return paths
+
+
+def ensure_path_exists(path):
+    dirs = os.path.dirname(path)
+    if not os.path.exists(dirs):
+        os.makedirs(dirs)
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    blobs = None
+    if args.store:
+        blobs = store.Store(args.store)
+    convert_transcripts(args.transcripts, args.lang, store=blobs)
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--transcripts',
+        action='store',
+        dest='transcripts',
+        default=DEFAULT_TRANSCRIPTS,
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--lang',
+        action='store',
+        dest='lang',
+        default='eng',
+    )
+
+    parser.add_argument(
+        '--store',
+        action='store',
+        dest='store',
+        default=store.DEFAULT_STORE,
+        help="Content-addressed store root ('' to disable).",
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
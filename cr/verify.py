@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+
+"""
+Verify the downloaded and converted talks against the store manifests
+
+Every file a manifest lists must exist, hash to the recorded content and,
+for downloaded pages, be a complete HTML document; every talk the
+download expected must have been downloaded, and every downloaded talk
+converted. Files are hashed in parallel through mmap,
+and hashes are remembered by size and mtime so repeated runs only hash
+what changed. With --repair, broken files are restored from the store.
+
+    .store/manifests/{year}-{month}-{lang}.json  ->  {year}/{month}/{lang}/
+    .store/manifests/{year}-{month}-{lang}.expected.json
+
+python verify.py [YYYY [MM]] [--repair]
+"""
+
+__author__ = "Greg Reeve"
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+if __package__:
+    from . import store
+    from .logger import setup_logger
+else:
+    import store
+    from logger import setup_logger
+
+logger = setup_logger(logfile=None)
+
+
+DEFAULT_CACHE = '.verify.json'
+DEFAULT_WORKERS = 8
+FOLDER_LANG = '{year}/{month}/{lang}/'
+MANIFEST_NAME = re.compile(
+    r'^(?P<year>\d{4})-(?P<month>\d{2})-(?P<lang>\w+)(\.expected)?\.json$'
+)
+HTML_END = b'</html>'
+# How far from the end of a page its closing tag may be
+TAIL_SIZE = 1024
+
+MISSING = 'missing'
+TRUNCATED = 'truncated'
+STALE = 'stale'
+UNCONVERTED = 'unconverted'
+PROBLEMS = [MISSING, TRUNCATED, STALE, UNCONVERTED]
+
+
+def hash_file(path):
+    """
+    (sha256, complete) for a file; complete is False for an empty file or
+    a page that doesn't end with its closing tag.
+    """
+    with open(path, 'rb') as fin:
+        if os.fstat(fin.fileno()).st_size == 0:
+            return store.content_hash(b''), False
+        with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            digest = hashlib.sha256(data).hexdigest()
+            complete = True
+            if path.endswith('.html'):
+                complete = HTML_END in data[-TAIL_SIZE:]
+            return digest, complete
+
+
+def list_manifests(root, year=None, month=None, languages=None):
+    """
+    (year, month, lang) of every manifest or expected list in the store,
+    filtered.
+    """
+    folder = os.path.join(root, 'manifests')
+    if not os.path.exists(folder):
+        return []
+    found = []
+    for name in sorted(os.listdir(folder)):
+        match = MANIFEST_NAME.match(name)
+        if not match:
+            continue
+        if year and match['year'] != year:
+            continue
+        if month and match['month'] != month:
+            continue
+        if languages and match['lang'] not in languages:
+            continue
+        key = (match['year'], match['month'], match['lang'])
+        if key not in found:
+            found.append(key)
+    return found
+
+
+class HashCache:
+    """
+    path -> (size, mtime, hash, complete), saved between runs.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as fin:
+                    self.entries = json.load(fin)
+            except ValueError:
+                self.entries = {}
+
+    def lookup(self, path, stat):
+        entry = self.entries.get(path)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2], entry[3]
+        return None
+
+    def update(self, path, stat, digest, complete):
+        self.entries[path] = [stat.st_size, stat.st_mtime_ns, digest, complete]
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as fout:
+            json.dump(self.entries, fout)
+        os.replace(self.path + '.tmp', self.path)
+
+
+def verify(root=store.DEFAULT_STORE, year=None, month=None, languages=None,
+           workers=DEFAULT_WORKERS, cache_path=DEFAULT_CACHE):
+    """
+    Check the tree against the manifests.
+
+    Returns problem -> [(year, month, lang, name)].
+    """
+    blobs = store.Store(root)
+    cache = HashCache(cache_path)
+    problems = defaultdict(list)
+    to_hash = []
+
+    for key in list_manifests(root, year, month, languages):
+        manifest = blobs.manifest(*key)
+        folder = FOLDER_LANG.format(year=key[0], month=key[1], lang=key[2])
+        for name in blobs.expected(*key):
+            # Its download failed, so the manifest never listed it
+            if name not in manifest.entries:
+                problems[MISSING].append(key + (name,))
+        for name, digest in sorted(manifest.entries.items()):
+            if name.startswith('html/'):
+                md_name = 'md/' + name[len('html/'):-len('.html')] + '.md'
+                if md_name not in manifest.entries:
+                    problems[UNCONVERTED].append(key + (name,))
+
+            path = folder + name
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                problems[MISSING].append(key + (name,))
+                continue
+            cached = cache.lookup(path, stat)
+            to_hash.append((key, name, digest, path, stat, cached))
+
+    def check(job):
+        key, name, digest, path, stat, cached = job
+        actual, complete = cached or hash_file(path)
+        return key, name, digest, path, stat, actual, complete
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for key, name, digest, path, stat, actual, complete in \
+                executor.map(check, to_hash):
+            cache.update(path, stat, actual, complete)
+            if not complete:
+                problems[TRUNCATED].append(key + (name,))
+            elif actual != digest:
+                problems[STALE].append(key + (name,))
+
+    cache.save()
+    logger.info('{} files checked'.format(len(to_hash)))
+    return problems
+
+
+def repair(problems, root=store.DEFAULT_STORE):
+    """
+    Restore missing, truncated and stale files from the store.
+
+    Returns the entries that couldn't be restored.
+    """
+    blobs = store.Store(root)
+    unrepaired = []
+    for problem in (MISSING, TRUNCATED, STALE):
+        for year, month, lang, name in problems.get(problem, []):
+            manifest = blobs.manifest(year, month, lang)
+            digest = manifest.get(name)
+            if digest is None or digest not in blobs:
+                unrepaired.append((year, month, lang, name))
+                continue
+            filename = FOLDER_LANG.format(
+                year=year,
+                month=month,
+                lang=lang,
+            ) + name
+            blobs.checkout(manifest, name, filename)
+            logger.info('restored {}'.format(filename))
+    return unrepaired
+
+
+def report(problems):
+    for problem in PROBLEMS:
+        for year, month, lang, name in problems.get(problem, []):
+            print('{}\t{}'.format(
+                problem,
+                FOLDER_LANG.format(year=year, month=month, lang=lang) + name,
+            ))
+    logger.info(', '.join(
+        '{} {}'.format(len(problems.get(problem, [])), problem)
+        for problem in PROBLEMS
+    ))
+
+
+def main(args):
+    """
+    Main entry point of the app
+    """
+    logger.info(args)
+    problems = verify(
+        args.store,
+        args.year,
+        args.month,
+        args.languages,
+        args.workers,
+    )
+    report(problems)
+    if args.repair:
+        for year, month, lang, name in repair(problems, args.store):
+            logger.error('not in the store: {}/{}/{}/{}'.format(
+                year, month, lang, name))
+
+
+if __name__ == "__main__":
+    """
+    This is executed when run from the command line
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "year",
+        nargs='?',
+        help="The year of the conference (e.g. 2017).",
+    )
+    parser.add_argument(
+        "month",
+        nargs='?',
+        help="The month of the conference (i.e. 04 or 10).",
+    )
+
+    # Optional argument which requires a parameter (eg. -d test)
+    parser.add_argument(
+        '-l',
+        '--languages',
+        action='store',
+        dest='languages',
+        default=None,
+        nargs='+',
+    )
+
+    parser.add_argument(
+        '--store',
+        action='store',
+        dest='store',
+        default=store.DEFAULT_STORE,
+    )
+
+    parser.add_argument(
+        '--workers',
+        action='store',
+        dest='workers',
+        default=DEFAULT_WORKERS,
+        type=int,
+    )
+
+    parser.add_argument(
+        '--repair',
+        action='store_true',
+        dest='repair',
+        help="Restore broken files from the store.",
+    )
+
+    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Verbosity (-v, -vv, etc)",
+    )
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__),
+    )
+
+    args = parser.parse_args()
+    main(args)
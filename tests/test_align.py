@@ -0,0 +1,45 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'cr'))
+
+try:
+    import align
+except ImportError:
+    align = None
+
+
+@unittest.skipIf(align is None, 'align requires numpy and scipy')
+class AlignTest(unittest.TestCase):
+
+    def test_empty_target(self):
+        self.assertEqual(
+            align.align([10, 20, 30], []),
+            [((0, 1), (0, 0)), ((1, 2), (0, 0)), ((2, 3), (0, 0))],
+        )
+        self.assertEqual(align.align([10], []), [((0, 1), (0, 0))])
+
+    def test_empty_source(self):
+        self.assertEqual(
+            align.align([], [10, 20]),
+            [((0, 0), (0, 1)), ((0, 0), (1, 2))],
+        )
+
+    def test_both_empty(self):
+        self.assertEqual(align.align([], []), [])
+
+    def test_one_to_one(self):
+        self.assertEqual(
+            align.align([100, 200, 300], [110, 190, 310]),
+            [((0, 1), (0, 1)), ((1, 2), (1, 2)), ((2, 3), (2, 3))],
+        )
+
+    def test_empty_translation_keeps_source(self):
+        content = align.align_talk('First.\n\nSecond.\n', '')
+        self.assertIn('First.', content)
+        self.assertIn('Second.', content)
+
+
+if __name__ == '__main__':
+    unittest.main()
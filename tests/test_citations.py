@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'cr'))
+
+import citations  # noqa: E402
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_verse_ranges(self):
+        self.assertEqual(
+            citations.parse_references('Moroni 10:4–5, 9'),
+            [('Moroni', 10, 4, 5), ('Moroni', 10, 9, 9)],
+        )
+
+    def test_whole_chapter(self):
+        self.assertEqual(
+            citations.parse_references('See Alma 32.'),
+            [('Alma', 32, None, None)],
+        )
+
+    def test_continuation_of_the_same_book(self):
+        self.assertEqual(
+            citations.parse_references('Moroni 10:4; 7:16'),
+            [('Moroni', 10, 4, 4), ('Moroni', 7, 16, 16)],
+        )
+
+    def test_aliases(self):
+        self.assertEqual(
+            citations.parse_references('D&C 88:118; 1 Móz. 1:1'),
+            [('Doctrine and Covenants', 88, 118, 118), ('Genesis', 1, 1, 1)],
+        )
+        self.assertEqual(
+            citations.parse_references('Tan és a szövetségek 4:2'),
+            [('Doctrine and Covenants', 4, 2, 2)],
+        )
+
+    def test_not_a_reference(self):
+        self.assertEqual(citations.parse_references('Page 10:4'), [])
+
+    def test_notes(self):
+        content = (
+            'Text.[^1][^2]\n\n'
+            '[^1]: See Alma 32:21.\n'
+            '[^2]: Gordon B. Hinckley, "Pillars of Truth."\n'
+        )
+        self.assertEqual(
+            list(citations.parse_notes(content)),
+            [(1, [('Alma', 32, 21, 21)])],
+        )
+
+
+class IndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        os.makedirs('2021/04/eng/md')
+        with open('2021/04/eng/md/faith.md', 'w', encoding='utf-8') as fout:
+            fout.write('[^1]: Alma 32:21–23.\n[^2]: Ether 12:6.\n')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_find_talks(self):
+        self.assertEqual(citations.index_conference('2021', '04', 'eng'), 2)
+        self.assertEqual(
+            citations.find_talks('Alma 32:22'),
+            [('2021', '04', 'eng', 'faith', 1)],
+        )
+        self.assertEqual(
+            citations.find_talks('Ether 12'),
+            [('2021', '04', 'eng', 'faith', 2)],
+        )
+        self.assertEqual(citations.find_talks('Alma 32:30'), [])
+        with self.assertRaises(ValueError):
+            citations.find_talks('nothing')
+
+    def test_reindex_replaces(self):
+        citations.index_conference('2021', '04', 'eng')
+        with open('2021/04/eng/md/faith.md', 'w', encoding='utf-8') as fout:
+            fout.write('[^1]: Ether 12:6.\n')
+        self.assertEqual(citations.index_conference('2021', '04', 'eng'), 1)
+        self.assertEqual(citations.find_talks('Alma 32'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'cr'))
+
+try:
+    import dedupe
+except ImportError:
+    dedupe = None
+
+TALK = ' '.join(
+    'word{} of the talk about faith and hope'.format(i) for i in range(200)
+)
+
+
+@unittest.skipIf(dedupe is None, 'dedupe requires numpy')
+class DedupeTest(unittest.TestCase):
+
+    def test_signature_is_deterministic(self):
+        shingles = dedupe.word_shingles(TALK)
+        self.assertEqual(
+            dedupe.similarity(
+                dedupe.signature(shingles),
+                dedupe.signature(set(shingles)),
+            ),
+            1.0,
+        )
+
+    def test_markup_is_ignored(self):
+        self.assertEqual(
+            dedupe.word_shingles('<p>One <b>two</b> three four five</p>'),
+            dedupe.word_shingles('one two three four five'),
+        )
+
+    def test_short_text(self):
+        self.assertEqual(dedupe.word_shingles('Amen.'), {'amen'})
+
+    def test_near_duplicates_are_found(self):
+        documents = {
+            'a': dedupe.word_shingles(TALK),
+            'b': dedupe.word_shingles(TALK + ' Amen.'),
+            'c': dedupe.word_shingles(' '.join(reversed(TALK.split()))),
+        }
+        duplicates = dedupe.find_duplicates(documents)
+        self.assertEqual([(d, o) for d, o, _ in duplicates], [('b', 'a')])
+        self.assertGreaterEqual(duplicates[0][2], dedupe.THRESHOLD)
+
+    def test_insert_returns_earlier_matches(self):
+        index = dedupe.LSHIndex()
+        sig = dedupe.signature(dedupe.word_shingles(TALK))
+        self.assertEqual(index.insert('a', sig), [])
+        self.assertEqual(index.insert('b', sig), [('a', 1.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
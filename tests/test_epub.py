@@ -0,0 +1,103 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'cr'))
+
+import epub  # noqa: E402
+import epubcheck  # noqa: E402
+
+TALK = """# {title}
+
+By Elder {speaker}
+
+First paragraph of {title}.[^1]
+
+![A picture](2021/04/img/a.jpg)
+
+[^1]: See Alma 32:21.
+"""
+
+
+class EpubTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        for slug in ('one', 'two', 'three'):
+            self.write_talk(slug, slug.title())
+        epub.ensure_path_exists('2021/04/img/a.jpg')
+        with open('2021/04/img/a.jpg', 'wb') as fout:
+            fout.write(b'\xff\xd8 not really a jpeg')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def write_talk(self, slug, title):
+        path = epub.FOLDER_MD.format(year='2021', month='04', lang='eng')
+        epub.ensure_path_exists(path + slug + '.md')
+        with open(path + slug + '.md', 'w', encoding='utf-8') as fout:
+            fout.write(TALK.format(title=title, speaker=title + ' Smith'))
+
+    def build(self, **kwargs):
+        filename = epub.build_conference('2021', '04', ['eng'], **kwargs)
+        with open(filename, 'rb') as fin:
+            return fin.read()
+
+    def test_valid(self):
+        filename = epub.build_conference('2021', '04', ['eng'])
+        self.assertEqual(epubcheck.validate(filename), [])
+        with zipfile.ZipFile(filename) as zin:
+            self.assertEqual(zin.namelist()[0], 'mimetype')
+            self.assertIn('EPUB/images/a.jpg', zin.namelist())
+
+    def test_reproducible(self):
+        first = self.build()
+        shutil.rmtree('2021/04/out')
+        shutil.rmtree('.build')
+        self.assertEqual(self.build(), first)
+
+    def test_incremental_build_matches_full_build(self):
+        self.build()
+        self.write_talk('two', 'Second')
+        incremental = self.build()
+        self.assertEqual(self.build(incremental=False, force=True),
+                         incremental)
+
+    def test_unchanged_entries_are_reused(self):
+        filename = epub.FILEPATH_EPUB.format(year='2021', month='04')
+        self.build()
+        self.write_talk('two', 'Second')
+        entries = epub.book_entries(
+            '2021', '04',
+            [('eng', epub.ir.load_conference('2021', '04', ['eng']))])
+        written, reused = epub.write_epub(filename, entries)
+        # The changed chapter, the navigation and the package document
+        self.assertEqual(written, 3)
+        self.assertEqual(reused, len(entries) - 3)
+        with zipfile.ZipFile(filename) as zin:
+            self.assertIsNone(zin.testzip())
+            for name, data, _ in entries:
+                self.assertEqual(zin.read(name), data)
+
+    def test_up_to_date_build_is_skipped(self):
+        filename = epub.FILEPATH_EPUB.format(year='2021', month='04')
+        self.build()
+        mtime = os.stat(filename).st_mtime_ns
+        self.build()
+        self.assertEqual(os.stat(filename).st_mtime_ns, mtime)
+
+    def test_key_covers_images(self):
+        key = epub.build_key('2021', '04', ['eng'])
+        with open('2021/04/img/a.jpg', 'ab') as fout:
+            fout.write(b'recompressed')
+        self.assertNotEqual(epub.build_key('2021', '04', ['eng']), key)
+
+
+if __name__ == '__main__':
+    unittest.main()
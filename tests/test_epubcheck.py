@@ -0,0 +1,110 @@
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'cr'))
+
+import epubcheck  # noqa: E402
+
+CONTAINER = """<?xml version="1.0"?>
+<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+<rootfiles><rootfile full-path="EPUB/package.opf"/></rootfiles>
+</container>"""
+PACKAGE = """<?xml version="1.0"?>
+<package xmlns="http://www.idpf.org/2007/opf">
+<manifest>
+<item id="nav" href="nav.xhtml" properties="nav"
+      media-type="application/xhtml+xml"/>
+<item id="talk" href="talk.xhtml" media-type="application/xhtml+xml"/>
+</manifest>
+<spine><itemref idref="{idref}"/></spine>
+</package>"""
+NAV = """<html xmlns="http://www.w3.org/1999/xhtml"><body>
+<a href="{href}">Talk</a></body></html>"""
+TALK = """<html xmlns="http://www.w3.org/1999/xhtml"><body>
+<p id="start">Talk</p></body></html>"""
+
+
+class EpubCheckTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'book.epub')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def book(self, idref='talk', href='talk.xhtml#start', talk=TALK,
+             mimetype_first=True, extra=()):
+        entries = [
+            ('META-INF/container.xml', CONTAINER),
+            ('EPUB/package.opf', PACKAGE.format(idref=idref)),
+            ('EPUB/nav.xhtml', NAV.format(href=href)),
+            ('EPUB/talk.xhtml', talk),
+        ] + list(extra)
+        with zipfile.ZipFile(self.path, 'w') as zout:
+            if not mimetype_first:
+                entries.insert(0, entries.pop())
+            entries.insert(0 if mimetype_first else 1,
+                           ('mimetype', 'application/epub+zip'))
+            for name, data in entries:
+                compress_type = zipfile.ZIP_STORED if name == 'mimetype' \
+                    else zipfile.ZIP_DEFLATED
+                zout.writestr(name, data, compress_type)
+        return epubcheck.validate(self.path)
+
+    def messages(self, problems):
+        return [(p.level, p.name, p.message) for p in problems]
+
+    def test_valid(self):
+        self.assertEqual(self.book(), [])
+
+    def test_mimetype_not_first(self):
+        self.assertIn(
+            (epubcheck.ERROR, 'mimetype', 'not the first entry'),
+            self.messages(self.book(mimetype_first=False)),
+        )
+
+    def test_malformed_xml(self):
+        problems = self.book(talk='<html><p></html>')
+        self.assertEqual([p.name for p in problems], ['EPUB/talk.xhtml'])
+        self.assertEqual(problems[0].level, epubcheck.ERROR)
+
+    def test_unknown_spine_id(self):
+        self.assertEqual(
+            self.messages(self.book(idref='missing')),
+            [(epubcheck.ERROR, 'EPUB/package.opf',
+              'spine refers to unknown id missing')],
+        )
+
+    def test_broken_links(self):
+        self.assertEqual(
+            self.messages(self.book(href='talk.xhtml#end')),
+            [(epubcheck.ERROR, 'EPUB/nav.xhtml',
+              'link to missing id talk.xhtml#end')],
+        )
+        self.assertEqual(
+            self.messages(self.book(href='other.xhtml')),
+            [(epubcheck.ERROR, 'EPUB/nav.xhtml',
+              'link to other.xhtml outside the manifest')],
+        )
+
+    def test_unlisted_entry_is_a_warning(self):
+        self.assertEqual(
+            self.messages(self.book(extra=[('EPUB/stray.css', 'p {}')])),
+            [(epubcheck.WARNING, 'EPUB/stray.css', 'not in the manifest')],
+        )
+
+    def test_not_a_zip(self):
+        with open(self.path, 'wb') as fout:
+            fout.write(b'not a zip')
+        self.assertEqual(
+            [p.level for p in epubcheck.validate(self.path)],
+            [epubcheck.ERROR],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
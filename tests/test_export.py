@@ -0,0 +1,110 @@
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'cr'))
+
+import export  # noqa: E402
+
+
+class ExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.write('2021/04/eng/md/a.md', '# A\n\n![x](2021/04/img/a.jpg)\n')
+        self.write('2021/04/eng/md/b.md', 'word ' * 100000)
+        self.write('2021/04/eng/html/a.html', '<html></html>')
+        self.write('2021/04/hun/md/a.md', '# Á')
+        self.write('2021/04/img/a.jpg', os.urandom(3 * export.CHUNK_SIZE))
+        self.write('2021/04/img/unused.jpg', 'unused')
+        self.write('2021/04/out/cr_202104.epub', 'build state')
+        self.write('2021/04/eng/md/c.md.tmp', 'half written')
+        os.makedirs(export.FOLDER_EXPORT)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def write(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        mode = 'wb' if isinstance(content, bytes) else 'w'
+        with open(path, mode) as fout:
+            fout.write(content)
+
+    def read(self, path):
+        with open(path, 'rb') as fin:
+            return fin.read()
+
+    def test_find_members(self):
+        self.assertEqual(export.find_members('2021', '04'), [
+            '2021/04/eng/html/a.html',
+            '2021/04/eng/md/a.md',
+            '2021/04/eng/md/b.md',
+            '2021/04/hun/md/a.md',
+            '2021/04/img/a.jpg',
+        ])
+        self.assertEqual(
+            export.find_members('2021', '04', ['hun']),
+            ['2021/04/hun/md/a.md'],
+        )
+
+    def test_zip(self):
+        members = export.find_members('2021', '04')
+        filename = export.export_name('2021', '04')
+        self.assertEqual(
+            export.export_zip(filename, members, workers=2), (5, 0))
+        self.assertEqual(
+            export.export_zip(filename, members, workers=2), (0, 5))
+        self.write('2021/04/eng/md/b.md', 'changed')
+        self.assertEqual(
+            export.export_zip(filename, members, workers=2), (1, 4))
+
+        with zipfile.ZipFile(filename) as zin:
+            self.assertIsNone(zin.testzip())
+            self.assertEqual(zin.namelist(), members)
+            for path in members:
+                self.assertEqual(zin.read(path), self.read(path))
+            self.assertEqual(
+                zin.getinfo('2021/04/img/a.jpg').compress_type,
+                zipfile.ZIP_STORED,
+            )
+
+    def test_full_zip_matches_incremental(self):
+        members = export.find_members('2021', '04')
+        filename = export.export_name('2021', '04')
+        export.export_zip(filename, members, workers=2)
+        self.write('2021/04/eng/md/b.md', 'changed')
+        export.export_zip(filename, members, workers=2)
+        incremental = self.read(filename)
+        export.export_zip(filename, members, incremental=False, workers=2)
+        self.assertEqual(self.read(filename), incremental)
+
+    @unittest.skipIf(export.zstandard is None, 'tar.zst requires zstandard')
+    def test_tar_zst(self):
+        members = export.find_members('2021', '04')
+        filename = export.export_name('2021', '04', fmt='tar.zst')
+        self.assertEqual(
+            export.export_tar_zst(filename, members, workers=2), (5, 0))
+        self.write('2021/04/eng/md/a.md', '# Changed')
+        self.assertEqual(
+            export.export_tar_zst(filename, members, workers=2), (1, 4))
+
+        with open(filename, 'rb') as fin:
+            reader = export.zstandard.ZstdDecompressor().stream_reader(
+                fin, read_across_frames=True)
+            data = reader.read()
+        self.assertEqual(len(data) % export.TAR_RECORD, 0)
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            self.assertEqual(tar.getnames(), members)
+            for path in members:
+                self.assertEqual(tar.extractfile(path).read(), self.read(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'cr'))
+
+import fetch  # noqa: E402
+
+
+class AdaptiveControllerTest(unittest.TestCase):
+
+    def respond(self, controller, latency, count, status=200):
+        for _ in range(count):
+            controller.release(controller.acquire(), latency, status)
+
+    def test_sustained_latency_shift_recovers(self):
+        controller = fetch.AdaptiveController(maximum=8)
+        self.respond(controller, 0.1, 100)
+        self.assertEqual(int(controller.limit), 8)
+
+        # The server gets slower for good: the first responses are spikes,
+        # then the baseline catches up and the limit grows back
+        self.respond(controller, 1.0, 200)
+        self.assertGreater(controller.latency, 0.9)
+        self.assertEqual(int(controller.limit), 8)
+
+    def test_spike_decreases_limit(self):
+        controller = fetch.AdaptiveController(maximum=8)
+        self.respond(controller, 0.1, 100)
+        self.respond(controller, 1.0, 1)
+        self.assertEqual(int(controller.limit), 4)
+
+    def test_throttle_does_not_move_baseline(self):
+        controller = fetch.AdaptiveController(maximum=8)
+        self.respond(controller, 0.1, 10)
+        self.respond(controller, 5.0, 5, status=429)
+        self.assertAlmostEqual(controller.latency, 0.1)
+
+
+class FetchAllTest(unittest.TestCase):
+
+    class Session:
+
+        def request(self, method, url, **kwargs):
+            response = fetch.requests.Response()
+            response.status_code = 200
+            response.url = url
+            return response
+
+    def test_rate_limit_wait_is_not_latency(self):
+        controller = fetch.AdaptiveController(maximum=4)
+        urls = ['http://example.org/{}'.format(i) for i in range(8)]
+        # 8 requests at 20/s queue for 0.35s in the rate limiter
+        results = list(fetch.fetch_all(urls, rate=20, session=self.Session(),
+                                       controller=controller))
+        self.assertEqual(len(results), 8)
+        self.assertLess(controller.total_latency, 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'cr'))
+
+import jobqueue  # noqa: E402
+
+
+class JobQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'jobs.db')
+        self.conn = jobqueue.connect(self.path)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def test_enqueue_is_idempotent(self):
+        self.assertEqual(
+            jobqueue.enqueue(self.conn, '2021', '04', ['eng', 'hun']), 6)
+        self.assertEqual(
+            jobqueue.enqueue(self.conn, '2021', '04', ['eng', 'hun']), 0)
+        self.assertEqual(jobqueue.counts(self.conn), {jobqueue.PENDING: 6})
+
+    def test_stages_wait_for_earlier_stages(self):
+        jobqueue.enqueue(self.conn, '2021', '04', ['eng'],
+                         ['download', 'convert'])
+        job = jobqueue.claim(self.conn, 'a')
+        self.assertEqual(job.stage, 'download')
+        self.assertIsNone(jobqueue.claim(self.conn, 'b'))
+        jobqueue.complete(self.conn, job, 'a')
+        self.assertEqual(jobqueue.claim(self.conn, 'b').stage, 'convert')
+
+    def test_book_stage_waits_for_every_language(self):
+        jobqueue.enqueue(self.conn, '2021', '04', ['eng', 'hun'],
+                         ['convert', 'render'])
+        eng = jobqueue.claim(self.conn, 'a')
+        hun = jobqueue.claim(self.conn, 'a')
+        jobqueue.complete(self.conn, eng, 'a')
+        self.assertIsNone(jobqueue.claim(self.conn, 'a'))
+        jobqueue.complete(self.conn, hun, 'a')
+        job = jobqueue.claim(self.conn, 'a')
+        self.assertEqual((job.stage, job.lang), ('render', 'eng+hun'))
+
+    def test_expired_lease_is_claimed_again(self):
+        jobqueue.enqueue(self.conn, '2021', '04', ['eng'], ['download'])
+        job = jobqueue.claim(self.conn, 'a', lease=-1)
+        self.assertEqual(job.attempts, 1)
+
+        again = jobqueue.claim(self.conn, 'b')
+        self.assertEqual(again.id, job.id)
+        self.assertEqual(again.attempts, 2)
+        # The first worker lost its lease
+        self.assertFalse(jobqueue.heartbeat(self.conn, job, 'a'))
+        self.assertTrue(jobqueue.heartbeat(self.conn, again, 'b'))
+
+    def test_lease_expiry_counts_as_an_attempt(self):
+        jobqueue.enqueue(self.conn, '2021', '04', ['eng'],
+                         ['download', 'convert'])
+        for attempt in range(jobqueue.MAX_ATTEMPTS):
+            job = jobqueue.claim(self.conn, 'a', lease=-1)
+            self.assertEqual(job.stage, 'download')
+            self.assertEqual(job.attempts, attempt + 1)
+
+        # The last lease expires: the job fails, and so does its next stage
+        self.assertIsNone(jobqueue.claim(self.conn, 'a'))
+        self.assertEqual(jobqueue.counts(self.conn), {jobqueue.FAILED: 2})
+        self.assertEqual(jobqueue.unfinished(self.conn), 0)
+
+    def test_fail_retries_until_max_attempts(self):
+        jobqueue.enqueue(self.conn, '2021', '04', ['eng'], ['download'])
+        for _ in range(jobqueue.MAX_ATTEMPTS):
+            job = jobqueue.claim(self.conn, 'a')
+            jobqueue.fail(self.conn, job, 'a', 'boom')
+        self.assertIsNone(jobqueue.claim(self.conn, 'a'))
+        self.assertEqual(jobqueue.counts(self.conn), {jobqueue.FAILED: 1})
+
+    def test_work_runs_every_stage(self):
+        jobqueue.enqueue(self.conn, '2021', '04', ['eng'])
+        seen = []
+        done = jobqueue.work(lambda job: seen.append(job.stage), self.path,
+                             poll=0, worker='a')
+        self.assertEqual(done, len(jobqueue.STAGES))
+        self.assertEqual(seen, jobqueue.STAGES)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'cr'))
+
+import pack  # noqa: E402
+
+
+class PackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def write(self, path, content):
+        pack.ensure_path_exists(path)
+        with open(path, 'w', encoding='utf-8') as fout:
+            fout.write(content)
+
+    def test_round_trip(self):
+        self.write('2021/04/eng/html/a.html', '<html>a</html>')
+        self.write('2021/04/eng/md/a.md', '# Á')
+        self.assertEqual(pack.pack_conference('2021', '04', 'eng'), 2)
+
+        with pack.PackReader() as reader:
+            self.assertEqual(reader.slugs('2021', '04', 'eng', 'md'), ['a'])
+            self.assertEqual(reader.text('2021', '04', 'eng', 'md', 'a'), '# Á')
+            self.assertEqual(
+                bytes(reader.get('2021', '04', 'eng', 'html', 'a')),
+                b'<html>a</html>',
+            )
+            self.assertIn('2021/04/eng/md/a', reader)
+            self.assertNotIn('2021/04/hun/md/a', reader)
+
+    def test_repack_appends_only_changes(self):
+        self.write('2021/04/eng/md/a.md', 'one')
+        self.write('2021/04/eng/md/b.md', 'two')
+        pack.pack_conference('2021', '04', 'eng')
+        size = os.path.getsize(pack.DEFAULT_PACK)
+
+        self.assertEqual(pack.pack_conference('2021', '04', 'eng'), 0)
+        self.assertEqual(os.path.getsize(pack.DEFAULT_PACK), size)
+
+        self.write('2021/04/eng/md/b.md', 'three')
+        self.assertEqual(pack.pack_conference('2021', '04', 'eng'), 1)
+        with pack.PackReader() as reader:
+            self.assertEqual(reader.text('2021', '04', 'eng', 'md', 'a'), 'one')
+            self.assertEqual(
+                reader.text('2021', '04', 'eng', 'md', 'b'), 'three')
+
+    def test_extract(self):
+        self.write('2021/04/eng/md/a.md', 'one')
+        pack.pack_conference('2021', '04', 'eng')
+        with pack.PackReader() as reader:
+            reader.extract('2021', '04', 'eng', 'md', 'a', 'out/a.md')
+        with open('out/a.md', encoding='utf-8') as fin:
+            self.assertEqual(fin.read(), 'one')
+
+    def test_not_a_pack(self):
+        with open('bad.pack', 'wb') as fout:
+            fout.write(b'nonsense')
+        pack.write_index('bad.pack' + pack.INDEX_SUFFIX, {})
+        with self.assertRaises(ValueError):
+            pack.PackReader('bad.pack')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'cr'))
+
+import ir  # noqa: E402
+import render  # noqa: E402
+
+TALK = """# Faith
+
+Faith is a principle of action.[^1]
+
+> Ask in faith.[^2]
+
+- Pray[^1]
+- Act
+
+[^1]: See Alma 32:21.
+[^2]: James 1:6.
+[^3]: Not referenced.
+"""
+
+ID_REGEX = re.compile(r'\bid="([^"]+)"')
+HREF_REGEX = re.compile(r'\bhref="#([^"]+)"')
+
+
+class TalkHtmlTest(unittest.TestCase):
+
+    def setUp(self):
+        talk = ir.parse(TALK, '2021', '04', 'eng', 'faith')
+        self.html = render.talk_html(talk)
+
+    def test_ids_are_unique(self):
+        ids = ID_REGEX.findall(self.html)
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_links_reach_ids(self):
+        ids = set(ID_REGEX.findall(self.html))
+        for target in HREF_REGEX.findall(self.html):
+            self.assertIn(target, ids)
+
+    def test_every_reference_links_back(self):
+        self.assertIn('id="eng-faith-ref-1-1"', self.html)
+        self.assertIn('id="eng-faith-ref-1-2"', self.html)
+        self.assertIn(
+            '<li id="eng-faith-note-1"><a href="#eng-faith-ref-1-1">1.</a> '
+            '<a href="#eng-faith-ref-1-2">2</a> See Alma 32:21.</li>',
+            self.html,
+        )
+        self.assertIn('<li id="eng-faith-note-3">3. Not referenced.</li>',
+                      self.html)
+
+
+if __name__ == '__main__':
+    unittest.main()
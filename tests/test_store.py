@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'cr'))
+
+import store  # noqa: E402
+
+
+class StoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, '.store')
+        self.store = store.Store(self.root)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_identical_blobs_are_stored_once(self):
+        first = self.store.put(b'talk')
+        second = self.store.put(b'talk')
+        self.assertEqual(first, second)
+        self.assertIn(first, self.store)
+        self.assertEqual(self.store.get(first), b'talk')
+        objects = [
+            f for _, _, files in os.walk(os.path.join(self.root, 'objects'))
+            for f in files
+        ]
+        self.assertEqual(len(objects), 1)
+
+    def test_write_file_skips_unchanged_bytes(self):
+        filename = os.path.join(self.tmp.name, 'md', 'a.md')
+        manifest = self.store.manifest('2021', '04', 'eng')
+        self.assertTrue(
+            self.store.write_file(filename, b'one', manifest, 'md/a.md'))
+        mtime = os.stat(filename).st_mtime_ns
+        self.assertFalse(
+            self.store.write_file(filename, b'one', manifest, 'md/a.md'))
+        self.assertEqual(os.stat(filename).st_mtime_ns, mtime)
+        self.assertTrue(
+            self.store.write_file(filename, b'two', manifest, 'md/a.md'))
+        with open(filename, 'rb') as fin:
+            self.assertEqual(fin.read(), b'two')
+
+    def test_write_file_repairs_edited_file(self):
+        filename = os.path.join(self.tmp.name, 'a.md')
+        manifest = self.store.manifest('2021', '04', 'eng')
+        self.store.write_file(filename, b'one', manifest, 'md/a.md')
+        # Edited by hand since it was written
+        with open(filename, 'wb') as fout:
+            fout.write(b'one more')
+        self.assertTrue(
+            self.store.write_file(filename, b'one', manifest, 'md/a.md'))
+
+    def test_manifest_round_trip(self):
+        manifest = self.store.manifest('2021', '04', 'eng')
+        manifest.set('md/a.md', self.store.put(b'a'))
+        manifest.save()
+        self.assertFalse(manifest.changed)
+        reloaded = self.store.manifest('2021', '04', 'eng')
+        self.assertEqual(reloaded.entries, manifest.entries)
+
+    def test_checkout_restores_file(self):
+        filename = os.path.join(self.tmp.name, 'a.md')
+        manifest = self.store.manifest('2021', '04', 'eng')
+        self.store.write_file(filename, b'one', manifest, 'md/a.md')
+        os.remove(filename)
+        self.store.checkout(manifest, 'md/a.md', filename)
+        with open(filename, 'rb') as fin:
+            self.assertEqual(fin.read(), b'one')
+
+    def test_expect_adds_and_drops(self):
+        self.store.expect('2021', '04', 'eng', ['html/a.html', 'html/b.html'])
+        self.store.expect('2021', '04', 'eng', ['html/c.html'],
+                          dropped=['html/b.html'])
+        self.assertEqual(
+            self.store.expected('2021', '04', 'eng'),
+            ['html/a.html', 'html/c.html'],
+        )
+        self.assertEqual(self.store.expected('2021', '10', 'eng'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
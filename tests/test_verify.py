@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'cr'))
+
+import store  # noqa: E402
+import verify  # noqa: E402
+
+PAGE = b'<html><body>talk</body></html>'
+
+
+class VerifyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.store = store.Store(store.DEFAULT_STORE)
+        manifest = self.store.manifest('2021', '04', 'eng')
+        for name, data in [
+            ('html/a.html', PAGE),
+            ('md/a.md', b'# A'),
+            ('html/b.html', PAGE + b' '),
+        ]:
+            self.store.write_file('2021/04/eng/' + name, data, manifest, name)
+        manifest.save()
+        self.store.expect('2021', '04', 'eng',
+                          ['html/a.html', 'html/b.html', 'html/c.html'])
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def check(self):
+        return verify.verify(store.DEFAULT_STORE, workers=2)
+
+    def test_problems(self):
+        with open('2021/04/eng/md/a.md', 'wb') as fout:
+            fout.write(b'# B')
+        with open('2021/04/eng/html/b.html', 'wb') as fout:
+            fout.write(PAGE[:10])
+
+        problems = self.check()
+        key = ('2021', '04', 'eng')
+        self.assertEqual(problems[verify.MISSING], [key + ('html/c.html',)])
+        self.assertEqual(problems[verify.STALE], [key + ('md/a.md',)])
+        self.assertEqual(problems[verify.TRUNCATED], [key + ('html/b.html',)])
+        self.assertEqual(
+            problems[verify.UNCONVERTED], [key + ('html/b.html',)])
+
+    def test_cache_notices_changes(self):
+        self.assertEqual(self.check()[verify.STALE], [])
+        with open('2021/04/eng/md/a.md', 'wb') as fout:
+            fout.write(b'# Changed')
+        self.assertEqual(
+            self.check()[verify.STALE], [('2021', '04', 'eng', 'md/a.md')])
+
+    def test_repair(self):
+        os.remove('2021/04/eng/md/a.md')
+        with open('2021/04/eng/html/a.html', 'wb') as fout:
+            fout.write(b'')
+
+        unrepaired = verify.repair(self.check(), store.DEFAULT_STORE)
+        # c.html was never downloaded, so there is nothing to restore
+        self.assertEqual(unrepaired, [('2021', '04', 'eng', 'html/c.html')])
+        with open('2021/04/eng/html/a.html', 'rb') as fin:
+            self.assertEqual(fin.read(), PAGE)
+        problems = self.check()
+        self.assertEqual(problems[verify.STALE], [])
+        self.assertEqual(problems[verify.TRUNCATED], [])
+
+
+if __name__ == '__main__':
+    unittest.main()